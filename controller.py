@@ -2,6 +2,8 @@
 import argparse
 import json
 import math
+import re
+import shlex
 import subprocess
 import tempfile
 import time
@@ -17,6 +19,12 @@ SSH_OPTS = (
     "-q"
 )
 
+HAPROXY_ADMIN_SOCK = "/run/haproxy/admin.sock"
+HAPROXY_STATE_FILE = "/var/lib/haproxy/server-state"
+HAPROXY_MAX_WEIGHT = 100
+# Upper bound on how long a reloaded (old) HAProxy process keeps draining client sessions
+HAPROXY_HARD_STOP_AFTER = "1h"
+
 # ----------------------------
 # Phase policy
 # ----------------------------
@@ -61,8 +69,9 @@ def ssh(host: str, ssh_user: str, ssh_key: str, remote_cmd: str, check: bool = T
         proxy_cmd = f"-o ProxyCommand='ssh -i {ssh_key} {SSH_OPTS} -W %h:%p {ssh_user}@{bastion}'"
     else:
         proxy_cmd = ""
+    # single quoted so nothing in remote_cmd ($vars, $(...)) is expanded by the local shell
     return run(
-        f"ssh -i {ssh_key} {SSH_OPTS} {proxy_cmd} {ssh_user}@{host} {json.dumps(remote_cmd)}",
+        f"ssh -i {ssh_key} {SSH_OPTS} {proxy_cmd} {ssh_user}@{host} {shlex.quote(remote_cmd)}",
         check=check,
     )
 
@@ -282,13 +291,81 @@ def ensure_ca(certs_dir: Path, ca_key: Path) -> None:
     run(f"cockroach cert create-ca --certs-dir={certs_dir} --ca-key={ca_key}")
 
 
-def create_client_cert(certs_dir: Path, ca_key: Path, username: str) -> None:
+# Leaf key types the controller can issue.  RSA goes through `cockroach cert
+# --key-size`, ECDSA is signed with openssl since cockroach cert only does RSA.
+KEY_TYPES = ["rsa-2048", "rsa-4096", "ecdsa-p256"]
+
+
+def openssl_genkey(key: Path, key_type: str) -> None:
+    if key_type.startswith("rsa-"):
+        run(f"openssl genrsa -out {key} {key_type.split('-', 1)[1]}")
+    elif key_type == "ecdsa-p256":
+        run(f"openssl genpkey -algorithm EC -pkeyopt ec_paramgen_curve:P-256 -out {key}")
+    else:
+        raise RuntimeError(f"Unsupported key type: {key_type}")
+    key.chmod(0o600)
+
+
+def issue_openssl_cert(certs_dir: Path, ca_key: Path, name: str, cn: str, sans: List[str],
+                       key_type: str, ext_key_usage: str) -> Tuple[Path, Path]:
+    """
+    Sign <name>.crt / <name>.key with the cluster CA.
+    sans are subjectAltName entries such as "DNS:localhost" or "IP:10.0.0.1".
+    """
+    key = certs_dir / f"{name}.key"
+    crt = certs_dir / f"{name}.crt"
+    csr = certs_dir / f"{name}.csr"
+    cnf = certs_dir / f"{name}.cnf"
+
+    ext = [f"extendedKeyUsage = {ext_key_usage}", "keyUsage = critical, digitalSignature, keyEncipherment"]
+    if sans:
+        ext.append(f"subjectAltName = {', '.join(sans)}")
+    cnf.write_text("\n".join([
+        "[ req ]",
+        "prompt              = no",
+        "default_md          = sha256",
+        "distinguished_name  = dn",
+        "req_extensions      = req_ext",
+        "",
+        "[ dn ]",
+        f"CN = {cn}",
+        "",
+        "[ req_ext ]",
+        *ext,
+    ]) + "\n")
+
+    openssl_genkey(key, key_type)
+    run(f"openssl req -new -key {key} -out {csr} -config {cnf}")
+    run(
+        f"openssl x509 -req -in {csr} "
+        f"-CA {certs_dir/'ca.crt'} "
+        f"-CAkey {ca_key} "
+        f"-CAcreateserial "
+        f"-out {crt} "
+        f"-days 365 "
+        f"-sha256 "
+        f"-extensions req_ext "
+        f"-extfile {cnf}"
+    )
+    return crt, key
+
+
+def create_client_cert(certs_dir: Path, ca_key: Path, username: str, key_type: Optional[str] = None) -> None:
     (certs_dir / f"client.{username}.crt").unlink(missing_ok=True)
     (certs_dir / f"client.{username}.key").unlink(missing_ok=True)
-    run(f"cockroach cert create-client {username} --certs-dir={certs_dir} --ca-key={ca_key}")
+    if key_type is None:
+        run(f"cockroach cert create-client {username} --certs-dir={certs_dir} --ca-key={ca_key}")
+    elif key_type.startswith("rsa-"):
+        run(
+            f"cockroach cert create-client {username} --certs-dir={certs_dir} --ca-key={ca_key} "
+            f"--key-size={key_type.split('-', 1)[1]}"
+        )
+    else:
+        issue_openssl_cert(certs_dir, ca_key, f"client.{username}", username, [], key_type, "clientAuth")
 
 
-def create_crdb_node_cert(node: Dict[str, Any], dns_zone: str, certs_dir: Path, ca_key: Path) -> None:
+def create_crdb_node_cert(node: Dict[str, Any], dns_zone: str, certs_dir: Path, ca_key: Path,
+                          key_type: Optional[str] = None) -> None:
     """
     Writes certs_dir/node.crt and certs_dir/node.key for this node.
     Include db.<region>.<zone> SAN so clients can verify-full against the VIP DNS name.
@@ -296,6 +373,19 @@ def create_crdb_node_cert(node: Dict[str, Any], dns_zone: str, certs_dir: Path,
     (certs_dir / "node.crt").unlink(missing_ok=True)
     (certs_dir / "node.key").unlink(missing_ok=True)
 
+    if key_type is not None and not key_type.startswith("rsa-"):
+        issue_openssl_cert(
+            certs_dir,
+            ca_key,
+            "node",
+            "node",
+            [f"DNS:{node['name']}", f"DNS:db.{node['region']}.{dns_zone}", f"IP:{node['private_ip']}", "DNS:localhost"],
+            key_type,
+            "serverAuth, clientAuth",
+        )
+        return
+
+    key_size = f"--key-size={key_type.split('-', 1)[1]} " if key_type else ""
     run(
         "cockroach cert create-node "
         f"{node['name']} "
@@ -303,7 +393,8 @@ def create_crdb_node_cert(node: Dict[str, Any], dns_zone: str, certs_dir: Path,
         f"{node['private_ip']} "
         "localhost "
         f"--certs-dir={certs_dir} "
-        f"--ca-key={ca_key}"
+        f"--ca-key={ca_key} "
+        f"{key_size}"
     )
 
 
@@ -312,9 +403,10 @@ def create_pgbouncer_server_cert(
     dns_zone: str,
     certs_dir: Path,
     ca_key: Path,
+    key_type: Optional[str] = None,
 ) -> tuple[Path, Path]:
     """
-    Create a TLS server cert for PgBouncer.
+    Create a TLS server cert for PgBouncer (RSA-4096 unless key_type says otherwise).
     Produces:
       server.pgbouncer.crt
       server.pgbouncer.key
@@ -347,7 +439,7 @@ DNS.1 = pgb.{region}.{dns_zone}
 DNS.2 = localhost
 """.strip())
 
-    run(f"openssl genrsa -out {key} 4096")
+    openssl_genkey(key, key_type or "rsa-4096")
     run(f"openssl req -new -key {key} -out {csr} -config {cnf}")
     run(
         f"openssl x509 -req -in {csr} "
@@ -576,6 +668,7 @@ def render_runner_env(
     client_password: str | None,
     num_connections: int,
     database: str,
+    host_list: Optional[List[str]] = None,
 ) -> str:
     lines = [
         f"PGB_CLIENT_ACCOUNT={client_account}",
@@ -583,6 +676,8 @@ def render_runner_env(
         f"PGB_AUTH_MODE={auth_mode}",
         f"PGB_NUM_CONNECTIONS={num_connections}",
         f"PGB_DATABASE={database}",
+        # lowest-latency Cockroach nodes, empty means connect through the db.<region> VIP
+        f"PGB_HOST_LIST={','.join(host_list or [])}",
     ]
 
     if auth_mode == "password":
@@ -608,18 +703,39 @@ def push_runner_env(dcp_host: str, ssh_user: str, ssh_key: str, env_text: str, b
     ssh(dcp_host, ssh_user, ssh_key, "sudo chmod 600 /etc/pgbouncer/runner.env", bastion=bastion)
 
 
-def render_haproxy_cfg(pgbouncer_ips: List[str], backend_ips: List[str], pgb_port: int, db_port: int, ui_port: int) -> str:
+def render_haproxy_cfg(pgbouncer_ips: List[str], backend_ips: List[str], pgb_port: int, db_port: int, ui_port: int,
+                       latency_ms: Optional[Dict[str, float]] = None, slack_ms: float = 1.0) -> str:
+    """
+    With latency_ms (this DCP node's connect times to the Cockroach nodes) the
+    Cockroach backends are listed fastest first and only those within slack_ms
+    of the fastest stay active, the rest become backup servers.  Server names
+    keep their position in backend_ips so runtime weights still line up.
+    """
+    backends = list(enumerate(backend_ips, start=1))
+    backup_ips: List[str] = []
+    if latency_ms:
+        preferred = preferred_backends(backend_ips, latency_ms, slack_ms)
+        backup_ips = [ip for ip in backend_ips if ip not in preferred]
+        backends.sort(key=lambda b: latency_ms.get(b[1], math.inf))
+
     lines: List[str] = []
     lines += [
         "global",
         "  maxconn 200000",
         "  log /dev/log local0",
         "  daemon",
+        "  master-worker",
+        # runtime API, used by the weight feeder to re-balance Cockroach backends.
+        # expose-fd lets a reloading process take over the listening sockets.
+        f"  stats socket {HAPROXY_ADMIN_SOCK} mode 660 level admin expose-fd listeners",
+        f"  server-state-file {HAPROXY_STATE_FILE}",
+        f"  hard-stop-after {HAPROXY_HARD_STOP_AFTER}",
         "",
         "defaults",
         "  mode tcp",
         "  log global",
         "  option tcplog",
+        "  load-server-state-from-file global",
         "  timeout connect 5s",
         "  timeout client  180s",
         "  timeout server  180s",
@@ -645,10 +761,10 @@ def render_haproxy_cfg(pgbouncer_ips: List[str], backend_ips: List[str], pgb_por
         "backend db_pool",
         "  balance roundrobin",
         "  option tcp-check",
-        "  default-server inter 2s fall 3 rise 2",
+        f"  default-server inter 2s fall 3 rise 2 weight {HAPROXY_MAX_WEIGHT}",
     ]
-    for i, ip in enumerate(backend_ips, start=1):
-        lines.append(f"  server crdb{i} {ip}:{db_port} check")
+    for i, ip in backends:
+        lines.append(f"  server crdb{i} {ip}:{db_port} check{' backup' if ip in backup_ips else ''}")
 
     lines += [
         "",
@@ -659,10 +775,10 @@ def render_haproxy_cfg(pgbouncer_ips: List[str], backend_ips: List[str], pgb_por
         "backend crdb_admin_pool",
         "  balance roundrobin",
         "  option tcp-check",
-        "  default-server inter 2s fall 3 rise 2",
+        f"  default-server inter 2s fall 3 rise 2 weight {HAPROXY_MAX_WEIGHT}",
     ]
-    for i, ip in enumerate(backend_ips, start=1):
-        lines.append(f"  server admin{i} {ip}:{ui_port} check")
+    for i, ip in backends:
+        lines.append(f"  server admin{i} {ip}:{ui_port} check{' backup' if ip in backup_ips else ''}")
 
     lines += [
         "",
@@ -679,9 +795,66 @@ def render_haproxy_cfg(pgbouncer_ips: List[str], backend_ips: List[str], pgb_por
 
 
 def push_haproxy_cfg(dcp_host: str, ssh_user: str, ssh_key: str, cfg: str, bastion: Optional[str] = None) -> None:
-    scp_text(dcp_host, ssh_user, ssh_key, "/etc/haproxy/haproxy.cfg", cfg, bastion=bastion)
-    ssh(dcp_host, ssh_user, ssh_key, "sudo haproxy -c -f /etc/haproxy/haproxy.cfg", bastion=bastion)
-    ssh(dcp_host, ssh_user, ssh_key, "sudo systemctl restart haproxy", bastion=bastion)
+    """
+    Seamless reload: validate the new config next to the live one, save server
+    state (runtime weights, maint/drain) and reload in place.  The new process
+    takes over the listening sockets and the old one keeps serving existing
+    client sessions until they close (or hard-stop-after expires), so pooled
+    clients on the VIP aren't reset.  Falls back to a start when HAProxy isn't running.
+    """
+    scp_text(dcp_host, ssh_user, ssh_key, "/etc/haproxy/haproxy.cfg.new", cfg, bastion=bastion)
+    ssh(dcp_host, ssh_user, ssh_key, "sudo haproxy -c -f /etc/haproxy/haproxy.cfg.new", bastion=bastion)
+    ssh(
+        dcp_host,
+        ssh_user,
+        ssh_key,
+        f"sudo mkdir -p {Path(HAPROXY_STATE_FILE).parent} && "
+        f"if [ -S {HAPROXY_ADMIN_SOCK} ]; then "
+        f"echo 'show servers state' | sudo socat stdio {HAPROXY_ADMIN_SOCK} | sudo tee {HAPROXY_STATE_FILE} > /dev/null; "
+        "fi",
+        check=False,
+        bastion=bastion,
+    )
+    ssh(dcp_host, ssh_user, ssh_key, "sudo mv /etc/haproxy/haproxy.cfg.new /etc/haproxy/haproxy.cfg", bastion=bastion)
+    ssh(dcp_host, ssh_user, ssh_key, "sudo systemctl reload-or-restart haproxy", bastion=bastion)
+
+
+def verify_hitless_reload(
+    conninfo: str,
+    ssh_user: str,
+    ssh_key: str,
+    cfgs: Dict[str, str],
+    clients: int,
+    duration: int,
+) -> int:
+    """
+    Push each DCP node its cfg (keyed by ssh host) while pgbench keeps `clients`
+    sessions busy on the VIP, then count the sessions that were dropped.
+    pgbench holds one connection per client for the whole run (no -C), so any
+    reset connection shows up as an aborted client.
+    """
+    with tempfile.TemporaryDirectory() as td:
+        script = Path(td) / "select1.sql"
+        script.write_text("SELECT 1;\n")
+        cmd = f"pgbench -n -c {clients} -j {min(clients, 8)} -T {duration} -f {script} \"{conninfo}\""
+        print(f"\n>>> {cmd} &")
+        proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+        # let every client connect before pushing
+        time.sleep(max(2, duration // 3))
+        for dcp_host, cfg in cfgs.items():
+            push_haproxy_cfg(dcp_host, ssh_user, ssh_key, cfg, bastion=None)
+
+        out, _ = proc.communicate()
+    print(out)
+
+    # pgbench exits 2 when clients aborted, anything else non-zero means it never ran
+    if proc.returncode not in (0, 2):
+        raise RuntimeError(f"pgbench failed during reload check: {cmd}")
+
+    dropped = len(set(re.findall(r"client (\d+) aborted", out)))
+    print(f"{'✅' if dropped == 0 else '❌'} {dropped}/{clients} client sessions dropped during config push")
+    return dropped
 
 
 def start_pgbouncer_runner(dcp_host: str, ssh_user: str, ssh_key: str, bastion: Optional[str] = None) -> None:
@@ -689,10 +862,505 @@ def start_pgbouncer_runner(dcp_host: str, ssh_user: str, ssh_key: str, bastion:
     ssh(dcp_host, ssh_user, ssh_key, "sudo systemctl restart pgbouncer-runner", bastion=bastion)
 
 
+# ----------------------------
+# Hot certificate rotation
+# ----------------------------
+
+def cert_fingerprint(crt: Path) -> str:
+    out = run(f"openssl x509 -noout -fingerprint -sha256 -in {crt}")
+    return out.split("=", 1)[1].strip()
+
+
+def served_cert_fingerprint(probe_host: str, ssh_user: str, ssh_key: str, target: str, bastion: Optional[str] = None) -> str:
+    """
+    SHA-256 fingerprint of the certificate a Postgres-protocol listener presents
+    right now (new TLS handshake, SSLRequest via -starttls postgres).
+    """
+    out = ssh(
+        probe_host,
+        ssh_user,
+        ssh_key,
+        f"echo | openssl s_client -starttls postgres -connect {target} 2>/dev/null | openssl x509 -noout -fingerprint -sha256",
+        check=False,
+        bastion=bastion,
+    )
+    m = re.search(r"Fingerprint=([0-9A-F:]+)", out)
+    return m.group(1) if m else ""
+
+
+def describe_key_type(x509_text: str) -> str:
+    """KEY_TYPES name of the key in `openssl x509 -noout -text` output, "" if unrecognized."""
+    bits = re.search(r"Public-Key: \((\d+) bit\)", x509_text)
+    if not bits:
+        return ""
+    if "rsaEncryption" in x509_text:
+        return f"rsa-{bits.group(1)}"
+    if "id-ecPublicKey" in x509_text:
+        return f"ecdsa-p{bits.group(1)}"
+    return ""
+
+
+def expect_served_key_type(target: str, key_type: str, probe_host: Optional[str] = None, ssh_user: str = "",
+                           ssh_key: str = "", bastion: Optional[str] = None) -> None:
+    """
+    Fail unless target presents a certificate with a key_type key, probed from
+    probe_host over ssh, or from the controller when probe_host is None.
+    """
+    cmd = f"echo | openssl s_client -starttls postgres -connect {target} 2>/dev/null | openssl x509 -noout -text"
+    if probe_host:
+        out = ssh(probe_host, ssh_user, ssh_key, cmd, check=False, bastion=bastion)
+    else:
+        out = run(cmd, check=False)
+    served = describe_key_type(out)
+    if served != key_type:
+        raise RuntimeError(f"{target} serves a {served or 'unrecognized'} certificate, expected {key_type}")
+    print(f"✅ {target} serves a {key_type} certificate")
+
+
+def swap_certs_in_place(host: str, ssh_user: str, ssh_key: str, certs_path: str, owner: str,
+                        files: List[Path], bastion: Optional[str] = None) -> None:
+    """
+    Upload files to <certs_path>.new, keep a copy of the live directory in
+    <certs_path>.prev and rename the new files over the live ones.  Nothing is
+    restarted; the running process only picks them up on its reload signal.
+    """
+    staging = f"{certs_path}.new"
+    ssh(host, ssh_user, ssh_key, f"sudo rm -rf {staging} && sudo mkdir -p {staging}", bastion=bastion)
+    for f in files:
+        scp_file(host, ssh_user, ssh_key, f, f"{staging}/{f.name}", bastion=bastion)
+    ssh(
+        host,
+        ssh_user,
+        ssh_key,
+        f"sudo rm -rf {certs_path}.prev && sudo cp -a {certs_path} {certs_path}.prev && "
+        f"sudo chown {owner}:{owner} {staging}/* && "
+        f"sudo chmod 0644 {staging}/*.crt && sudo chmod 0600 {staging}/*.key && "
+        f"for f in {staging}/*; do sudo mv -f \"$f\" {certs_path}/; done && sudo rmdir {staging}",
+        bastion=bastion,
+    )
+
+    # the reload only helps if the live files really are the new ones
+    for f in files:
+        if f.suffix != ".crt":
+            continue
+        out = ssh(host, ssh_user, ssh_key,
+                  f"sudo openssl x509 -noout -fingerprint -sha256 -in {certs_path}/{f.name}",
+                  check=False, bastion=bastion)
+        m = re.search(r"Fingerprint=([0-9A-F:]+)", out)
+        if not m or m.group(1) != cert_fingerprint(f):
+            raise RuntimeError(f"{certs_path}/{f.name} on {host} wasn't replaced by the new certificate")
+
+
+def wait_for_served_cert(probe_host: str, ssh_user: str, ssh_key: str, target: str, expected: str,
+                         probes: int = 1, timeout: int = 30, bastion: Optional[str] = None) -> None:
+    """
+    Wait until `probes` consecutive handshakes against target all present the expected cert.
+    More than one probe matters for PgBouncer, where so_reuseport spreads
+    handshakes across instances that each reload separately.
+    """
+    deadline = time.time() + timeout
+    while True:
+        seen = [served_cert_fingerprint(probe_host, ssh_user, ssh_key, target, bastion=bastion) for _ in range(probes)]
+        if all(fp == expected for fp in seen):
+            print(f"✅ {target} on {probe_host} serves the new certificate")
+            return
+        if time.time() > deadline:
+            raise RuntimeError(f"{target} on {probe_host} still serves an old certificate after reload: {set(seen)}")
+        time.sleep(2)
+
+
+def rotate_crdb_node_certs(node: Dict[str, Any], ssh_user: str, ssh_key: str, certs_dir: Path,
+                           db_port: int, bastion: Optional[str] = None, key_type: Optional[str] = None) -> None:
+    """
+    Swap in node.crt/key (already issued into certs_dir for this node) plus the
+    root client cert and SIGHUP cockroach, which reloads its certificates
+    without dropping SQL sessions.
+    """
+    files = [certs_dir / n for n in ("ca.crt", "node.crt", "node.key", "client.root.crt", "client.root.key")]
+    expected = cert_fingerprint(certs_dir / "node.crt")
+
+    print(f"🔐 Rotating certs on {node['name']}")
+    swap_certs_in_place(node["ssh_host"], ssh_user, ssh_key, "/var/lib/cockroach/certs", "cockroach", files, bastion=bastion)
+    ssh(node["ssh_host"], ssh_user, ssh_key, "sudo pkill -HUP -x cockroach", bastion=bastion)
+    wait_for_served_cert(node["ssh_host"], ssh_user, ssh_key, f"localhost:{db_port}", expected, bastion=bastion)
+    if key_type:
+        expect_served_key_type(f"localhost:{db_port}", key_type, node["ssh_host"], ssh_user, ssh_key, bastion=bastion)
+
+
+def rotate_pgbouncer_certs(dcp_host: str, ssh_user: str, ssh_key: str, certs_dir: Path,
+                           pgb_client_user: str, pgb_server_user: str, bastion: Optional[str] = None,
+                           key_type: Optional[str] = None) -> None:
+    """
+    Swap in the PgBouncer server cert and backend client certs, then SIGHUP
+    every instance (same as RELOAD on the admin console).  Pooled client and
+    server connections stay up; new handshakes use the new certs.
+    """
+    files = [
+        certs_dir / "ca.crt",
+        certs_dir / "server.pgbouncer.crt",
+        certs_dir / "server.pgbouncer.key",
+        certs_dir / f"client.{pgb_server_user}.crt",
+        certs_dir / f"client.{pgb_server_user}.key",
+        certs_dir / f"client.{pgb_client_user}.crt",
+        certs_dir / f"client.{pgb_client_user}.key",
+    ]
+    expected = cert_fingerprint(certs_dir / "server.pgbouncer.crt")
+
+    print(f"🔐 Rotating PgBouncer certs on {dcp_host}")
+    swap_certs_in_place(dcp_host, ssh_user, ssh_key, "/etc/pgbouncer/certs", "postgres", files, bastion=bastion)
+    ssh(
+        dcp_host,
+        ssh_user,
+        ssh_key,
+        # fails (no pids for kill) rather than skipping the reload when no instance is running
+        "sudo sh -c 'kill -HUP $(cat /var/run/pgbouncer/*/pgbouncer.pid)'",
+        bastion=bastion,
+    )
+    wait_for_served_cert(dcp_host, ssh_user, ssh_key, "localhost:6432", expected, probes=8, bastion=bastion)
+    if key_type:
+        expect_served_key_type("localhost:6432", key_type, dcp_host, ssh_user, ssh_key, bastion=bastion)
+
+
+def rotate_cluster_certs(
+    nodes: List[Dict[str, Any]],
+    dcp_by_region: Dict[str, List[Dict[str, Any]]],
+    ssh_user: str,
+    ssh_key: str,
+    dns_zone: str,
+    certs_dir: Path,
+    ca_key: Path,
+    auth_mode: str,
+    pgb_client_user: str,
+    pgb_server_user: str,
+    db_port: int,
+    key_type: Optional[str] = None,
+) -> None:
+    create_client_cert(certs_dir, ca_key, "root", key_type=key_type)
+    for node in nodes:
+        create_crdb_node_cert(node, dns_zone, certs_dir, ca_key, key_type=key_type)
+        rotate_crdb_node_certs(node, ssh_user, ssh_key, certs_dir, db_port, bastion=node["bastion"], key_type=key_type)
+
+    if auth_mode != "cert":
+        return
+
+    create_client_cert(certs_dir, ca_key, pgb_server_user, key_type=key_type)
+    create_client_cert(certs_dir, ca_key, pgb_client_user, key_type=key_type)
+    for region, region_proxies in dcp_by_region.items():
+        create_pgbouncer_server_cert(region, dns_zone, certs_dir, ca_key, key_type=key_type)
+        for p in region_proxies:
+            dcp_host = pick_dcp_ssh_host(p, ssh_user, ssh_key)
+            rotate_pgbouncer_certs(dcp_host, ssh_user, ssh_key, certs_dir, pgb_client_user, pgb_server_user,
+                                   bastion=None, key_type=key_type)
+
+
+def handshake_benchmark(conninfos: Dict[str, str], clients: int, seconds: int) -> Dict[str, Dict[str, float]]:
+    """
+    Connect-rate run per endpoint with the currently installed certificates:
+    every pgbench transaction is a fresh connection doing a single SELECT 1.
+    """
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as td:
+        select1 = Path(td) / "select1.sql"
+        select1.write_text("SELECT 1;\n")
+        for endpoint, conninfo in conninfos.items():
+            r = pgbench_throughput(conninfo, select1, clients, seconds, new_connections=True)
+            results[endpoint] = {"connects_per_s": r["tps"], "connect_avg_ms": r["connect_avg_ms"], "aborted": r["aborted"]}
+    return results
+
+
+# ----------------------------
+# Latency matrix
+# ----------------------------
+
+def probe_connect_latency(probe_host: str, ssh_user: str, ssh_key: str, target_ips: List[str], port: int,
+                          samples: int, bastion: Optional[str] = None) -> Dict[str, float]:
+    """
+    Median TCP connect time (ms) from probe_host to each target.  curl's
+    time_connect stops at the TCP handshake, so it's one round trip without TLS
+    or HTTP on top.  Unreachable targets are left out with a warning, and a
+    probe that reaches none of them fails.
+    """
+    cmd = (
+        f"for ip in {' '.join(target_ips)}; do for i in $(seq {samples}); do "
+        f"echo \"$ip $(curl -sk -o /dev/null --max-time 3 -w '%{{time_connect}}' https://$ip:{port}/health)\"; "
+        "done; done"
+    )
+    out = ssh(probe_host, ssh_user, ssh_key, cmd, check=False, bastion=bastion)
+
+    raw: Dict[str, List[float]] = {}
+    for line in out.splitlines():
+        parts = line.split()
+        if len(parts) != 2 or parts[0] not in target_ips:
+            continue
+        try:
+            t = float(parts[1])
+        except ValueError:
+            continue
+        if t > 0:
+            raw.setdefault(parts[0], []).append(t * 1000.0)
+
+    if not raw:
+        raise RuntimeError(f"Latency probe from {probe_host} got no samples for any of {', '.join(target_ips)}:\n{out}")
+    missing = [ip for ip in target_ips if ip not in raw]
+    if missing:
+        print(f"⚠️ latency probe from {probe_host} got no samples for {', '.join(missing)}, leaving them out")
+    return {ip: percentile(ts, 50) for ip, ts in raw.items()}
+
+
+def gather_latency_matrix(
+    dcp_by_region: Dict[str, List[Dict[str, Any]]],
+    crdb_by_region: Dict[str, List[Dict[str, Any]]],
+    ssh_user: str,
+    ssh_key: str,
+    ui_port: int,
+    samples: int,
+) -> Dict[str, Any]:
+    """
+    Probe every Cockroach node from every DCP node.
+
+    Returns {"dcp": {dcp_private_ip: {"region": r, "crdb": {crdb_ip: ms}}},
+             "regions": {src_region: {dst_region: ms}}}
+    where the region entry is the median over all DCP -> node pairs between the two regions.
+    """
+    crdb_region = {n["private_ip"]: region for region, ns in crdb_by_region.items() for n in ns}
+    all_ips = sorted(crdb_region.keys())
+
+    matrix: Dict[str, Any] = {"dcp": {}, "regions": {}}
+    pairs: Dict[str, Dict[str, List[float]]] = {}
+    for region, region_proxies in dcp_by_region.items():
+        for p in region_proxies:
+            dcp_host = pick_dcp_ssh_host(p, ssh_user, ssh_key)
+            latencies = probe_connect_latency(dcp_host, ssh_user, ssh_key, all_ips, ui_port, samples)
+            matrix["dcp"][p["private_ip"]] = {"region": region, "crdb": latencies}
+            for ip, ms in latencies.items():
+                pairs.setdefault(region, {}).setdefault(crdb_region[ip], []).append(ms)
+
+    for src, dsts in pairs.items():
+        matrix["regions"][src] = {dst: round(percentile(ms, 50), 3) for dst, ms in dsts.items()}
+
+    print("\n📡 Region latency matrix (ms):")
+    for src in sorted(matrix["regions"]):
+        row = ", ".join(f"{dst}={ms}" for dst, ms in sorted(matrix["regions"][src].items()))
+        print(f"   {src} -> {row}")
+        local = matrix["regions"][src].get(src)
+        nearest = min(matrix["regions"][src].items(), key=lambda kv: kv[1])
+        if local is not None and nearest[0] != src:
+            print(f"⚠️ {src} DCP nodes reach {nearest[0]} faster than their own region ({nearest[1]} < {local} ms)")
+
+    return matrix
+
+
+def preferred_backends(backend_ips: List[str], latency_ms: Dict[str, float], slack_ms: float) -> List[str]:
+    """
+    Backends within slack_ms of the fastest one.  Nodes that weren't measured
+    are never preferred; if nothing was measured, every backend is.
+    """
+    measured = [latency_ms[ip] for ip in backend_ips if ip in latency_ms]
+    if not measured:
+        return list(backend_ips)
+    cutoff = min(measured) + slack_ms
+    return [ip for ip in backend_ips if latency_ms.get(ip, math.inf) <= cutoff]
+
+
+# ----------------------------
+# Admission-aware HAProxy weights
+# ----------------------------
+
+# Node metrics scraped from /_status/vars to score headroom
+WEIGHT_METRICS = (
+    "sys_runnable_goroutines_per_cpu",                    # gauge
+    "admission_granter_slots_exhausted_duration_kv",      # counter, microseconds
+    "admission_granter_io_tokens_exhausted_duration_kv",  # counter, microseconds
+    "admission_wait_durations_kv_sum",                    # histogram sum, nanoseconds
+    "admission_wait_durations_kv_count",                  # histogram count
+)
+
+# Admission control starts shrinking KV slots around 32 runnable goroutines per CPU
+RUNNABLE_OVERLOAD_PER_CPU = 32.0
+# Mean KV admission wait at which a node is considered to have no headroom left
+QUEUE_DELAY_CEILING_MS = 50.0
+
+PROM_LINE_RE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+(\S+)")
+
+
+def parse_prometheus_text(text: str) -> Dict[str, float]:
+    """
+    Parse prometheus exposition text into {metric: value}.
+    Labelled series are summed per metric name (admission metrics carry
+    per-store/per-tenant labels, we only care about the node total).
+    """
+    metrics: Dict[str, float] = {}
+    for line in text.splitlines():
+        m = PROM_LINE_RE.match(line.strip())
+        if not m:
+            continue
+        try:
+            value = float(m.group(3))
+        except ValueError:
+            continue
+        metrics[m.group(1)] = metrics.get(m.group(1), 0.0) + value
+    return metrics
+
+
+def fetch_crdb_node_health(
+    probe_host: str,
+    ssh_user: str,
+    ssh_key: str,
+    node_ip: str,
+    ui_port: int,
+    bastion: Optional[str] = None,
+) -> Tuple[bool, Dict[str, float]]:
+    """
+    Read readiness and admission metrics for one Cockroach node.
+    Runs on a DCP node since Cockroach nodes are only reachable on their private IPs.
+    """
+    metric_re = "|".join(WEIGHT_METRICS)
+    out = ssh(
+        probe_host,
+        ssh_user,
+        ssh_key,
+        f"curl -sk -o /dev/null -w 'ready=%{{http_code}}\\n' --max-time 3 'https://{node_ip}:{ui_port}/health?ready=1'; "
+        f"curl -sk --max-time 5 'https://{node_ip}:{ui_port}/_status/vars' | grep -E '^({metric_re})' || true",
+        check=False,
+        bastion=bastion,
+    )
+    ready = "ready=200" in out
+    return ready, parse_prometheus_text(out)
+
+
+def compute_server_weight(
+    ready: bool,
+    sample: Dict[str, float],
+    prev: Optional[Dict[str, float]],
+    elapsed_s: float,
+) -> int:
+    """
+    Map a node's metrics to an HAProxy weight in [0, HAPROXY_MAX_WEIGHT].
+
+    Headroom is the tightest of:
+      - runnable goroutines per CPU vs the admission overload threshold
+      - fraction of the interval with KV slots exhausted
+      - fraction of the interval with IO tokens exhausted
+      - mean KV admission queueing delay vs QUEUE_DELAY_CEILING_MS
+    Counters need two samples, so the first pass only scores on readiness and runnable goroutines.
+    Nodes that aren't ready get weight 0, everyone else keeps at least 1 so tcp-check state still decides liveness.
+    """
+    if not ready:
+        return 0
+
+    def delta(name: str) -> float:
+        if not prev:
+            return 0.0
+        # counters reset when a node restarts
+        return max(0.0, sample.get(name, 0.0) - prev.get(name, 0.0))
+
+    runnable = sample.get("sys_runnable_goroutines_per_cpu", 0.0)
+    headroom = 1.0 - runnable / RUNNABLE_OVERLOAD_PER_CPU
+
+    if prev and elapsed_s > 0:
+        slots_exhausted = delta("admission_granter_slots_exhausted_duration_kv") / 1e6 / elapsed_s
+        io_exhausted = delta("admission_granter_io_tokens_exhausted_duration_kv") / 1e6 / elapsed_s
+        headroom = min(headroom, 1.0 - slots_exhausted, 1.0 - io_exhausted)
+
+        waits = delta("admission_wait_durations_kv_count")
+        if waits > 0:
+            mean_wait_ms = delta("admission_wait_durations_kv_sum") / waits / 1e6
+            headroom = min(headroom, 1.0 - mean_wait_ms / QUEUE_DELAY_CEILING_MS)
+
+    headroom = min(1.0, max(0.0, headroom))
+    return max(1, round(HAPROXY_MAX_WEIGHT * headroom))
+
+
+def set_haproxy_weights(dcp_host: str, ssh_user: str, ssh_key: str, weights: Dict[str, int], bastion: Optional[str] = None) -> None:
+    """
+    Apply {"backend/server": weight} through the HAProxy runtime API in a single call.
+    """
+    if not weights:
+        return
+    cmds = "; ".join(f"set server {srv} weight {w}" for srv, w in sorted(weights.items()))
+    ssh(dcp_host, ssh_user, ssh_key, f"echo '{cmds}' | sudo socat stdio {HAPROXY_ADMIN_SOCK}", bastion=bastion)
+
+
+def feed_haproxy_weights(
+    targets: List[Dict[str, Any]],
+    ssh_user: str,
+    ssh_key: str,
+    ui_port: int,
+    interval: int,
+    iterations: int,
+) -> None:
+    """
+    Periodically re-weight the db_pool and crdb_admin_pool servers on every DCP node.
+
+    Each target is {"region": str, "dcp_hosts": [ssh hosts], "backend_ips": [ips in render order]},
+    server names match render_haproxy_cfg (crdbN / adminN by position in backend_ips).
+    PgBouncer reaches Cockroach through the same db.<region> VIP, so pooled backend
+    connections follow the weights as well as direct clients, unless --latency-aware
+    placement gave it a PGB_HOST_LIST of node IPs, which bypasses HAProxy.
+    iterations <= 0 runs until interrupted.
+    """
+    prev: Dict[str, Dict[str, float]] = {}
+    prev_ts: Optional[float] = None
+    n = 0
+
+    for target in targets:
+        for dcp_host in target["dcp_hosts"]:
+            out = ssh(dcp_host, ssh_user, ssh_key, "sudo grep -s '^PGB_HOST_LIST=.' /etc/pgbouncer/runner.env", check=False)
+            m = re.search(r"^PGB_HOST_LIST=(\S+)", out, re.M)
+            if m:
+                print(f"⚠️ PgBouncer on {dcp_host} connects straight to {m.group(1)} (PGB_HOST_LIST), "
+                      f"its pooled backend connections won't follow the weights, only clients of the db.{target['region']} VIP will")
+
+    print(f"⚖️  Feeding admission-aware weights every {interval}s")
+    while iterations <= 0 or n < iterations:
+        now = time.time()
+        elapsed = now - prev_ts if prev_ts is not None else 0.0
+
+        for target in targets:
+            weights: Dict[str, int] = {}
+            for i, ip in enumerate(target["backend_ips"], start=1):
+                ready, sample = fetch_crdb_node_health(target["dcp_hosts"][0], ssh_user, ssh_key, ip, ui_port)
+                w = compute_server_weight(ready, sample, prev.get(ip), elapsed)
+                prev[ip] = sample
+                weights[f"db_pool/crdb{i}"] = w
+                weights[f"crdb_admin_pool/admin{i}"] = w
+                print(f"   {target['region']} {ip}: ready={ready} weight={w}")
+
+            for dcp_host in target["dcp_hosts"]:
+                set_haproxy_weights(dcp_host, ssh_user, ssh_key, weights)
+
+        prev_ts = now
+        n += 1
+        if iterations <= 0 or n < iterations:
+            time.sleep(interval)
+
+
 # ----------------------------
 # Validation
 # ----------------------------
 
+def libpq_conninfo(
+    host: str,
+    port: int,
+    database: str,
+    username: str,
+    certs_dir: Optional[Path] = None,
+    password: Optional[str] = None,
+) -> str:
+    """
+    Connection string for psql/pgbench: client cert + verify-full when certs_dir
+    is given, otherwise password auth over TLS.
+    """
+    if certs_dir is not None:
+        return (
+            f"host={host} port={port} dbname={database} user={username} sslmode=verify-full "
+            f"sslrootcert={certs_dir/'ca.crt'} "
+            f"sslcert={certs_dir/f'client.{username}.crt'} "
+            f"sslkey={certs_dir/f'client.{username}.key'}"
+        )
+    return f"host={host} port={port} dbname={database} user={username} password={password} sslmode=require"
+
+
 def validate_region_cert(region: str, dns_zone: str, certs_dir: Path, pgb_client_user: str, database: str, pgb_port: int, db_port: int) -> None:
     # Direct DB via VIP DNS
     db_host = f"db.{region}.{dns_zone}:{db_port}"
@@ -720,6 +1388,126 @@ def validate_region_password(region: str, dns_zone: str, username: str, password
     )
 
 
+# ----------------------------
+# Smoke benchmark
+# ----------------------------
+
+SMOKE_TABLE = "dcp_smoke"
+SMOKE_ROWS = 1000
+# metrics where a larger value is better; everything else is compared as an upper bound
+SMOKE_HIGHER_IS_BETTER = {"point_tps", "multiplex_tps"}
+
+
+def ensure_smoke_table(seed_host: str, ssh_user: str, ssh_key: str, database: str, username: str,
+                       db_port: int, bastion: Optional[str] = None) -> None:
+    sql_exec_on_seed(
+        seed_host,
+        ssh_user,
+        ssh_key,
+        f"CREATE TABLE IF NOT EXISTS {database}.{SMOKE_TABLE} (id INT PRIMARY KEY, v STRING NOT NULL); "
+        f"UPSERT INTO {database}.{SMOKE_TABLE} SELECT i, md5(i::STRING) FROM generate_series(1, {SMOKE_ROWS}) AS g(i); "
+        f"GRANT SELECT ON {database}.{SMOKE_TABLE} TO {username};",
+        db_port,
+        bastion=bastion,
+    )
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def pgbench_connect_latencies(conninfo: str, script: Path, samples: int) -> List[float]:
+    """
+    One fresh connection per pgbench run (-C -c 1 -t 1); pgbench reports the
+    connection time itself (pgbench >= 14), so process start-up isn't measured.
+    """
+    latencies: List[float] = []
+    for _ in range(samples):
+        out = run(f"pgbench -n -C -c 1 -j 1 -t 1 -f {script} \"{conninfo}\"")
+        m = re.search(r"average connection time = ([\d.]+) ms", out)
+        if not m:
+            raise RuntimeError("pgbench did not report connection time (pgbench >= 14 required)")
+        latencies.append(float(m.group(1)))
+    return latencies
+
+
+def pgbench_throughput(conninfo: str, script: Path, clients: int, seconds: int, new_connections: bool = False) -> Dict[str, float]:
+    """
+    With new_connections every transaction opens its own connection (-C), so
+    tps is the connect rate and includes the full TLS + auth handshake.
+    """
+    out = run(
+        f"pgbench -n {'-C ' if new_connections else ''}-c {clients} -j {min(clients, 8)} -T {seconds} -f {script} \"{conninfo}\"",
+        check=False,
+    )
+    tps = re.search(r"tps = ([\d.]+)", out)
+    if not tps:
+        raise RuntimeError(f"pgbench did not complete against {conninfo.split()[0]}")
+    latency = re.search(r"latency average = ([\d.]+) ms", out)
+    connect = re.search(r"average connection time = ([\d.]+) ms", out)
+    return {
+        "tps": float(tps.group(1)),
+        "latency_avg_ms": float(latency.group(1)) if latency else float("nan"),
+        "connect_avg_ms": float(connect.group(1)) if connect else float("nan"),
+        "aborted": float(len(set(re.findall(r"client (\d+) aborted", out)))),
+    }
+
+
+def smoke_benchmark_endpoint(conninfo: str, connects: int, clients: int, multiplex_clients: int, seconds: int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as td:
+        select1 = Path(td) / "select1.sql"
+        select1.write_text("SELECT 1;\n")
+        point = Path(td) / "point.sql"
+        point.write_text(
+            f"\\set id random(1, {SMOKE_ROWS})\n"
+            f"SELECT v FROM {SMOKE_TABLE} WHERE id = :id;\n"
+        )
+
+        connect = pgbench_connect_latencies(conninfo, select1, connects)
+        single = pgbench_throughput(conninfo, point, clients, seconds)
+        multiplex = pgbench_throughput(conninfo, point, multiplex_clients, seconds)
+
+    return {
+        "connect_p50_ms": percentile(connect, 50),
+        "connect_p99_ms": percentile(connect, 99),
+        "point_tps": single["tps"],
+        "point_latency_avg_ms": single["latency_avg_ms"],
+        "multiplex_tps": multiplex["tps"],
+        "multiplex_latency_avg_ms": multiplex["latency_avg_ms"],
+        "multiplex_aborted": multiplex["aborted"],
+    }
+
+
+def compare_smoke_results(results: Dict[str, Dict[str, Dict[str, float]]],
+                          baseline: Dict[str, Dict[str, Dict[str, float]]],
+                          tolerance: float) -> List[str]:
+    """
+    Returns a list of regressions: throughput below baseline*(1-tolerance),
+    latencies / aborted clients above baseline*(1+tolerance).
+    """
+    failures: List[str] = []
+    for region, endpoints in results.items():
+        for endpoint, metrics in endpoints.items():
+            base = baseline.get(region, {}).get(endpoint)
+            if not base:
+                print(f"⚠️ no smoke baseline for {endpoint}.{region}, skipping comparison")
+                continue
+            for metric, value in metrics.items():
+                if metric not in base or math.isnan(value):
+                    continue
+                if metric in SMOKE_HIGHER_IS_BETTER:
+                    floor = base[metric] * (1.0 - tolerance)
+                    if value < floor:
+                        failures.append(f"{endpoint}.{region} {metric}={value:.2f} < {floor:.2f}")
+                else:
+                    ceiling = base[metric] * (1.0 + tolerance)
+                    if value > ceiling:
+                        failures.append(f"{endpoint}.{region} {metric}={value:.2f} > {ceiling:.2f}")
+    return failures
+
+
 # ----------------------------
 # Argument parsing
 # ----------------------------
@@ -773,6 +1561,51 @@ def parse_args():
     # Validation
     parser.add_argument("--skip-validation", action="store_true")
 
+    # Post-deploy smoke benchmark (pgbench required locally)
+    parser.add_argument("--smoke-bench", action="store_true")
+    parser.add_argument("--smoke-seconds", type=int, default=10)
+    parser.add_argument("--smoke-clients", type=int, default=8)
+    parser.add_argument("--smoke-multiplex-clients", type=int, default=200,
+                        help="Concurrent clients for the multiplexing run, should exceed the per-node pool size")
+    parser.add_argument("--smoke-connects", type=int, default=50, help="Connect latency samples per endpoint")
+    parser.add_argument("--smoke-baseline-file", default="./smoke-baseline.json")
+    parser.add_argument("--smoke-tolerance", type=float, default=0.2,
+                        help="Allowed fractional regression against the baseline")
+    parser.add_argument("--smoke-update-baseline", action="store_true",
+                        help="Write this run's results to --smoke-baseline-file instead of comparing")
+
+    # Hot certificate rotation (re-issues leaf certs, CA stays)
+    parser.add_argument("--rotate-certs", action="store_true")
+    parser.add_argument("--key-type", choices=KEY_TYPES, default=None,
+                        help="Key type for issued leaf certs, defaults to the cockroach cert / RSA-4096 PgBouncer defaults")
+
+    # TLS + auth handshake benchmark (pgbench required locally)
+    parser.add_argument("--handshake-bench", action="store_true")
+    parser.add_argument("--handshake-key-types", default=",".join(KEY_TYPES))
+    parser.add_argument("--handshake-clients", type=int, default=16)
+    parser.add_argument("--handshake-seconds", type=int, default=15)
+    parser.add_argument("--handshake-results-file", default="./handshake-results.json")
+
+    # Latency matrix / locality-aware placement
+    parser.add_argument("--latency-probe", action="store_true",
+                        help="Measure DCP -> Cockroach connect latency and write --latency-matrix-file")
+    parser.add_argument("--latency-samples", type=int, default=5)
+    parser.add_argument("--latency-matrix-file", default="./latency-matrix.json")
+    parser.add_argument("--latency-aware", action="store_true",
+                        help="Order HAProxy backends and PgBouncer host lists by the latency matrix")
+    parser.add_argument("--latency-slack-ms", type=float, default=1.0,
+                        help="Nodes within this many ms of the fastest stay preferred")
+
+    # Hitless reload verification (pgbench required locally)
+    parser.add_argument("--verify-reload", action="store_true")
+    parser.add_argument("--reload-check-clients", type=int, default=64)
+    parser.add_argument("--reload-check-seconds", type=int, default=30)
+
+    # Admission-aware HAProxy weights
+    parser.add_argument("--feed-weights", action="store_true")
+    parser.add_argument("--weight-interval", type=int, default=15)
+    parser.add_argument("--weight-iterations", type=int, default=0)  # 0 = run until interrupted
+
     return parser.parse_args()
 
 
@@ -837,13 +1670,13 @@ def main():
     # 3) root and dcp certs
     if args.root_cert != PhasePolicy.SKIP:
         if args.root_cert == PhasePolicy.REFRESH or not (certs_dir / "client.root.crt").exists():
-            create_client_cert(certs_dir, ca_key, "root")
+            create_client_cert(certs_dir, ca_key, "root", key_type=args.key_type)
 
     if args.auth_mode == "cert" and args.sql_users:
         if not (certs_dir / f"client.{args.pgb_server_user}.crt").exists():
-            create_client_cert(certs_dir, ca_key, args.pgb_server_user)  # pgb -> crdb
+            create_client_cert(certs_dir, ca_key, args.pgb_server_user, key_type=args.key_type)  # pgb -> crdb
         if not (certs_dir / f"client.{args.pgb_client_user}.crt").exists():
-            create_client_cert(certs_dir, ca_key, args.pgb_client_user)  # client -> pgb
+            create_client_cert(certs_dir, ca_key, args.pgb_client_user, key_type=args.key_type)  # client -> pgb
 
     if args.start_nodes != PhasePolicy.SKIP:
         # 4) node certs
@@ -851,7 +1684,7 @@ def main():
             wait_for_ssh(node["ssh_host"], args.ssh_user, args.ssh_key, timeout=300, bastion=node["bastion"])
             wait_for_cloud_init(node["ssh_host"], args.ssh_user, args.ssh_key, bastion=node["bastion"])
             if args.node_certs:
-                create_crdb_node_cert(node, args.dns_zone, certs_dir, ca_key)
+                create_crdb_node_cert(node, args.dns_zone, certs_dir, ca_key, key_type=args.key_type)
             install_crdb_certs(node, args.ssh_user, args.ssh_key, certs_dir, bastion=node["bastion"])
 
         # 5) start Cockroach nodes
@@ -922,28 +1755,59 @@ def main():
                 bastion=nodes[0]["bastion"],
             )
 
+    # 7a) Latency matrix
+    latency_matrix: Optional[Dict[str, Any]] = None
+    matrix_file = Path(args.latency_matrix_file).expanduser()
+    if args.latency_probe:
+        latency_matrix = gather_latency_matrix(
+            dcp_by_region,
+            crdb_by_region,
+            args.ssh_user,
+            args.ssh_key,
+            ui_port=args.ui_port,
+            samples=args.latency_samples,
+        )
+        matrix_file.write_text(json.dumps(latency_matrix, indent=2) + "\n")
+        print(f"✅ latency matrix written to {matrix_file}")
+    elif args.latency_aware:
+        if not matrix_file.exists():
+            raise RuntimeError(f"{matrix_file} not found, run with --latency-probe first")
+        latency_matrix = json.loads(matrix_file.read_text())
+
+    def dcp_latencies(p: Dict[str, Any]) -> Optional[Dict[str, float]]:
+        if not args.latency_aware or latency_matrix is None:
+            return None
+        return latency_matrix["dcp"].get(p["private_ip"], {}).get("crdb")
+
     # 8) PgBouncer
     if not args.skip_pgbouncer:
         total_pgb_nodes = sum(len(region_proxies) for region_proxies in dcp_by_region.values())
         per_node_conn = compute_pgb_connections(args.num_connections, total_pgb_nodes)
 
-        env_text = render_runner_env(
-            client_account=args.pgb_client_user,
-            server_account=args.pgb_server_user,
-            auth_mode=args.auth_mode,
-            client_password=args.password,
-            num_connections=per_node_conn,
-            database=args.database,
-        )
-
         for region, region_proxies in dcp_by_region.items():
             if args.auth_mode == "cert":
-                create_pgbouncer_server_cert(region, args.dns_zone, certs_dir, ca_key)
+                create_pgbouncer_server_cert(region, args.dns_zone, certs_dir, ca_key, key_type=args.key_type)
 
             for p in region_proxies:
                 dcp_host = pick_dcp_ssh_host(p, args.ssh_user, args.ssh_key)
                 wait_for_ssh(dcp_host, args.ssh_user, args.ssh_key, timeout=300, bastion=None)
                 wait_for_cloud_init(dcp_host, args.ssh_user, args.ssh_key, bastion=None)
+
+                host_list = None
+                latencies = dcp_latencies(p)
+                if latencies:
+                    db_ips = [n["private_ip"] for n in crdb_by_region.get(region, [])]
+                    host_list = preferred_backends(db_ips, latencies, args.latency_slack_ms)
+
+                env_text = render_runner_env(
+                    client_account=args.pgb_client_user,
+                    server_account=args.pgb_server_user,
+                    auth_mode=args.auth_mode,
+                    client_password=args.password,
+                    num_connections=per_node_conn,
+                    database=args.database,
+                    host_list=host_list,
+                )
                 push_runner_env(dcp_host, args.ssh_user, args.ssh_key, env_text, bastion=None)
 
                 if args.auth_mode == "cert":
@@ -967,10 +1831,58 @@ def main():
             if not db_ips:
                 raise RuntimeError(f"No Cockroach nodes found for region {region}")
 
-            cfg = render_haproxy_cfg(pgb_ips, db_ips, pgb_port=args.pgb_port, db_port=args.db_port, ui_port=args.ui_port)
+            cfgs: Dict[str, str] = {}
             for p in region_proxies:
                 dcp_host = pick_dcp_ssh_host(p, args.ssh_user, args.ssh_key)
-                push_haproxy_cfg(dcp_host, args.ssh_user, args.ssh_key, cfg, bastion=None)
+                cfgs[dcp_host] = render_haproxy_cfg(
+                    pgb_ips,
+                    db_ips,
+                    pgb_port=args.pgb_port,
+                    db_port=args.db_port,
+                    ui_port=args.ui_port,
+                    latency_ms=dcp_latencies(p),
+                    slack_ms=args.latency_slack_ms,
+                )
+
+            if args.verify_reload:
+                conninfo = libpq_conninfo(
+                    f"pgb.{region}.{args.dns_zone}",
+                    args.pgb_port,
+                    args.database,
+                    args.pgb_client_user,
+                    certs_dir=certs_dir if args.auth_mode == "cert" else None,
+                    password=args.password,
+                )
+                dropped = verify_hitless_reload(
+                    conninfo,
+                    args.ssh_user,
+                    args.ssh_key,
+                    cfgs,
+                    clients=args.reload_check_clients,
+                    duration=args.reload_check_seconds,
+                )
+                if dropped:
+                    raise RuntimeError(f"HAProxy reload in {region} dropped {dropped} client sessions")
+            else:
+                for dcp_host, cfg in cfgs.items():
+                    push_haproxy_cfg(dcp_host, args.ssh_user, args.ssh_key, cfg, bastion=None)
+
+    # 9a) Hot certificate rotation
+    if args.rotate_certs:
+        rotate_cluster_certs(
+            nodes,
+            dcp_by_region,
+            args.ssh_user,
+            args.ssh_key,
+            args.dns_zone,
+            certs_dir,
+            ca_key,
+            args.auth_mode,
+            args.pgb_client_user,
+            args.pgb_server_user,
+            args.db_port,
+            key_type=args.key_type,
+        )
 
     # 10) Validation
     if not args.skip_validation:
@@ -978,10 +1890,152 @@ def main():
             if args.auth_mode == "cert":
                 validate_region_cert(region, args.dns_zone, certs_dir, args.pgb_client_user, args.database, args.pgb_port, args.db_port)
             else:
-                validate_region_password(region, args.dns_zone, args.pgb_client_user, args.password, args.database, args.pgb_port, args.db_port)
+                validate_region_password(region, args.dns_zone, args.pgb_client_user, args.password, args.database, args.pgb_port)
+
+        if args.smoke_bench:
+            ensure_smoke_table(
+                nodes[0]["ssh_host"],
+                args.ssh_user,
+                args.ssh_key,
+                args.database,
+                args.pgb_client_user,
+                db_port=args.db_port,
+                bastion=nodes[0]["bastion"],
+            )
+
+            results: Dict[str, Dict[str, Dict[str, float]]] = {}
+            for region in sorted(dcp_by_region.keys()):
+                for endpoint, port in (("db", args.db_port), ("pgb", args.pgb_port)):
+                    print(f"\n⏱️ smoke benchmark {endpoint}.{region}")
+                    conninfo = libpq_conninfo(
+                        f"{endpoint}.{region}.{args.dns_zone}",
+                        port,
+                        args.database,
+                        args.pgb_client_user,
+                        certs_dir=certs_dir if args.auth_mode == "cert" else None,
+                        password=args.password,
+                    )
+                    results.setdefault(region, {})[endpoint] = smoke_benchmark_endpoint(
+                        conninfo,
+                        connects=args.smoke_connects,
+                        clients=args.smoke_clients,
+                        multiplex_clients=args.smoke_multiplex_clients,
+                        seconds=args.smoke_seconds,
+                    )
+            print(json.dumps(results, indent=2))
+
+            baseline_file = Path(args.smoke_baseline_file).expanduser()
+            if args.smoke_update_baseline:
+                baseline_file.write_text(json.dumps(results, indent=2) + "\n")
+                print(f"✅ smoke baseline written to {baseline_file}")
+            elif baseline_file.exists():
+                failures = compare_smoke_results(results, json.loads(baseline_file.read_text()), args.smoke_tolerance)
+                if failures:
+                    raise RuntimeError("Smoke benchmark below baseline:\n  " + "\n  ".join(failures))
+                print("✅ smoke benchmark within baseline")
+            else:
+                print(f"⚠️ {baseline_file} not found, run with --smoke-update-baseline to record one")
+
+    # 10a) TLS + auth handshake benchmark
+    if args.handshake_bench:
+        # password mode authenticates with SCRAM, cert mode with the client cert
+        auth_label = "cert" if args.auth_mode == "cert" else "scram"
+        key_types = [k.strip() for k in args.handshake_key_types.split(",") if k.strip()]
+        results_file = Path(args.handshake_results_file).expanduser()
+        results = json.loads(results_file.read_text()) if results_file.exists() else {}
+
+        for key_type in key_types:
+            if key_type not in KEY_TYPES:
+                raise RuntimeError(f"Unsupported key type: {key_type}")
+            print(f"\n🤝 handshake benchmark: {auth_label} auth, {key_type} certificates")
+            rotate_cluster_certs(
+                nodes,
+                dcp_by_region,
+                args.ssh_user,
+                args.ssh_key,
+                args.dns_zone,
+                certs_dir,
+                ca_key,
+                args.auth_mode,
+                args.pgb_client_user,
+                args.pgb_server_user,
+                args.db_port,
+                key_type=key_type,
+            )
+
+            for region in sorted(dcp_by_region.keys()):
+                # only record numbers for the certificates that were just installed,
+                # PgBouncer's own server cert is only issued (and rotated) in cert mode
+                expect_served_key_type(f"db.{region}.{args.dns_zone}:{args.db_port}", key_type)
+                if args.auth_mode == "cert":
+                    expect_served_key_type(f"pgb.{region}.{args.dns_zone}:{args.pgb_port}", key_type)
+                conninfos = {
+                    endpoint: libpq_conninfo(
+                        f"{endpoint}.{region}.{args.dns_zone}",
+                        port,
+                        args.database,
+                        args.pgb_client_user,
+                        certs_dir=certs_dir if args.auth_mode == "cert" else None,
+                        password=args.password,
+                    )
+                    for endpoint, port in (("db", args.db_port), ("pgb", args.pgb_port))
+                }
+                results.setdefault(auth_label, {}).setdefault(key_type, {})[region] = handshake_benchmark(
+                    conninfos,
+                    clients=args.handshake_clients,
+                    seconds=args.handshake_seconds,
+                )
+
+        results_file.write_text(json.dumps(results, indent=2) + "\n")
+        print(json.dumps(results.get(auth_label, {}), indent=2))
+
+        def pgb_rate(key_type: str) -> float:
+            regions = results[auth_label][key_type].values()
+            return sum(r["pgb"]["connects_per_s"] for r in regions) / max(1, len(regions))
+
+        winner = max(key_types, key=pgb_rate)
+        print(f"🏁 fastest {auth_label} handshakes through PgBouncer with {winner} certificates")
+        if winner != key_types[-1]:
+            rotate_cluster_certs(
+                nodes,
+                dcp_by_region,
+                args.ssh_user,
+                args.ssh_key,
+                args.dns_zone,
+                certs_dir,
+                ca_key,
+                args.auth_mode,
+                args.pgb_client_user,
+                args.pgb_server_user,
+                args.db_port,
+                key_type=winner,
+            )
+        print(f"🔐 {winner} certificates installed, pass --key-type {winner} on later runs to keep issuing them")
 
     print("\n✅ Bootstrap complete: Cockroach + PgBouncer + HAProxy configured and validated")
 
+    # 11) Admission-aware HAProxy weights (long running)
+    if args.feed_weights:
+        targets = []
+        for region, region_proxies in dcp_by_region.items():
+            db_ips = [n["private_ip"] for n in crdb_by_region.get(region, [])]
+            if not db_ips:
+                raise RuntimeError(f"No Cockroach nodes found for region {region}")
+            targets.append({
+                "region": region,
+                "dcp_hosts": [pick_dcp_ssh_host(p, args.ssh_user, args.ssh_key) for p in region_proxies],
+                "backend_ips": db_ips,
+            })
+
+        feed_haproxy_weights(
+            targets,
+            args.ssh_user,
+            args.ssh_key,
+            ui_port=args.ui_port,
+            interval=args.weight_interval,
+            iterations=args.weight_iterations,
+        )
+
 
 if __name__ == "__main__":
     main()
@@ -132,6 +132,11 @@ while [[ $# -ge 1 ]]; do
     shift
 done
 
+# controller-managed list of the lowest-latency CRDB nodes (runner.env), takes precedence over --host-ip
+if [[ -n "${PGB_HOST_LIST}" ]]; then
+    HOST_IP="${PGB_HOST_LIST}"
+fi
+
 echo "executing ${PROG} from ${SCRIPT_DIR} with:
     PGBOUNCER_CLIENT=${PGBOUNCER_CLIENT}
     AUTH_MODE=${AUTH_MODE}
@@ -0,0 +1,137 @@
+"""
+Open-loop, constant arrival rate scheduling for the workload loop() functions.
+
+By default every loop() sleeps around `delay` ms and then runs its functions, so
+each thread is a closed loop: when the database slows down the threads issue
+fewer cycles and the offered load drops with it.  The latency dbworkload reports
+then leaves out the time requests would have spent waiting (coordinated
+omission), which understates the difference between direct and pooled runs.
+
+With an arrival rate the worker issues loop() cycles on a fixed schedule
+instead.  Every thread takes its next intended start time from one schedule per
+process, sleeps until then, or starts immediately if the schedule is already
+behind, and the schedule never slips to wait for slow cycles.  Latency is
+measured from the intended start into the workload's latency histograms:
+
+  open/<fn>       op latency plus how far behind schedule its cycle started
+  open/__cycle__  end of the cycle's last function minus its intended start
+  lag/__cycle__   how far behind schedule each cycle started
+
+  distribution  poisson  exponential gaps between arrivals (independent clients)
+                fixed    evenly spaced arrivals
+
+`rate` is cycles per second for the whole worker.  dbworkload splits a worker's
+threads over several processes, so each thread adds rate / total_thread_count
+to its process's schedule when it joins.  The worker needs enough connections
+to keep up (roughly rate * cycle latency), otherwise the lag keeps growing,
+which is the latency a real client population would see.
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from latency_histograms import OPEN
+
+POISSON = "poisson"
+FIXED = "fixed"
+DISTRIBUTIONS = (POISSON, FIXED)
+
+CYCLE = "__cycle__"
+BEHIND_WARN_S = 10.0  # warn once when the schedule falls this far behind
+
+
+class ArrivalSchedule:
+    """Intended start times shared by every thread of one worker process."""
+
+    def __init__(self, distribution: str):
+        self.distribution = distribution
+        self.lock = threading.Lock()
+        self.rate = 0.0
+        self.next_at: Optional[float] = None
+        self.warned = False
+
+    def join(self, rate: float):
+        with self.lock:
+            self.rate += rate
+
+    def next(self) -> float:
+        with self.lock:
+            now = time.perf_counter()
+            if self.next_at is None:
+                self.next_at = now
+            at = self.next_at
+            if self.distribution == POISSON:
+                self.next_at += random.expovariate(self.rate)
+            else:
+                self.next_at += 1 / self.rate
+            if not self.warned and now - at > BEHIND_WARN_S:
+                self.warned = True
+                print(f"[arrival] schedule is {now - at:.1f}s behind at {self.rate:.1f}/s, "
+                      f"add connections or lower the arrival rate")
+            return at
+
+
+_schedules: Dict[tuple, ArrivalSchedule] = {}
+_schedules_lock = threading.Lock()
+
+
+def shared_schedule(rate: float, distribution: str) -> ArrivalSchedule:
+    key = (rate, distribution)
+    with _schedules_lock:
+        if key not in _schedules:
+            _schedules[key] = ArrivalSchedule(distribution)
+        return _schedules[key]
+
+
+class ArrivalScheduler:
+    """
+    One per workload instance (thread or async session).  join() once from
+    setup(), then wait() (or await wait_async()) at the top of every loop().
+    """
+
+    def __init__(self, rate: float, distribution: str, latency=None):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"arrival must be one of {DISTRIBUTIONS}, got {distribution!r}")
+        self.rate = rate
+        self.schedule = shared_schedule(rate, distribution)
+        self.latency = latency
+        self.intended: Optional[float] = None
+        self.lag = 0.0
+
+    def join(self, total_thread_count: int):
+        self.schedule.join(self.rate / max(1, total_thread_count))
+
+    def _next(self) -> float:
+        # the previous cycle ends when the runner asks for the next one
+        now = time.perf_counter()
+        if self.intended is not None and self.latency is not None:
+            self.latency.record(f"{OPEN}/{CYCLE}", now - self.intended)
+        self.intended = self.schedule.next()
+        return self.intended - now
+
+    def _started(self):
+        # timed_op adds the lag to every function of the cycle
+        self.lag = max(0.0, time.perf_counter() - self.intended)
+        if self.latency is not None:
+            self.latency.record(f"lag/{CYCLE}", self.lag)
+
+    def wait(self):
+        delay = self._next()
+        if delay > 0:
+            time.sleep(delay)
+        self._started()
+
+    async def wait_async(self):
+        delay = self._next()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._started()
+
+
+def arrival_scheduler(rate: float, distribution: str, latency=None) -> Optional[ArrivalScheduler]:
+    """None for a rate of 0, which keeps the closed loop with its `delay` sleep."""
+    if rate <= 0:
+        return None
+    return ArrivalScheduler(rate, distribution, latency)
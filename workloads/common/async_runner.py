@@ -0,0 +1,277 @@
+"""
+Asyncio driver for the async workload variants (transactions*Async.py).
+
+dbworkload runs one OS thread per connection, which tops out at a few hundred
+connections per container before the GIL and thread scheduling start to distort
+latency.  This runner drives thousands of client sessions from a single event
+loop, each with its own psycopg.AsyncConnection, so one container can open as
+many sessions as PgBouncer's max_client_conn allows.
+
+The workload contract is the same as dbworkload's, but async:
+
+  class <Stem>:                                   # file stem, first letter capitalized
+      def __init__(self, args: dict)
+      async def setup(self, conn, id: int, total_thread_count: int)
+      async def loop(self) -> list               # async functions taking conn
+
+The final summary mirrors dbworkload's (run_name / start_time / end_time and a
+per-function latency table) so run_workloads.sh can aggregate the worker logs
+and compute the phase window the same way.
+
+Usage:
+  python async_runner.py -w transactionsHotspotAsync.py -c 4096 -i 100000 \\
+      --uri "postgresql://..." --args '{"delay": 10000, "txn_pooling": true}'
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import psycopg
+
+from workload_loader import load_workload_class
+
+CYCLE = "__cycle__"
+
+
+# ----------------------------
+# Connections
+# ----------------------------
+
+def with_application_name(uri: str, app_name: str) -> str:
+    # the comparative metrics query joins statement stats on application_name
+    if "application_name=" in uri:
+        return uri
+    return f"{uri}{'&' if '?' in uri else '?'}application_name={app_name}"
+
+
+# ----------------------------
+# Latency stats
+# ----------------------------
+
+class LatencyStats:
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.reported: Dict[str, int] = defaultdict(int)
+
+    def record(self, name: str, ms: float):
+        self.samples[name].append(ms)
+
+    def error(self, name: str):
+        self.errors[name] += 1
+
+    def rows(self, elapsed_s: float, sessions: int, window_s: Optional[float] = None) -> List[List[Any]]:
+        # with a window only the samples since the previous report are included
+        since_last = window_s is not None
+        window_s = window_s or elapsed_s
+        rows = []
+        for name in sorted(self.samples):
+            values = self.samples[name]
+            if since_last:
+                values = values[self.reported[name]:]
+                self.reported[name] = len(self.samples[name])
+            if not values:
+                continue
+            arr = np.asarray(values)
+            p50, p90, p95, p99 = np.percentile(arr, [50, 90, 95, 99])
+            rows.append([
+                int(elapsed_s), name, sessions, len(arr), int(len(arr) / max(window_s, 1)),
+                arr.mean(), p50, p90, p95, p99, arr.max(), self.errors.get(name, 0),
+            ])
+        return rows
+
+
+HEADERS = ["elapsed", "id", "threads", "tot_ops", "tot_ops/s", "mean(ms)",
+           "p50(ms)", "p90(ms)", "p95(ms)", "p99(ms)", "max(ms)", "errors"]
+
+
+def format_table(rows: List[List[Any]]) -> str:
+    def cell(v):
+        if isinstance(v, float):
+            return f"{v:,.2f}"
+        if isinstance(v, int):
+            return f"{v:,}"
+        return str(v)
+
+    cells = [HEADERS] + [[cell(v) for v in r] for r in rows]
+    widths = [max(len(r[i]) for r in cells) for i in range(len(HEADERS))]
+    lines = []
+    for n, r in enumerate(cells):
+        lines.append("  ".join(c.ljust(w) if i == 1 else c.rjust(w) for i, (c, w) in enumerate(zip(r, widths))))
+        if n == 0:
+            lines.append("  ".join("-" * w for w in widths))
+    return "\n".join(lines)
+
+
+# ----------------------------
+# Sessions
+# ----------------------------
+
+class Runner:
+
+    def __init__(self, opts: argparse.Namespace):
+        self.opts = opts
+        self.workload_cls = load_workload_class(opts.workload)
+        self.app_name = opts.app_name or self.workload_cls.__name__
+        self.uri = with_application_name(opts.uri, self.app_name)
+        self.args: Dict[str, Any] = json.loads(opts.args) if opts.args else {}
+        self.stats = LatencyStats()
+        self.stop = asyncio.Event()
+        self.connect_sem = asyncio.Semaphore(opts.connect_concurrency)
+        self.cycles_left: Optional[int] = opts.iterations
+        self.connected = 0
+
+
+    def _claim_cycle(self) -> bool:
+        if self.cycles_left is None:
+            return True
+        if self.cycles_left <= 0:
+            return False
+        self.cycles_left -= 1
+        return True
+
+
+    async def _connect(self) -> psycopg.AsyncConnection:
+        async with self.connect_sem:
+            return await psycopg.AsyncConnection.connect(self.uri, autocommit=True)
+
+
+    async def session(self, id: int):
+        # spread the initial connects over the ramp so we don't open thousands at once
+        if self.opts.ramp > 0:
+            await asyncio.sleep(self.opts.ramp * id / self.opts.concurrency)
+        if self.stop.is_set():
+            return
+
+        conn = await self._connect()
+        self.connected += 1
+        try:
+            workload = self.workload_cls(self.args)
+            await workload.setup(conn, id, self.opts.concurrency)
+
+            while not self.stop.is_set() and self._claim_cycle():
+                cycle_start = time.perf_counter()
+                for fn in await workload.loop():
+                    start = time.perf_counter()
+                    try:
+                        await fn(conn)
+                    except Exception as e:
+                        self.stats.error(fn.__name__)
+                        print(f"[session {id}] {fn.__name__} failed: {e}")
+                        if conn.closed:
+                            conn = await self._connect()
+                            await workload.setup(conn, id, self.opts.concurrency)
+                        break
+                    self.stats.record(fn.__name__, (time.perf_counter() - start) * 1000)
+                self.stats.record(CYCLE, (time.perf_counter() - cycle_start) * 1000)
+        finally:
+            self.connected -= 1
+            await conn.close()
+
+
+    async def report_progress(self, started: float):
+        last = started
+        while not self.stop.is_set():
+            try:
+                await asyncio.wait_for(self.stop.wait(), timeout=self.opts.interval)
+            except asyncio.TimeoutError:
+                pass
+            now = time.monotonic()
+            rows = self.stats.rows(now - started, self.connected, window_s=now - last)
+            last = now
+            elapsed = now - started
+            if rows:
+                print(f"\n[progress] {int(elapsed)}s, {self.connected} sessions connected")
+                print(format_table(rows), flush=True)
+
+
+    async def run(self):
+        start_time = datetime.now(timezone.utc)
+        started = time.monotonic()
+        print(f"Launching {self.opts.concurrency} async sessions of {self.app_name}", flush=True)
+
+        sessions = [asyncio.create_task(self.session(i)) for i in range(self.opts.concurrency)]
+        progress = asyncio.create_task(self.report_progress(started))
+
+        # wait() doesn't cancel what's still running when the duration elapses: the
+        # sessions stop claiming cycles and in-flight transactions finish their current function
+        await asyncio.wait(sessions, timeout=self.opts.duration)
+        self.stop.set()
+        results = await asyncio.gather(*sessions, return_exceptions=True)
+        await progress
+
+        for r in results:
+            if isinstance(r, BaseException):
+                print(f"[session] aborted: {r!r}")
+
+        end_time = datetime.now(timezone.utc)
+        elapsed = time.monotonic() - started
+        # per-function stats are recomputed over the whole run for the summary
+        self.stats.reported.clear()
+        self.print_summary(start_time, end_time, elapsed)
+
+
+    def print_summary(self, start_time: datetime, end_time: datetime, elapsed: float):
+        params = [
+            ("workload_path", os.path.abspath(self.opts.workload)),
+            ("conn_params", {"conninfo": self.uri, "autocommit": True}),
+            ("concurrency", self.opts.concurrency),
+            ("duration", self.opts.duration or ""),
+            ("iterations", self.opts.iterations or ""),
+            ("ramp", self.opts.ramp),
+            ("args", self.args),
+        ]
+        print()
+        print(f"run_name       {self.app_name}.{start_time.strftime('%Y%m%d_%H%M%S')}")
+        print(f"start_time     {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"end_time       {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"test_duration  {int(elapsed)}")
+        print()
+        print(format_table(self.stats.rows(elapsed, self.opts.concurrency)))
+        print()
+        for k, v in params:
+            print(f"{k:<14} {v}")
+        sys.stdout.flush()
+
+
+# ----------------------------
+# Argument parsing
+# ----------------------------
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Run an async workload class with thousands of sessions on one event loop")
+    ap.add_argument("-w", "--workload", required=True, help="Path to the async workload file")
+    ap.add_argument("-c", "--concurrency", type=int, default=1024, help="Number of client sessions")
+    ap.add_argument("-i", "--iterations", type=int, default=None, help="Total loop() cycles across all sessions")
+    ap.add_argument("-d", "--duration", type=int, default=None, help="Stop after this many seconds")
+    ap.add_argument("-r", "--ramp", type=float, default=0, help="Seconds over which to spread the initial connects")
+    ap.add_argument("--uri", required=True, help="libpq connection string")
+    ap.add_argument("-a", "--app-name", default=None,
+                    help="application_name for the sessions, defaults to the workload class name")
+    ap.add_argument("--args", default="{}", help="JSON dict passed to the workload class")
+    ap.add_argument("--connect-concurrency", type=int, default=100,
+                    help="Max connection attempts in flight at once")
+    ap.add_argument("--interval", type=float, default=10, help="Seconds between progress reports")
+    return ap.parse_args()
+
+
+def main():
+    opts = parse_args()
+    if opts.iterations is None and opts.duration is None:
+        raise SystemExit("one of --iterations or --duration is required")
+    if sys.platform == "win32":
+        # psycopg async needs a selector loop on windows
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(Runner(opts).run())
+
+
+if __name__ == "__main__":
+    main()
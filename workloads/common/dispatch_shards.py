@@ -0,0 +1,61 @@
+"""
+Bucket assignment for the sharded outbox dispatcher.
+
+The shared dispatcher has every thread run
+
+  SELECT id FROM outbox WHERE is_published = false
+  ORDER BY "timestamp" LIMIT n FOR UPDATE SKIP LOCKED
+
+against the same end of the same index.  All of them read the same oldest rows,
+all but one find them locked and skip on to the next ones, so the extra threads
+mostly add lock traffic and dispatcher throughput flattens out.
+
+In sharded mode every outbox row carries a `bucket` (0 .. buckets-1, assigned at
+insert by the schema's DEFAULT) and the partial dispatcher index leads with it.
+Each dispatcher thread owns the buckets for its slot, worker * threads + id,
+and claims from one of them per dispatch, round robin:
+
+  slots <= buckets   buckets slot, slot + slots, slot + 2 * slots, ... (1 or more each)
+  slots > buckets    bucket slot % buckets, shared by about slots / buckets threads
+
+When the owned bucket doesn't fill the batch the thread steals the rest from up
+to `steal` other buckets picked at random, so rows in buckets whose owner is
+busy or gone still get published.
+"""
+import random
+from typing import List
+
+SHARED = "shared"
+SHARDED = "sharded"
+DISPATCHERS = (SHARED, SHARDED)
+
+
+class DispatchShards:
+
+    def __init__(self, buckets: int, steal: int = 2):
+        if buckets < 1:
+            raise ValueError(f"dispatch buckets must be at least 1, got {buckets}")
+        self.buckets = buckets
+        self.steal = steal
+        self.owned: List[int] = list(range(buckets))
+        self.others: List[int] = []
+        self.turn = 0
+
+    def assign(self, id: int, total_thread_count: int, worker: int = 0, workers: int = 1):
+        """Own the buckets for this thread's slot across every worker's threads."""
+        slots = max(1, total_thread_count) * max(1, workers)
+        slot = (worker * max(1, total_thread_count) + id) % slots
+        if slots > self.buckets:
+            self.owned = [slot % self.buckets]
+        else:
+            self.owned = list(range(slot, self.buckets, slots))
+        owned = set(self.owned)
+        self.others = [b for b in range(self.buckets) if b not in owned]
+        # start the round robin at a different bucket on each thread that shares them
+        self.turn = slot // self.buckets
+
+    def plan(self) -> List[int]:
+        """The owned bucket to claim from first, then the buckets to steal from."""
+        bucket = self.owned[self.turn % len(self.owned)]
+        self.turn += 1
+        return [bucket] + random.sample(self.others, min(self.steal, len(self.others)))
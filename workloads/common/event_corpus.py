@@ -0,0 +1,133 @@
+"""
+Client-side train event payloads for the train-events COPY ingest mode.
+
+The SQL ingest path builds every event on the gateway with nested
+jsonb_build_object / generate_series / random() calls, so part of the measured
+cost is CockroachDB synthesizing data rather than ingesting it.  This module
+pre-generates a corpus of realistic events once per worker process (shared by
+every thread), with the JSON already serialized, and loads sampled events with
+COPY ... FROM STDIN so the database only does the ingest.
+
+Events have the same shape as the SQL generator in transactionsJsonb.py and are
+given a fresh client-generated UUID on every sample, so status rows can be
+copied in the same transaction without a RETURNING round trip.
+"""
+import json
+import random
+import threading
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from psycopg.types.json import Jsonb
+
+EVENT_TYPES = [
+    "ROUTE_AUTHORIZATION",
+    "SIGNAL_CLEAR",
+    "SPEED_RESTRICTION",
+    "TRACK_OUT_OF_SERVICE",
+    "TRAIN_POSITION_UPDATE",
+    "SWITCH_POSITION_CHANGE",
+    "WORK_ZONE_PROTECTION",
+    "CROSSING_FAILURE",
+    "POWER_OUTAGE",
+    "DISPATCH_NOTE",
+]
+DIRECTIONS = ["NORTHBOUND", "SOUTHBOUND", "EASTBOUND", "WESTBOUND"]
+
+
+class Event(NamedTuple):
+    id: uuid.UUID
+    payload: str          # serialized JSON
+    event_type: str
+    authority_id: str
+    train_id: str
+
+
+def build_event(rng: random.Random) -> Dict:
+    created_at = datetime.now(timezone.utc) - timedelta(seconds=rng.random() * 21 * 86400)
+    train_date = date.today() - timedelta(days=rng.randrange(30))
+    return {
+        "eventType": rng.choice(EVENT_TYPES),
+        "authorityId": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "deviceKey": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "state": "NEW",
+        "createdAt": created_at.isoformat(),
+        "route": {
+            "segments": [
+                {
+                    "id": 1000 + rng.randrange(500),
+                    "direction": rng.choice(DIRECTIONS),
+                    "trackSections": [2000 + rng.randrange(200) for _ in range(3)],
+                }
+                for _ in range(3)
+            ],
+            "switches": [
+                {"id": 3000 + rng.randrange(500), "position": rng.choice(["NORMAL", "REVERSE"])}
+                for _ in range(2)
+            ],
+            "attributes": {"ALLOW_PASS": True, "REQUIRES_ACK": False, "SLOW_ORDER": False},
+            "signalId": 9001,
+        },
+        "metrics": {
+            "flags": {"onTrack": rng.random() < 0.8, "fleeted": rng.random() < 0.2},
+            "circuitIds": [7000 + rng.randrange(1000) for _ in range(4)],
+            "confidence": 0.5 + rng.random() / 2.0,
+        },
+        "train": {
+            "trainId": f"RR-{1 + rng.randrange(99)}-{10000 + rng.randrange(90000)}-{train_date:%Y%m%d}",
+            "withinLimits": rng.random() < 0.5,
+            "direction": rng.choice(DIRECTIONS),
+        },
+        "meta": {"userId": "operator01", "logicalPos": "SYS01", "sourceSystem": "SIMULATOR"},
+    }
+
+
+class EventCorpus:
+
+    def __init__(self, size: int, seed: Optional[int] = None):
+        rng = random.Random(seed)
+        self.entries = []
+        for _ in range(size):
+            event = build_event(rng)
+            self.entries.append((
+                json.dumps(event, separators=(",", ":")),
+                event["eventType"],
+                event["authorityId"],
+                event["train"]["trainId"],
+            ))
+
+    def sample(self, n: int) -> List[Event]:
+        return [Event(uuid.uuid4(), *random.choice(self.entries)) for _ in range(n)]
+
+
+_corpora: Dict[int, EventCorpus] = {}
+_corpora_lock = threading.Lock()
+
+
+def shared_corpus(size: int = 10000) -> EventCorpus:
+    # built once per process, the first thread to ask pays for it
+    with _corpora_lock:
+        if size not in _corpora:
+            _corpora[size] = EventCorpus(size)
+        return _corpora[size]
+
+
+def jsonb_text(payload: str) -> Jsonb:
+    # already serialized, so dump it as-is instead of json.dumps-ing a str
+    return Jsonb(payload, dumps=str)
+
+
+def copy_rows(cur, table: str, columns: Sequence[str], rows, types: Optional[Sequence[str]] = None):
+    """
+    COPY `rows` into `table`.  With `types` (one postgres type name per column)
+    the binary COPY format is used, otherwise text.
+    """
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    if types:
+        sql += " WITH BINARY"
+    with cur.copy(sql) as copy:
+        if types:
+            copy.set_types(list(types))
+        for row in rows:
+            copy.write_row(row)
@@ -0,0 +1,161 @@
+"""
+Skewed key-access distributions for picking which rows a workload touches.
+
+Uniform picks spread reads and writes evenly over the key space, so no two
+connections ever fight over a row.  Production traffic piles onto a few hot
+flights and the most recent messages instead, and that contention is where
+pooling, retries and lock waits show up.  A KeyDistribution maps a random draw
+onto an index in [0, count) of whatever key list the workload samples from:
+
+  uniform   every index equally likely (the previous behaviour)
+  zipfian   index 0 hottest, then 1, 2, ... with weight 1 / (rank + 1)^theta;
+            theta near 1 concentrates on a handful of keys, near 0 is almost uniform
+  hotset    `hot_access` of the picks go to the first `hot_fraction` of the
+            indexes, the rest to the cold remainder, uniformly within each set
+  latest    zipfian from the other end: the last index (the newest key) hottest
+
+Zipfian draws use the constant time method from Gray et al., "Quickly
+Generating Billion-Record Synthetic Databases" (the YCSB generator).  Its zeta
+constant is a sum over every index, so it's cached per theta for the process
+and only extended when the key count grows.
+
+RecentKeys is a per-process ring of ids the workload inserted itself, for
+point-lookup phases that used to read and update only the rows they had just
+written.  With latest the newest ids are hottest; with the other distributions
+hot indexes are ring slots, which keep their id until the ring wraps.
+"""
+import random
+import threading
+from typing import Dict, Optional, Tuple
+
+UNIFORM = "uniform"
+ZIPFIAN = "zipfian"
+HOTSET = "hotset"
+LATEST = "latest"
+DISTRIBUTIONS = (UNIFORM, ZIPFIAN, HOTSET, LATEST)
+
+_zetas: Dict[float, Tuple[int, float]] = {}
+_zetas_lock = threading.Lock()
+
+
+def _zeta(n: int, theta: float) -> float:
+    """sum(1 / i^theta for i in 1..n), extended from the cached sum for theta."""
+    with _zetas_lock:
+        cached_n, total = _zetas.get(theta, (0, 0.0))
+        if n < cached_n:
+            # the key space shrank, start over rather than subtract float error back out
+            cached_n, total = 0, 0.0
+        for i in range(cached_n + 1, n + 1):
+            total += 1 / i ** theta
+        _zetas[theta] = (n, total)
+        return total
+
+
+class KeyDistribution:
+
+    def __init__(self, name: str, theta: float = 0.99, hot_fraction: float = 0.2, hot_access: float = 0.8):
+        if name not in DISTRIBUTIONS:
+            raise ValueError(f"key distribution must be one of {DISTRIBUTIONS}, got {name!r}")
+        if name in (ZIPFIAN, LATEST) and not 0 < theta < 1:
+            raise ValueError(f"zipfian theta must be between 0 and 1, got {theta}")
+        if name == HOTSET and not (0 < hot_fraction < 1 and 0 <= hot_access <= 1):
+            raise ValueError(f"hot_fraction must be between 0 and 1 and hot_access between 0 and 1, "
+                             f"got {hot_fraction} and {hot_access}")
+        self.name = name
+        self.theta = theta
+        self.hot_fraction = hot_fraction
+        self.hot_access = hot_access
+        self.alpha = 1 / (1 - theta)
+        self.zeta2 = 1 + 0.5 ** theta
+        # per key count constants, recomputed when the count changes
+        self.count = 0
+        self.zetan = 0.0
+        self.eta = 0.0
+
+    @property
+    def recency(self) -> bool:
+        """True when the hottest index is the newest key rather than a fixed one."""
+        return self.name == LATEST
+
+    def _zipf_rank(self, count: int) -> int:
+        if count < 2:
+            return 0
+        if count != self.count:
+            zetan = _zeta(count, self.theta)
+            self.eta = (1 - (2 / count) ** (1 - self.theta)) / (1 - self.zeta2 / zetan)
+            self.zetan = zetan
+            self.count = count
+        u = random.random()
+        uz = u * self.zetan
+        if uz < 1:
+            return 0
+        if uz < self.zeta2:
+            return 1
+        return min(count - 1, int(count * (self.eta * u - self.eta + 1) ** self.alpha))
+
+    def index(self, count: int) -> int:
+        if self.name == ZIPFIAN:
+            return self._zipf_rank(count)
+        if self.name == LATEST:
+            return count - 1 - self._zipf_rank(count)
+        if self.name == HOTSET:
+            hot = max(1, int(count * self.hot_fraction))
+            if hot >= count or random.random() < self.hot_access:
+                return random.randrange(hot)
+            return random.randrange(hot, count)
+        return random.randrange(count)
+
+
+def key_distribution(name: str, theta: float = 0.99, hot_fraction: float = 0.2,
+                     hot_access: float = 0.8) -> Optional[KeyDistribution]:
+    """None for "none", which keeps a workload on the keys it just wrote."""
+    if name == "none":
+        return None
+    return KeyDistribution(name, theta, hot_fraction, hot_access)
+
+
+class RecentKeys:
+    """The last `capacity` ids inserted by any thread of this process."""
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError(f"recent key capacity must be at least 1, got {capacity}")
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.slots: list = [None] * capacity
+        self.cursor = 0
+        self.filled = 0
+
+    def add(self, ids):
+        with self.lock:
+            for key in ids:
+                self.slots[self.cursor] = key
+                self.cursor = (self.cursor + 1) % self.capacity
+                self.filled = min(self.filled + 1, self.capacity)
+
+    def sample(self, n: int, distribution: KeyDistribution) -> list:
+        with self.lock:
+            count = self.filled
+            if count == 0:
+                return []
+            out = []
+            for _ in range(n):
+                i = distribution.index(count)
+                if distribution.recency:
+                    # index count - 1 is the newest id, just behind the write cursor
+                    i = (self.cursor - count + i) % self.capacity
+                out.append(self.slots[i])
+            return out
+
+
+_recent: Dict[tuple, RecentKeys] = {}
+_recent_lock = threading.Lock()
+
+
+def shared_recent_keys(name: str, capacity: int) -> RecentKeys:
+    """One pool per process for each workload and capacity."""
+    key = (name, capacity)
+    with _recent_lock:
+        if key not in _recent:
+            _recent[key] = RecentKeys(capacity)
+        return _recent[key]
@@ -0,0 +1,132 @@
+"""
+Cached primary key space for picking random rows by key.
+
+Picking a random page with OFFSET floor(random() * n) makes the database scan
+and throw away up to n rows on every call.  KeySpace streams a table's UUID
+keys once per worker process (as a follower read, so it doesn't contend with
+the workload), keeps them sorted and packed 16 bytes per key in one buffer, and
+reloads them every `refresh_s` so new rows get picked up.  Sampling then costs
+O(batch) instead of O(offset):
+
+  stride 1   every key is cached and sample() returns random keys without a query
+  stride N   only every Nth key is cached, as range boundaries; boundary() picks
+             one to read a page from by key (WHERE key >= %s ORDER BY key LIMIT n)
+
+Both take an optional KeyDistribution (key_distributions.py) to skew which
+keys, or which ranges, get picked.
+
+The first load runs on the calling thread (the workload's setup), and every
+other thread waits for it.  Later reloads run on a background thread with their
+own connection, started by whichever thread notices the snapshot is stale, so a
+full key scan never lands inside a timed workload operation.  The threads keep
+sampling the previous snapshot until the new one is swapped in.
+"""
+import random
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import psycopg
+
+from key_distributions import KeyDistribution
+
+UUID_BYTES = 16
+
+
+class KeySpace:
+
+    def __init__(self, table: str, column: str, stride: int = 1, refresh_s: float = 300.0):
+        if stride < 1:
+            raise ValueError(f"key stride must be at least 1, got {stride}")
+        self.table = table
+        self.column = column
+        self.stride = stride
+        self.refresh_s = refresh_s
+        self.lock = threading.Lock()
+        self.keys = b""
+        self.loaded_at: Optional[float] = None
+        self.loading = False
+
+    def refresh(self, conn):
+        # unlocked fast path, called on every sample
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh_s:
+            return
+        with self.lock:
+            if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh_s:
+                return
+            if not self.keys:
+                # nothing to sample from yet, every other thread waits for the first load
+                self._load(conn)
+                return
+            if self.loading:
+                return
+            self.loading = True
+        threading.Thread(target=self._reload, args=(conninfo(conn),), daemon=True,
+                         name=f"key-space-{self.table}").start()
+
+    def _reload(self, dsn: str):
+        try:
+            # prepare_threshold=None: nothing prepared, like the workloads under transaction pooling
+            with psycopg.connect(dsn, autocommit=True, prepare_threshold=None) as conn:
+                self._load(conn)
+        except Exception as e:
+            # keep sampling the previous snapshot and try again next interval
+            print(f"[key-space] refreshing {self.table}.{self.column} failed: {e}")
+            self.loaded_at = time.monotonic()
+        finally:
+            with self.lock:
+                self.loading = False
+
+    def _load(self, conn):
+        started = time.monotonic()
+        sql = (f"SELECT {self.column} FROM {self.table} AS OF SYSTEM TIME follower_read_timestamp() "
+               f"ORDER BY {self.column}")
+        packed = bytearray()
+        rows = 0
+        with conn.cursor() as cur:
+            # streamed so the worker never holds a million UUID objects at once
+            for (key,) in cur.stream(sql, size=10000):
+                if rows % self.stride == 0:
+                    packed += key.bytes
+                rows += 1
+        if not packed:
+            raise RuntimeError(f"no rows in {self.table} to sample {self.column} from")
+        # one attribute swap, samplers read either the old snapshot or the new one
+        self.keys = bytes(packed)
+        self.loaded_at = time.monotonic()
+        print(f"[key-space] {self.table}.{self.column}: {len(packed) // UUID_BYTES} keys cached from {rows} rows "
+              f"(stride {self.stride}) in {self.loaded_at - started:.1f}s")
+
+    def sample(self, n: int, distribution: Optional[KeyDistribution] = None) -> List[uuid.UUID]:
+        keys = self.keys
+        count = len(keys) // UUID_BYTES
+        out = []
+        for _ in range(n):
+            # keys are sorted, so a skewed distribution's hot indexes are a fixed set of keys
+            index = distribution.index(count) if distribution else random.randrange(count)
+            i = index * UUID_BYTES
+            out.append(uuid.UUID(bytes=keys[i:i + UUID_BYTES]))
+        return out
+
+    def boundary(self, distribution: Optional[KeyDistribution] = None) -> uuid.UUID:
+        return self.sample(1, distribution)[0]
+
+
+def conninfo(conn) -> str:
+    """Connection string for another connection like `conn`, password included (conn.info.dsn leaves it out)."""
+    params = {o.keyword.decode(): o.val.decode() for o in conn.pgconn.info if o.val is not None}
+    return psycopg.conninfo.make_conninfo(**params)
+
+
+_spaces: Dict[tuple, KeySpace] = {}
+_spaces_lock = threading.Lock()
+
+
+def shared_key_space(table: str, column: str, stride: int = 1, refresh_s: float = 300.0) -> KeySpace:
+    """One key space per process for each table, column and stride."""
+    key = (table, column, stride, refresh_s)
+    with _spaces_lock:
+        if key not in _spaces:
+            _spaces[key] = KeySpace(table, column, stride, refresh_s)
+        return _spaces[key]
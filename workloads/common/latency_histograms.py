@@ -0,0 +1,285 @@
+"""
+Per-operation HDR latency histograms for the workload classes.
+
+dbworkload only reports a per-function summary, with retries and backoff sleeps
+folded into the function's latency.  The workloads also record every operation
+here, in microseconds, into HdrHistograms tagged by what was timed:
+
+  op/<fn>        one workload function as dbworkload runs it (insert, process, schedule, ...)
+  txn/<fn>       one TxnRetryEngine.run(), end to end including retries and backoff
+  attempt/<fn>   one try of the transaction body, committed or not
+
+so retry cost shows up as more attempts per txn instead of disappearing into
+the tail of the op latency.  In open-loop mode (arrival.py) each op is also
+recorded under open/<fn>, measured from its cycle's intended start.
+
+Each thread records into its own histograms, so the hot path only takes that
+thread's (uncontended) lock.  At most every LOG_INTERVAL_S, and at exit, the
+first thread past the interval merges every thread's histograms into one
+histogram per tag and appends them to the process's interval log in the
+HdrHistogram log format (one "Tag=<tag>,start,length,max_ms,payload" line per
+tag and interval).  HDR histograms merge without losing precision, so
+
+  python latency_histograms.py logs/hdr_*.hlog
+
+reports exact percentiles up to p99.99 across any set of workers and phases.
+
+Needs the hdrhistogram package (pip install hdrhistogram).
+"""
+import argparse
+import atexit
+import functools
+import glob
+import inspect
+import json
+import multiprocessing.util
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+LOWEST_US = 1
+HIGHEST_US = 60 * 1000 * 1000  # longer values are clamped to 60s
+SIGNIFICANT_FIGURES = 3
+WORD_SIZE = 4  # 32-bit counts keep a per-thread histogram at ~70KB
+LOG_INTERVAL_S = 10.0
+PERCENTILES = (50, 90, 99, 99.9, 99.99)
+
+OP = "op"
+TXN = "txn"
+ATTEMPT = "attempt"
+OPEN = "open"
+
+DISABLED = "off"
+
+
+def _hdr_histogram():
+    try:
+        from hdrh.histogram import HdrHistogram
+    except ImportError:
+        raise RuntimeError("latency histograms need the hdrhistogram package: pip install hdrhistogram") from None
+    return HdrHistogram
+
+
+def new_histogram():
+    return _hdr_histogram()(LOWEST_US, HIGHEST_US, SIGNIFICANT_FIGURES, word_size=WORD_SIZE)
+
+
+def percentiles_ms(hist) -> Dict[str, float]:
+    line = {"count": hist.get_total_count()}
+    for p in PERCENTILES:
+        line[f"p{p:g}_ms"] = round(hist.get_value_at_percentile(p) / 1000, 3)
+    line["max_ms"] = round(hist.get_max_value() / 1000, 3)
+    return line
+
+
+class _ThreadHistograms:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hists: Dict[str, object] = {}
+
+
+class LatencyHistograms:
+    """
+    Per-process recorder shared by every worker thread.  record() goes to the
+    calling thread's histogram for `tag`; flush() swaps out every thread's
+    histograms, merges them and writes one interval per tag to `log_path`.
+    """
+
+    def __init__(self, log_path: str):
+        _hdr_histogram()  # fail at startup rather than on the first record
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.threads: List[_ThreadHistograms] = []
+        self.local = threading.local()
+        self.totals: Dict[str, object] = {}
+        self.start = time.time()
+        self.interval_start = self.start
+        self.log = None
+        self.closed = False
+        # worker processes started by multiprocessing leave through os._exit, which
+        # skips atexit but still runs multiprocessing's finalizers
+        multiprocessing.util.Finalize(self, self.close, exitpriority=10)
+        atexit.register(self.close)
+
+    def record(self, tag: str, seconds: float):
+        th = getattr(self.local, "hists", None)
+        if th is None:
+            th = self.local.hists = _ThreadHistograms()
+            with self.lock:
+                self.threads.append(th)
+        us = min(HIGHEST_US, max(LOWEST_US, int(seconds * 1_000_000)))
+        with th.lock:
+            hist = th.hists.get(tag)
+            if hist is None:
+                hist = th.hists[tag] = new_histogram()
+            hist.record_value(us)
+        if time.time() - self.interval_start >= LOG_INTERVAL_S:
+            self.flush()
+
+    def record_op(self, name: str, seconds: float, arrivals=None):
+        self.record(f"{OP}/{name}", seconds)
+        if arrivals is not None:
+            self.record(f"{OPEN}/{name}", seconds + arrivals.lag)
+
+    def flush(self, final: bool = False):
+        with self.lock:
+            now = time.time()
+            if not final and now - self.interval_start < LOG_INTERVAL_S:
+                return
+            merged: Dict[str, object] = {}
+            for th in self.threads:
+                # swap rather than reset, reset() walks the counts array in python
+                with th.lock:
+                    hists, th.hists = th.hists, {}
+                for tag, hist in hists.items():
+                    if tag in merged:
+                        merged[tag].add(hist)
+                    else:
+                        merged[tag] = hist
+            if merged:
+                self._write(merged, self.interval_start, now)
+            for tag, hist in merged.items():
+                if tag in self.totals:
+                    self.totals[tag].add(hist)
+                else:
+                    self.totals[tag] = hist
+            self.interval_start = now
+
+    def _write(self, merged: Dict[str, object], start: float, end: float):
+        if self.log is None:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            self.log = open(self.log_path, "w")
+            started = datetime.fromtimestamp(self.start, timezone.utc).isoformat()
+            self.log.write("#[Histogram log format version 1.3]\n")
+            self.log.write(f"#[StartTime: {self.start:.3f} (seconds since epoch), {started}]\n")
+            self.log.write('"StartTimestamp","Interval_Length","Interval_Max","Interval_Compressed_Histogram"\n')
+        for tag in sorted(merged):
+            hist = merged[tag]
+            self.log.write(f"Tag={tag},{start - self.start:.3f},{end - start:.3f},"
+                           f"{hist.get_max_value() / 1000:.3f},{hist.encode().decode()}\n")
+        self.log.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.flush(final=True)
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+        for tag in sorted(self.totals):
+            line = {"tag": tag, **percentiles_ms(self.totals[tag])}
+            print(f"[latency] {json.dumps(line)}", flush=True)
+
+
+_recorders: Dict[str, LatencyHistograms] = {}
+_recorders_lock = threading.Lock()
+
+
+def latency_histograms(log_path: str, name: str) -> Optional[LatencyHistograms]:
+    """
+    One recorder per process and log path.  An empty `log_path` logs to
+    logs/hdr_<name>_<pid>.hlog, an explicit one gets the pid appended as well
+    (logs/hdr_run_w0.hlog -> logs/hdr_run_w0_<pid>.hlog) since every worker
+    process of a container is passed the same path.  "off" disables recording
+    (returns None).
+    """
+    if log_path == DISABLED:
+        return None
+    if log_path:
+        root, ext = os.path.splitext(log_path)
+        log_path = f"{root}_{os.getpid()}{ext or '.hlog'}"
+    else:
+        log_path = os.path.join("logs", f"hdr_{name}_{os.getpid()}.hlog")
+    with _recorders_lock:
+        if log_path not in _recorders:
+            _recorders[log_path] = LatencyHistograms(log_path)
+        return _recorders[log_path]
+
+
+def timed_op(method):
+    """
+    Record a workload function under op/<name> in `self.latency` (skipped when
+    it's None), and under open/<name> when `self.arrivals` schedules the loop.
+    Keeps the function name, which dbworkload reports under.
+    """
+    name = method.__name__
+
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def timed_async(self, *args, **kwargs):
+            if self.latency is None:
+                return await method(self, *args, **kwargs)
+            start = time.perf_counter()
+            result = await method(self, *args, **kwargs)
+            self.latency.record_op(name, time.perf_counter() - start, self.arrivals)
+            return result
+        return timed_async
+
+    @functools.wraps(method)
+    def timed(self, *args, **kwargs):
+        if self.latency is None:
+            return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        result = method(self, *args, **kwargs)
+        self.latency.record_op(name, time.perf_counter() - start, self.arrivals)
+        return result
+    return timed
+
+
+# ----------------------------
+# Merging interval logs
+# ----------------------------
+
+def read_log(path: str, merged: Dict[str, object]):
+    """Add every tagged interval in `path` to `merged` (tag -> histogram)."""
+    hdr_histogram = _hdr_histogram()
+    with open(path) as f:
+        for line in f:
+            if not line.startswith("Tag="):
+                continue
+            tag, _, _, _, payload = line[4:].rstrip("\n").split(",", 4)
+            hist = hdr_histogram.decode(payload)
+            if tag in merged:
+                merged[tag].add(hist)
+            else:
+                merged[tag] = hist
+
+
+def format_report(merged: Dict[str, object]) -> str:
+    headers = ["tag", "count"] + [f"p{p:g}(ms)" for p in PERCENTILES] + ["max(ms)"]
+    rows = [headers]
+    for tag in sorted(merged):
+        line = percentiles_ms(merged[tag])
+        rows.append([tag, f"{line.pop('count'):,}"] + [f"{v:,.3f}" for v in line.values()])
+    widths = [max(len(r[i]) for r in rows) for i in range(len(headers))]
+    out = []
+    for n, r in enumerate(rows):
+        out.append("  ".join(c.ljust(w) if i == 0 else c.rjust(w) for i, (c, w) in enumerate(zip(r, widths))))
+        if n == 0:
+            out.append("  ".join("-" * w for w in widths))
+    return "\n".join(out)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Merge HDR interval logs and report per-tag percentiles")
+    ap.add_argument("logs", nargs="+", help="Interval log files or glob patterns (e.g. 'logs/hdr_*hotspot*.hlog')")
+    ap.add_argument("--tag", default="", help="Only report tags starting with this prefix (e.g. op/ or attempt/)")
+    opts = ap.parse_args()
+
+    paths = sorted({p for pattern in opts.logs for p in (glob.glob(pattern) or [pattern])})
+    merged: Dict[str, object] = {}
+    for path in paths:
+        read_log(path, merged)
+    merged = {tag: hist for tag, hist in merged.items() if tag.startswith(opts.tag)}
+    if not merged:
+        raise SystemExit(f"no histograms found in {len(paths)} log(s)")
+    print(f"{len(paths)} log(s)")
+    print(format_report(merged))
+
+
+if __name__ == "__main__":
+    main()
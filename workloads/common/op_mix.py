@@ -0,0 +1,159 @@
+"""
+Declarative weighted operation mixes.
+
+Every workload hard-codes its traffic shape: loop() returns a fixed list such as
+[insert, select, update], and flight-schedules rolls a *_freq percentage inside
+each function.  Benchmarking another shape meant writing another class.
+
+An OpMix reads the shape from one config instead, and for every loop() cycle
+draws which of an existing workload class's functions to run:
+
+  {
+    "ops": {
+      "insert,select,update": 20,
+      "insert": {"weight": 60, "think_ms": 50},
+      "select": {"weight": 20}
+    },
+    "max_concurrency": {"select": 8}
+  }
+
+  ops               entries to draw from, one function or a comma separated
+                    sequence run in order (e.g. a select that reads what the
+                    insert before it wrote), each a weight or a dict with
+    weight          relative share of cycles that run the entry
+    think_ms        pause before running it, jittered +-25% like `delay`
+  max_concurrency   how many calls of a function may run at once in a worker
+                    process, the rest wait for a slot as in a bounded app pool
+
+Entries are drawn with Vose's alias method: the weights are turned into a
+probability and an alias per entry once, so every draw is one random slot and
+one coin flip, O(1) however many entries the mix has.  The bound functions for
+each entry, capped or not, are built once per workload instance as well.
+
+transactionsMix.py and transactionsMixAsync.py run any workload class with a mix.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+from typing import Callable, Dict, List, Tuple
+
+
+def parse_mix(mix) -> dict:
+    """The mix arg as a dict: already one, a JSON string, or the path of a JSON file."""
+    if isinstance(mix, dict):
+        return mix
+    mix = str(mix)
+    if os.path.isfile(mix):
+        with open(mix) as f:
+            return json.load(f)
+    return json.loads(mix)
+
+
+class AliasTable:
+
+    def __init__(self, weights: List[float]):
+        n = len(weights)
+        total = sum(weights)
+        if n == 0 or total <= 0:
+            raise ValueError(f"op mix weights must include at least one positive weight, got {weights}")
+        scaled = [w * n / total for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1 - scaled[s]
+            (small if scaled[l] < 1 else large).append(l)
+        # whatever is left over is 1 up to float error and keeps prob 1.0
+
+    def draw(self) -> int:
+        i = random.randrange(len(self.prob))
+        return i if random.random() < self.prob[i] else self.alias[i]
+
+
+_slots: Dict[tuple, object] = {}
+_slots_lock = threading.Lock()
+
+
+def _shared_slots(key: tuple, limit: int, factory):
+    """One semaphore per process for each workload function and cap."""
+    with _slots_lock:
+        if key not in _slots:
+            _slots[key] = factory(limit)
+        return _slots[key]
+
+
+def capped(fn: Callable, key: tuple, limit: int) -> Callable:
+    slots = _shared_slots(key, limit, threading.BoundedSemaphore)
+
+    # wraps keeps the function's name, which the runners report latency under
+    @functools.wraps(fn)
+    def run(conn):
+        with slots:
+            return fn(conn)
+    return run
+
+
+def capped_async(fn: Callable, key: tuple, limit: int) -> Callable:
+    slots = _shared_slots(key, limit, asyncio.Semaphore)
+
+    @functools.wraps(fn)
+    async def run(conn):
+        async with slots:
+            return await fn(conn)
+    return run
+
+
+class OpMix:
+
+    def __init__(self, config: dict):
+        ops = config.get("ops")
+        if not ops:
+            raise ValueError('op mix needs at least one entry under "ops"')
+        self.entries: List[Tuple[List[str], float]] = []
+        weights = []
+        for name, spec in ops.items():
+            if not isinstance(spec, dict):
+                spec = {"weight": spec}
+            sequence = [op.strip() for op in name.split(",") if op.strip()]
+            weight = float(spec.get("weight", 1))
+            if not sequence or weight < 0:
+                raise ValueError(f"op mix entry {name!r} needs function names and a weight of at least 0")
+            self.entries.append((sequence, float(spec.get("think_ms", 0))))
+            weights.append(weight)
+        self.table = AliasTable(weights)
+        self.max_concurrency: Dict[str, int] = {op: int(n) for op, n in config.get("max_concurrency", {}).items()}
+        unknown = set(self.max_concurrency) - {op for sequence, _ in self.entries for op in sequence}
+        if unknown:
+            raise ValueError(f"max_concurrency names functions that aren't in the mix: {sorted(unknown)}")
+        self.bound: List[List[Callable]] = []
+
+    def bind(self, workload):
+        """Resolve every entry to the workload's functions, wrapped in their caps."""
+        name = type(workload).__name__
+        functions = {}
+        for sequence, _ in self.entries:
+            for op in sequence:
+                if op in functions:
+                    continue
+                fn = getattr(workload, op, None)
+                if not callable(fn):
+                    raise ValueError(f"{name} has no function {op!r} for the op mix")
+                if op in self.max_concurrency:
+                    wrap = capped_async if inspect.iscoroutinefunction(fn) else capped
+                    fn = wrap(fn, (name, op), self.max_concurrency[op])
+                functions[op] = fn
+        self.bound = [[functions[op] for op in sequence] for sequence, _ in self.entries]
+
+    def draw(self) -> Tuple[List[Callable], float]:
+        """The functions to run this cycle and the seconds to think before them."""
+        i = self.table.draw()
+        think_ms = self.entries[i][1]
+        return self.bound[i], random.uniform(0.75, 1.25) * think_ms / 1000 if think_ms > 0 else 0.0
@@ -0,0 +1,225 @@
+"""
+Payload codecs for the storage and region phases, keyed by a self-describing
+header so any stored payload can be decoded regardless of which codec wrote it.
+
+  name          header   notes
+  none          (none)   raw bytes, anything without a known header decodes as raw
+  gzip          GZ1:     gzip.compress, the original codec
+  zstd-1/3/9/19 ZS1:     zstandard at that level (pip install zstandard)
+  zstd-dict-3   ZD1:     zstandard level 3 with a dictionary trained on the
+                         payload pool (pip install zstandard)
+  lz4           LZ1:     lz4 frame format (pip install lz4)
+
+zstandard and lz4 are optional and only imported when a codec that needs them
+is selected.  Trained dictionaries live in the worker process, so ZD1 payloads
+can only be decoded by the process that wrote them (which is all the
+decompression sampling needs).
+
+Every codec keeps per-process counters (raw and encoded bytes, encode and decode
+CPU time, bytes written and payload insert latency) printed as a [codec-stats]
+JSON line at most once a minute and at exit.
+"""
+import atexit
+import gzip
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+STATS_INTERVAL_S = 60.0
+DEFAULT_DICT_SIZE = 16 * 1024
+
+
+class CodecStats:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.counts: Dict[str, float] = {
+            "encoded": 0, "raw_bytes": 0, "encoded_bytes": 0, "encode_cpu_ms": 0.0,
+            "decoded": 0, "decode_cpu_ms": 0.0,
+            "writes": 0, "bytes_written": 0, "write_ms": 0.0, "write_ms_max": 0.0,
+        }
+        self.last_report = time.monotonic()
+        atexit.register(self.report)
+
+    def add(self, **deltas):
+        with self.lock:
+            for k, v in deltas.items():
+                self.counts[k] += v
+        self._maybe_report()
+
+    def record_write(self, nbytes: int, latency_ms: Optional[float] = None):
+        with self.lock:
+            self.counts["writes"] += 1
+            self.counts["bytes_written"] += nbytes
+            if latency_ms is not None:
+                self.counts["write_ms"] += latency_ms
+                self.counts["write_ms_max"] = max(self.counts["write_ms_max"], latency_ms)
+        self._maybe_report()
+
+    def _maybe_report(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_report < STATS_INTERVAL_S:
+                return
+            self.last_report = now
+        self.report()
+
+    def report(self):
+        with self.lock:
+            c = dict(self.counts)
+        line = {
+            "codec": self.name,
+            "ratio": round(c["raw_bytes"] / c["encoded_bytes"], 3) if c["encoded_bytes"] else None,
+            "encode_us_per_kb": round(c["encode_cpu_ms"] * 1000 / (c["raw_bytes"] / 1024), 2) if c["raw_bytes"] else None,
+            "decode_cpu_ms": round(c["decode_cpu_ms"], 3),
+            "decoded": int(c["decoded"]),
+            "writes": int(c["writes"]),
+            "bytes_written": int(c["bytes_written"]),
+            "write_ms_avg": round(c["write_ms"] / c["writes"], 3) if c["writes"] else None,
+            "write_ms_max": round(c["write_ms_max"], 3),
+        }
+        print(f"[codec-stats] {json.dumps(line, sort_keys=True)}", flush=True)
+
+
+class Codec:
+    """
+    `compress` / `decompress` work on the body only, the header is added and
+    stripped here.  `train` is called with sample payloads before the first
+    encode, codecs that don't need it ignore it.
+    """
+
+    def __init__(self, name: str, header: bytes, compress: Callable[[bytes], bytes],
+                 decompress: Callable[[bytes], bytes]):
+        self.name = name
+        self.header = header
+        self.compress = compress
+        self.decompress = decompress
+        self.stats = CodecStats(name)
+
+    def train(self, samples: List[bytes]):
+        pass
+
+    def encode(self, raw: bytes) -> bytes:
+        start = time.thread_time()
+        encoded = self.header + self.compress(raw)
+        self.stats.add(encoded=1, raw_bytes=len(raw), encoded_bytes=len(encoded),
+                       encode_cpu_ms=(time.thread_time() - start) * 1000)
+        return encoded
+
+    def decode(self, stored: bytes) -> bytes:
+        start = time.thread_time()
+        raw = self.decompress(stored[len(self.header):])
+        self.stats.add(decoded=1, decode_cpu_ms=(time.thread_time() - start) * 1000)
+        return raw
+
+
+class ZstdDictCodec(Codec):
+
+    def __init__(self, name: str, level: int, dict_size: int):
+        zstandard = _require("zstandard", name)
+        self.zstandard = zstandard
+        self.level = level
+        self.dict_size = dict_size
+        self.compressor = None
+        self.dicts: Dict[int, object] = {}
+        super().__init__(name, b"ZD1:", self._compress, self._decompress)
+
+    def train(self, samples: List[bytes]):
+        try:
+            zd = self.zstandard.train_dictionary(self.dict_size, samples)
+        except self.zstandard.ZstdError as e:
+            # e.g. all-filler payloads don't have enough variety to train on
+            print(f"[codec] {self.name}: dictionary training failed ({e}), compressing without a dictionary")
+            self.compressor = self.zstandard.ZstdCompressor(level=self.level)
+            return
+        self.dicts[zd.dict_id()] = zd
+        self.compressor = self.zstandard.ZstdCompressor(level=self.level, dict_data=zd)
+        print(f"[codec] {self.name}: trained {len(zd.as_bytes())} byte dictionary id={zd.dict_id()} "
+              f"on {len(samples)} samples")
+
+    def _compress(self, raw: bytes) -> bytes:
+        if self.compressor is None:
+            raise RuntimeError(f"codec {self.name} needs a trained dictionary, build it through the payload pool")
+        # zstd compressors aren't thread safe, the pool encodes from one thread at build time
+        return self.compressor.compress(raw)
+
+    def _decompress(self, body: bytes) -> bytes:
+        dict_id = self.zstandard.get_frame_parameters(body).dict_id
+        if dict_id == 0:
+            return self.zstandard.ZstdDecompressor().decompress(body)
+        if dict_id not in self.dicts:
+            raise RuntimeError(f"no dictionary {dict_id} in this process to decode {self.name} payload")
+        return self.zstandard.ZstdDecompressor(dict_data=self.dicts[dict_id]).decompress(body)
+
+
+def _require(module: str, codec: str):
+    try:
+        return __import__(module)
+    except ImportError:
+        raise RuntimeError(f"codec {codec} needs the {module} package: pip install {module}") from None
+
+
+def _zstd_codec(name: str, level: int) -> Codec:
+    zstandard = _require("zstandard", name)
+    # a compressor/decompressor per thread, neither is safe to share
+    local = threading.local()
+
+    def compress(raw: bytes) -> bytes:
+        if not hasattr(local, "c"):
+            local.c = zstandard.ZstdCompressor(level=level)
+        return local.c.compress(raw)
+
+    def decompress(body: bytes) -> bytes:
+        if not hasattr(local, "d"):
+            local.d = zstandard.ZstdDecompressor()
+        return local.d.decompress(body)
+
+    return Codec(name, b"ZS1:", compress, decompress)
+
+
+def _lz4_codec(name: str) -> Codec:
+    _require("lz4", name)
+    import lz4.frame
+    return Codec(name, b"LZ1:", lz4.frame.compress, lz4.frame.decompress)
+
+
+CODECS: Dict[str, Callable[[], Codec]] = {
+    "none": lambda: Codec("none", b"", lambda raw: raw, lambda body: body),
+    "gzip": lambda: Codec("gzip", b"GZ1:", gzip.compress, gzip.decompress),
+    "zstd-1": lambda: _zstd_codec("zstd-1", 1),
+    "zstd-3": lambda: _zstd_codec("zstd-3", 3),
+    "zstd-9": lambda: _zstd_codec("zstd-9", 9),
+    "zstd-19": lambda: _zstd_codec("zstd-19", 19),
+    "zstd-dict-3": lambda: ZstdDictCodec("zstd-dict-3", 3, DEFAULT_DICT_SIZE),
+    "lz4": lambda: _lz4_codec("lz4"),
+}
+
+_codecs: Dict[str, Codec] = {}
+_codecs_lock = threading.Lock()
+
+
+def get_codec(name: str) -> Codec:
+    """One codec instance per process, so every thread shares its counters."""
+    if name not in CODECS:
+        raise ValueError(f"codec must be one of {sorted(CODECS)}, got {name!r}")
+    with _codecs_lock:
+        if name not in _codecs:
+            _codecs[name] = CODECS[name]()
+        return _codecs[name]
+
+
+def decode_payload(stored: Optional[bytes]) -> bytes:
+    """Decode with whichever loaded codec's header matches, raw otherwise."""
+    if stored is None:
+        return b""
+    stored = bytes(stored)
+    with _codecs_lock:
+        codecs = [c for c in _codecs.values() if c.header]
+    for codec in codecs:
+        if stored.startswith(codec.header):
+            return codec.decode(stored)
+    if stored.startswith(b"GZ1:"):
+        return get_codec("gzip").decode(stored)
+    return stored
@@ -0,0 +1,95 @@
+"""
+Precomputed payload pool for the storage and region phases.
+
+Building `b"x" * payload_size` and compressing it on every insert spends worker
+CPU encoding the same bytes over and over.  The pool generates a fixed set of
+payloads once per process, with a configurable size distribution and entropy,
+encodes them ahead of time, and hands out the encoded bytes read-only to every
+thread, so the insert hot path doesn't allocate or compress.
+
+  distribution  fixed      every payload is `size` bytes (the original behaviour)
+                uniform    uniform in [size * (1 - spread), size * (1 + spread)]
+                lognormal  median `size`, sigma `spread` (long tail of large payloads)
+  entropy       0.0 is all filler bytes (highly compressible), 1.0 is all random
+                bytes (incompressible); in between mixes random and filler blocks
+"""
+import math
+import random
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+BLOCK_SIZE = 64
+FILLER = b"x"
+
+
+def payload_sizes(distribution: str, size: int, spread: float, count: int, rng: random.Random) -> List[int]:
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"payload distribution must be one of {DISTRIBUTIONS}, got {distribution!r}")
+    if distribution == "fixed":
+        return [size] * count
+    if distribution == "uniform":
+        lo, hi = int(size * (1 - spread)), int(size * (1 + spread))
+        return [max(1, rng.randint(lo, hi)) for _ in range(count)]
+    return [max(1, int(rng.lognormvariate(math.log(size), spread))) for _ in range(count)]
+
+
+def build_payload(n: int, entropy: float, rng: random.Random) -> bytes:
+    if entropy <= 0:
+        return FILLER * n
+    if entropy >= 1:
+        return rng.randbytes(n)
+    # interleave random and filler blocks so compressors see the mix throughout
+    out = bytearray()
+    while len(out) < n:
+        block = min(BLOCK_SIZE, n - len(out))
+        out += rng.randbytes(block) if rng.random() < entropy else FILLER * block
+    return bytes(out)
+
+
+class PayloadPool:
+    """
+    `count` payloads encoded once with `encode`, after `train` (if given) has
+    seen the raw payloads.  pick() returns (raw_length, encoded_bytes) for a
+    random entry.
+    """
+
+    def __init__(self, encode: Callable[[bytes], bytes], size: int, distribution: str = "fixed",
+                 spread: float = 0.5, entropy: float = 0.0, count: int = 64, seed: int = 0,
+                 train: Optional[Callable[[List[bytes]], None]] = None):
+        rng = random.Random(seed)
+        raws = [build_payload(n, entropy, rng) for n in payload_sizes(distribution, size, spread, count, rng)]
+        if train:
+            train(raws)
+        self.entries: List[Tuple[int, bytes]] = [(len(raw), encode(raw)) for raw in raws]
+        self.raw_bytes = sum(n for n, _ in self.entries)
+        self.encoded_bytes = sum(len(b) for _, b in self.entries)
+
+    def pick(self) -> Tuple[int, bytes]:
+        return random.choice(self.entries)
+
+    def describe(self) -> str:
+        ratio = self.raw_bytes / max(1, self.encoded_bytes)
+        return (f"{len(self.entries)} payloads, avg {self.raw_bytes // len(self.entries)} bytes raw, "
+                f"{self.encoded_bytes // len(self.entries)} bytes encoded (ratio {ratio:.2f})")
+
+
+_pools: Dict[tuple, PayloadPool] = {}
+_pools_lock = threading.Lock()
+
+
+def shared_pool(codec: str, encode: Callable[[bytes], bytes], size: int, distribution: str = "fixed",
+                spread: float = 0.5, entropy: float = 0.0, count: int = 64,
+                train: Optional[Callable[[List[bytes]], None]] = None) -> PayloadPool:
+    """
+    One pool per process for each codec and shape, built by the first thread
+    that asks for it.  `codec` names the encoding so differently encoded pools
+    don't collide.
+    """
+    key = (codec, size, distribution, spread, entropy, count)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = PayloadPool(encode, size, distribution, spread, entropy, count, train=train)
+            print(f"[payload-pool] {codec}: {_pools[key].describe()}")
+        return _pools[key]
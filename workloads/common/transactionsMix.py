@@ -0,0 +1,44 @@
+import psycopg
+import os
+import sys
+import time
+
+# the mix engine lives next to this file in workloads/common
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from op_mix import OpMix, parse_mix
+from workload_loader import load_workload_class
+
+
+class Transactionsmix:
+    """
+    Runs an existing workload class with a declarative operation mix (op_mix.py)
+    instead of the fixed list its loop() returns.
+
+    Every arg besides workload and mix is passed through to the wrapped class.
+    Its loop() still runs first on every cycle, so it keeps pacing the cycles
+    (delay or arrival_rate) and resetting its per-cycle state, then the mix
+    picks which of its functions run.
+    """
+
+    def __init__(self, args: dict):
+        self.workload: str = str(args.get("workload", ""))  # workload file to wrap, relative to the working directory
+        if not self.workload:
+            raise ValueError('the mix workload needs a "workload" file to wrap')
+        self.mix = OpMix(parse_mix(args.get("mix", "{}")))  # dict, JSON string or JSON file, see op_mix.py
+        self.inner = load_workload_class(self.workload)(args)
+        self.mix.bind(self.inner)
+
+
+
+    def setup(self, conn: psycopg.Connection, id: int, total_thread_count: int):
+        self.id = id
+        self.inner.setup(conn, id, total_thread_count)
+
+
+
+    def loop(self):
+        self.inner.loop()
+        ops, think_s = self.mix.draw()
+        if think_s:
+            time.sleep(think_s)
+        return ops
@@ -0,0 +1,36 @@
+import psycopg
+import asyncio
+import os
+import sys
+
+# the mix engine lives next to this file in workloads/common
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from op_mix import OpMix, parse_mix
+from workload_loader import load_workload_class
+
+
+# Async variant of transactionsMix.py for async_runner.py, wrapping an async workload class.
+class Transactionsmixasync:
+
+    def __init__(self, args: dict):
+        self.workload: str = str(args.get("workload", ""))  # async workload file to wrap, relative to the working directory
+        if not self.workload:
+            raise ValueError('the mix workload needs a "workload" file to wrap')
+        self.mix = OpMix(parse_mix(args.get("mix", "{}")))  # dict, JSON string or JSON file, see op_mix.py
+        self.inner = load_workload_class(self.workload)(args)
+        self.mix.bind(self.inner)
+
+
+
+    async def setup(self, conn: psycopg.AsyncConnection, id: int, total_thread_count: int):
+        self.id = id
+        await self.inner.setup(conn, id, total_thread_count)
+
+
+
+    async def loop(self):
+        await self.inner.loop()
+        ops, think_s = self.mix.draw()
+        if think_s:
+            await asyncio.sleep(think_s)
+        return ops
@@ -0,0 +1,663 @@
+"""
+Shared CockroachDB transaction retry engine for the dbworkload workload classes.
+
+Transaction bodies passed to TxnRetryEngine.run() only issue statements; the
+engine owns BEGIN / SAVEPOINT / COMMIT / ROLLBACK and retries on 40001.
+
+Modes:
+  restart    roll back and re-run the whole transaction from BEGIN (original behaviour)
+  savepoint  CockroachDB client-side retry protocol:
+               SAVEPOINT cockroach_restart
+               ... body ...
+               RELEASE SAVEPOINT cockroach_restart
+             and on a retryable error ROLLBACK TO SAVEPOINT cockroach_restart,
+             which restarts the same transaction and keeps its priority and
+             timestamp instead of starting over as a brand new transaction.
+
+If the savepoint statements aren't usable on a connection (or the transaction
+can't be rewound) the engine falls back to a full restart for that attempt.
+Savepoints stay inside one transaction, so they work under PgBouncer
+transaction pooling; all statements are sent with prepare=False in that case.
+
+Retries sleep with jittered exponential backoff so threads that collided on the
+same rows don't retry in lockstep:
+  full          sleep = uniform(0, min(cap, base * 2**attempt))
+  decorrelated  sleep = min(cap, uniform(base, previous_sleep * 3))
+
+Every worker process shares a retry budget: each committed transaction earns
+`retry_budget` retry tokens (plus a small per-second floor) and each retry
+spends one.  When the budget is empty a retryable error is raised instead of
+retried, which caps retry amplification at roughly (1 + retry_budget) times the
+offered load during a contention storm.
+
+run_pipelined() is an opt-in variant for loops of one-row transactions: every
+row still gets its own BEGIN ... COMMIT, but all of them are sent through one
+psycopg pipeline so the client round trips overlap.  The server skips everything
+after the first error until the pipeline syncs, so the rows that didn't commit
+are re-run one at a time through run() and keep the normal retry behaviour.
+
+run_statement() is for transaction bodies that are a single statement.  With
+txn_style "explicit" (the default) it's the same as run().  With "implicit" it
+sends the statement on its own in autocommit instead of BEGIN / statement /
+COMMIT, one round trip instead of three, and CockroachDB can commit it with
+its one-phase-commit fast path (and retry it server side before any results
+were returned).  A 40001 that still reaches the client re-runs the statement
+with the same backoff and budget; the retry mode doesn't apply, there's no
+transaction to keep a savepoint in.
+
+AsyncTxnRetryEngine is the same engine for psycopg.AsyncConnection, used by the
+async workload variants driven by async_runner.py.  run_pipelined() is threaded
+only, the async workloads reject pipeline=true.
+
+With a `latency` recorder (latency_histograms.py) every run() is recorded under
+txn/<fn>, end to end including backoff, and every try of the body under
+attempt/<fn>.  Pipelined rows are only timed as part of the workload op; the
+rows that get redone through run() are recorded like any other transaction.
+
+Counters are kept per process and printed as one JSON line:
+  [retry-stats] {"mode": ..., "txns": ..., "retries": ..., "by_error": {fn: {sqlstate: n}}}
+"""
+import asyncio
+import atexit
+import contextvars
+import json
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+import psycopg
+from psycopg.errors import SerializationFailure
+
+from latency_histograms import ATTEMPT, TXN
+
+RESTART = "restart"
+SAVEPOINT = "savepoint"
+RETRY_MODES = (RESTART, SAVEPOINT)
+
+RESTART_SAVEPOINT = "cockroach_restart"
+
+EXPLICIT = "explicit"
+IMPLICIT = "implicit"
+TXN_STYLES = (EXPLICIT, IMPLICIT)
+
+FULL_JITTER = "full"
+DECORRELATED_JITTER = "decorrelated"
+BACKOFF_MODES = (FULL_JITTER, DECORRELATED_JITTER)
+
+BACKOFF_BASE_S = 0.05
+BACKOFF_CAP_S = 2.0
+
+BUDGET_MIN_PER_S = 10.0  # retries always allowed per second, so an idle worker can still retry
+BUDGET_MAX_TOKENS = 100.0
+
+STATS_INTERVAL_S = 60.0
+
+
+def is_retryable_error(err: Exception) -> bool:
+    # Cockroach retryable transaction errors are a subclass of SerializationFailure
+    return isinstance(err, SerializationFailure)
+
+
+def error_code(err: Exception) -> str:
+    # SQLSTATE for server errors, otherwise the exception class name
+    return getattr(err, "sqlstate", None) or type(err).__name__
+
+
+def backoff_delay(mode: str, attempt: int, previous_s: Optional[float] = None) -> float:
+    if mode == DECORRELATED_JITTER:
+        upper = max(BACKOFF_BASE_S, (previous_s or BACKOFF_BASE_S) * 3)
+        return min(BACKOFF_CAP_S, random.uniform(BACKOFF_BASE_S, upper))
+    return random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * (2 ** attempt)))
+
+
+# decorrelated jitter carries the previous sleep of the transaction being retried;
+# a context variable is per thread and per asyncio task, so concurrent sessions
+# on one event loop don't feed off each other's sleeps
+_previous_sleep: contextvars.ContextVar = contextvars.ContextVar("previous_sleep", default=None)
+
+
+class RetryBudget:
+    """
+    Token bucket shared by every worker thread in the process.  Committed
+    transactions deposit `ratio` tokens, time deposits BUDGET_MIN_PER_S tokens
+    per second, and each retry withdraws one.
+    """
+
+    def __init__(self, ratio: float):
+        self.ratio = ratio
+        self.lock = threading.Lock()
+        self.tokens = BUDGET_MAX_TOKENS
+        self.last_refill = time.monotonic()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(BUDGET_MAX_TOKENS, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(BUDGET_MAX_TOKENS, self.tokens + (now - self.last_refill) * BUDGET_MIN_PER_S)
+            self.last_refill = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RetryStats:
+    """
+    Per-process counters shared by every worker thread, printed as a
+    [retry-stats] JSON line at most once per interval and again at exit.
+    """
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {
+            "txns": 0, "retries": 0, "fallbacks": 0, "failed": 0, "budget_exhausted": 0,
+            "pipeline_redos": 0, "implicit": 0,
+        }
+        self.by_error: Dict[str, Dict[str, int]] = {}
+        self.sleep_s = 0.0
+        self.last_report = time.monotonic()
+        atexit.register(self.report)
+
+    def add(self, key: str, n: int = 1):
+        with self.lock:
+            self.counts[key] += n
+        self._maybe_report()
+
+    def add_retry(self, fn_name: str, code: str, sleep_s: float):
+        with self.lock:
+            self.counts["retries"] += 1
+            self.sleep_s += sleep_s
+            codes = self.by_error.setdefault(fn_name, {})
+            codes[code] = codes.get(code, 0) + 1
+        self._maybe_report()
+
+    def _maybe_report(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_report < STATS_INTERVAL_S:
+                return
+            self.last_report = now
+        self.report()
+
+    def report(self):
+        with self.lock:
+            line = {"mode": self.mode, **self.counts, "sleep_s": round(self.sleep_s, 3),
+                    "by_error": {fn: dict(codes) for fn, codes in self.by_error.items()}}
+        print(f"[retry-stats] {json.dumps(line, sort_keys=True)}", flush=True)
+
+
+_stats: Dict[str, RetryStats] = {}
+_budgets: Dict[float, RetryBudget] = {}
+_stats_lock = threading.Lock()
+
+
+def retry_stats(mode: str) -> RetryStats:
+    with _stats_lock:
+        if mode not in _stats:
+            _stats[mode] = RetryStats(mode)
+        return _stats[mode]
+
+
+def retry_budget(ratio: float) -> RetryBudget:
+    with _stats_lock:
+        if ratio not in _budgets:
+            _budgets[ratio] = RetryBudget(ratio)
+        return _budgets[ratio]
+
+
+class TxnRetryEngine:
+
+    def __init__(self, mode: str = RESTART, max_retries: int = 5, txn_pooling: bool = False,
+                 backoff: str = FULL_JITTER, budget_ratio: float = 0.2, latency=None,
+                 txn_style: str = EXPLICIT):
+        if mode not in RETRY_MODES:
+            raise ValueError(f"retry_mode must be one of {RETRY_MODES}, got {mode!r}")
+        if backoff not in BACKOFF_MODES:
+            raise ValueError(f"backoff must be one of {BACKOFF_MODES}, got {backoff!r}")
+        if txn_style not in TXN_STYLES:
+            raise ValueError(f"txn_style must be one of {TXN_STYLES}, got {txn_style!r}")
+        self.txn_style = txn_style
+        self.mode = mode
+        self.max_retries = max_retries
+        self.txn_pooling = txn_pooling
+        self.backoff = backoff
+        self.savepoints_supported = mode == SAVEPOINT
+        self.stats = retry_stats(mode)
+        self.budget = retry_budget(budget_ratio)
+        self.latency = latency
+
+
+
+    def run(self, conn: psycopg.Connection, fn, *args):
+        """
+        Run `fn(conn, *args)` as one transaction and return its result.
+        Non-retryable errors, retries past max_retries, or retries the budget can't
+        cover are re-raised after rollback.
+        """
+        original_autocommit = conn.autocommit
+        _previous_sleep.set(None)
+        start = time.perf_counter()
+        try:
+            if self.savepoints_supported:
+                result = self._run_savepoint(conn, fn, *args)
+            else:
+                result = self._run_restart(conn, fn, *args)
+            self._record(TXN, fn, start)
+            return result
+        finally:
+            conn.autocommit = original_autocommit
+
+
+
+    def run_statement(self, conn: psycopg.Connection, fn, *args):
+        """
+        Run a single-statement `fn(conn, *args)` as an implicit transaction when
+        txn_style is implicit, otherwise as an explicit one through run().
+        """
+        if self.txn_style == EXPLICIT:
+            return self.run(conn, fn, *args)
+        original_autocommit = conn.autocommit
+        _previous_sleep.set(None)
+        start = time.perf_counter()
+        try:
+            # can't switch to autocommit inside an open transaction
+            self._rollback(conn)
+            conn.autocommit = True
+            attempt = 0
+            while True:
+                attempt_start = time.perf_counter()
+                try:
+                    result = fn(conn, *args)
+                    break
+                except Exception as e:
+                    self._record(ATTEMPT, fn, attempt_start)
+                    if not self._should_retry(e, attempt):
+                        self._failed(fn, e)
+                        raise
+                    self._backoff(fn, attempt, e)
+                    attempt += 1
+            self._record(ATTEMPT, fn, attempt_start)
+            self._committed_implicit()
+            self._record(TXN, fn, start)
+            return result
+        finally:
+            conn.autocommit = original_autocommit
+
+
+
+    def run_pipelined(self, conn: psycopg.Connection, queue_fn, arg_list: List[tuple], fn, fetch=None) -> list:
+        """
+        Run one transaction per entry of `arg_list` inside a single pipeline and
+        return the per-row results in order.  `queue_fn(cur, *args)` may only
+        execute statements; results are read with `fetch(cur)` after the pipeline
+        syncs.  Rows that didn't commit are re-run with `run(conn, fn, *args)`.
+        """
+        original_autocommit = conn.autocommit
+        results = [None] * len(arg_list)
+        queued = []
+        err = None
+        try:
+            # each row sends its own BEGIN / COMMIT
+            conn.autocommit = True
+            try:
+                with conn.pipeline():
+                    for args in arg_list:
+                        ctl, body = conn.cursor(), conn.cursor()
+                        queued.append((ctl, body))
+                        self._execute_on(ctl, "BEGIN")
+                        queue_fn(body, *args)
+                        self._execute_on(ctl, "COMMIT")
+            except psycopg.Error as e:
+                err = e
+                self._rollback(conn)
+        finally:
+            conn.autocommit = original_autocommit
+
+        redo = []
+        for i, args in enumerate(arg_list):
+            if i < len(queued) and queued[i][0].statusmessage == "COMMIT":
+                results[i] = fetch(queued[i][1]) if fetch else None
+                self.stats.add("txns")
+                self.budget.deposit()
+            else:
+                redo.append(i)
+        for ctl, body in queued:
+            ctl.close()
+            body.close()
+
+        if redo:
+            self.stats.add("pipeline_redos", len(redo))
+            if err is not None and is_retryable_error(err):
+                self.stats.add_retry(queue_fn.__name__, error_code(err), 0.0)
+            for i in redo:
+                results[i] = self.run(conn, fn, *arg_list[i])
+        return results
+
+
+
+    def _run_restart(self, conn: psycopg.Connection, fn, *args):
+        attempt = 0
+        while True:
+            attempt_start = time.perf_counter()
+            self._begin(conn)
+            try:
+                result = fn(conn, *args)
+                conn.commit()
+                self._record(ATTEMPT, fn, attempt_start)
+                self.stats.add("txns")
+                self.budget.deposit()
+                return result
+            except Exception as e:
+                self._rollback(conn)
+                self._record(ATTEMPT, fn, attempt_start)
+                if not self._should_retry(e, attempt):
+                    self._failed(fn, e)
+                    raise
+                self._backoff(fn, attempt, e)
+                attempt += 1
+
+
+
+    def _run_savepoint(self, conn: psycopg.Connection, fn, *args):
+        attempt = 0
+        attempt_start = time.perf_counter()
+        self._begin(conn)
+        savepoint = self._savepoint(conn)
+        while True:
+            try:
+                result = fn(conn, *args)
+                if savepoint:
+                    # the commit happens here, so commit-time retry errors land in the same handler
+                    self._execute(conn, f"RELEASE SAVEPOINT {RESTART_SAVEPOINT}")
+                conn.commit()
+                self._record(ATTEMPT, fn, attempt_start)
+                self.stats.add("txns")
+                self.budget.deposit()
+                return result
+            except Exception as e:
+                self._record(ATTEMPT, fn, attempt_start)
+                if not self._should_retry(e, attempt):
+                    self._rollback(conn)
+                    self._failed(fn, e)
+                    raise
+                attempt += 1
+
+                if savepoint and self._rollback_to_savepoint(conn):
+                    self._backoff(fn, attempt - 1, e)
+                    attempt_start = time.perf_counter()
+                    continue
+
+                # savepoint unusable for this transaction, start over from BEGIN
+                self.stats.add("fallbacks")
+                self._rollback(conn)
+                self._backoff(fn, attempt - 1, e)
+                attempt_start = time.perf_counter()
+                self._begin(conn)
+                savepoint = self._savepoint(conn)
+
+
+
+    def _savepoint(self, conn: psycopg.Connection) -> bool:
+        if not self.savepoints_supported:
+            return False
+        try:
+            self._execute(conn, f"SAVEPOINT {RESTART_SAVEPOINT}")
+            return True
+        except psycopg.Error as e:
+            # e.g. a pooler or server that rejects the statement: stop trying on this engine
+            print(f"[retry] SAVEPOINT {RESTART_SAVEPOINT} unavailable ({e}), falling back to restart retries")
+            self.savepoints_supported = False
+            self.stats.add("fallbacks")
+            self._rollback(conn)
+            self._begin(conn)
+            return False
+
+
+
+    def _rollback_to_savepoint(self, conn: psycopg.Connection) -> bool:
+        try:
+            self._execute(conn, f"ROLLBACK TO SAVEPOINT {RESTART_SAVEPOINT}")
+            return True
+        except psycopg.Error:
+            return False
+
+
+
+    def _begin(self, conn: psycopg.Connection):
+        # Make sure we're not starting in an aborted txn
+        self._rollback(conn)
+        conn.autocommit = False
+
+
+
+    def _rollback(self, conn: psycopg.Connection):
+        try:
+            conn.rollback()
+        except Exception:
+            # If there's nothing to roll back or it fails, ignore
+            pass
+
+
+
+    def _execute(self, conn: psycopg.Connection, sql: str):
+        with conn.cursor() as cur:
+            self._execute_on(cur, sql)
+
+
+
+    def _execute_on(self, cur: psycopg.Cursor, sql: str):
+        if self.txn_pooling:
+            cur.execute(sql, prepare=False)
+        else:
+            cur.execute(sql)
+
+
+
+    def _should_retry(self, err: Exception, attempt: int) -> bool:
+        if not is_retryable_error(err) or attempt >= self.max_retries:
+            return False
+        if not self.budget.withdraw():
+            self.stats.add("budget_exhausted")
+            return False
+        return True
+
+
+
+    def _committed_implicit(self):
+        self.stats.add("txns")
+        self.stats.add("implicit")
+        self.budget.deposit()
+
+
+
+    def _record(self, kind: str, fn, start: float):
+        if self.latency is not None:
+            self.latency.record(f"{kind}/{fn.__name__}", time.perf_counter() - start)
+
+
+
+    def _failed(self, fn, err: Exception):
+        self.stats.add("failed")
+        print(f"Error occurred in {fn.__name__}: {err}")
+
+
+
+    def _backoff(self, fn, attempt: int, err: Exception):
+        sleep_s = backoff_delay(self.backoff, attempt, _previous_sleep.get())
+        _previous_sleep.set(sleep_s)
+        self.stats.add_retry(fn.__name__, error_code(err), sleep_s)
+        time.sleep(sleep_s)
+
+
+
+class AsyncTxnRetryEngine(TxnRetryEngine):
+    """
+    TxnRetryEngine for psycopg.AsyncConnection: same protocols, backoff, budget
+    and counters, with the transaction body awaited as `await fn(conn, *args)`.
+    """
+
+    async def run(self, conn: psycopg.AsyncConnection, fn, *args):
+        original_autocommit = conn.autocommit
+        _previous_sleep.set(None)
+        start = time.perf_counter()
+        try:
+            if self.savepoints_supported:
+                result = await self._run_savepoint(conn, fn, *args)
+            else:
+                result = await self._run_restart(conn, fn, *args)
+            self._record(TXN, fn, start)
+            return result
+        finally:
+            await conn.set_autocommit(original_autocommit)
+
+
+
+    async def run_statement(self, conn: psycopg.AsyncConnection, fn, *args):
+        if self.txn_style == EXPLICIT:
+            return await self.run(conn, fn, *args)
+        original_autocommit = conn.autocommit
+        _previous_sleep.set(None)
+        start = time.perf_counter()
+        try:
+            await self._rollback(conn)
+            await conn.set_autocommit(True)
+            attempt = 0
+            while True:
+                attempt_start = time.perf_counter()
+                try:
+                    result = await fn(conn, *args)
+                    break
+                except Exception as e:
+                    self._record(ATTEMPT, fn, attempt_start)
+                    if not self._should_retry(e, attempt):
+                        self._failed(fn, e)
+                        raise
+                    await self._backoff(fn, attempt, e)
+                    attempt += 1
+            self._record(ATTEMPT, fn, attempt_start)
+            self._committed_implicit()
+            self._record(TXN, fn, start)
+            return result
+        finally:
+            await conn.set_autocommit(original_autocommit)
+
+
+
+    async def _run_restart(self, conn: psycopg.AsyncConnection, fn, *args):
+        attempt = 0
+        while True:
+            attempt_start = time.perf_counter()
+            await self._begin(conn)
+            try:
+                result = await fn(conn, *args)
+                await conn.commit()
+                self._record(ATTEMPT, fn, attempt_start)
+                self.stats.add("txns")
+                self.budget.deposit()
+                return result
+            except Exception as e:
+                await self._rollback(conn)
+                self._record(ATTEMPT, fn, attempt_start)
+                if not self._should_retry(e, attempt):
+                    self._failed(fn, e)
+                    raise
+                await self._backoff(fn, attempt, e)
+                attempt += 1
+
+
+
+    async def _run_savepoint(self, conn: psycopg.AsyncConnection, fn, *args):
+        attempt = 0
+        attempt_start = time.perf_counter()
+        await self._begin(conn)
+        savepoint = await self._savepoint(conn)
+        while True:
+            try:
+                result = await fn(conn, *args)
+                if savepoint:
+                    await self._execute(conn, f"RELEASE SAVEPOINT {RESTART_SAVEPOINT}")
+                await conn.commit()
+                self._record(ATTEMPT, fn, attempt_start)
+                self.stats.add("txns")
+                self.budget.deposit()
+                return result
+            except Exception as e:
+                self._record(ATTEMPT, fn, attempt_start)
+                if not self._should_retry(e, attempt):
+                    await self._rollback(conn)
+                    self._failed(fn, e)
+                    raise
+                attempt += 1
+
+                if savepoint and await self._rollback_to_savepoint(conn):
+                    await self._backoff(fn, attempt - 1, e)
+                    attempt_start = time.perf_counter()
+                    continue
+
+                self.stats.add("fallbacks")
+                await self._rollback(conn)
+                await self._backoff(fn, attempt - 1, e)
+                attempt_start = time.perf_counter()
+                await self._begin(conn)
+                savepoint = await self._savepoint(conn)
+
+
+
+    async def _savepoint(self, conn: psycopg.AsyncConnection) -> bool:
+        if not self.savepoints_supported:
+            return False
+        try:
+            await self._execute(conn, f"SAVEPOINT {RESTART_SAVEPOINT}")
+            return True
+        except psycopg.Error as e:
+            print(f"[retry] SAVEPOINT {RESTART_SAVEPOINT} unavailable ({e}), falling back to restart retries")
+            self.savepoints_supported = False
+            self.stats.add("fallbacks")
+            await self._rollback(conn)
+            await self._begin(conn)
+            return False
+
+
+
+    async def _rollback_to_savepoint(self, conn: psycopg.AsyncConnection) -> bool:
+        try:
+            await self._execute(conn, f"ROLLBACK TO SAVEPOINT {RESTART_SAVEPOINT}")
+            return True
+        except psycopg.Error:
+            return False
+
+
+
+    async def _begin(self, conn: psycopg.AsyncConnection):
+        await self._rollback(conn)
+        await conn.set_autocommit(False)
+
+
+
+    async def _rollback(self, conn: psycopg.AsyncConnection):
+        try:
+            await conn.rollback()
+        except Exception:
+            pass
+
+
+
+    async def _execute(self, conn: psycopg.AsyncConnection, sql: str):
+        async with conn.cursor() as cur:
+            if self.txn_pooling:
+                await cur.execute(sql, prepare=False)
+            else:
+                await cur.execute(sql)
+
+
+
+    async def _backoff(self, fn, attempt: int, err: Exception):
+        sleep_s = backoff_delay(self.backoff, attempt, _previous_sleep.get())
+        _previous_sleep.set(sleep_s)
+        self.stats.add_retry(fn.__name__, error_code(err), sleep_s)
+        await asyncio.sleep(sleep_s)
@@ -0,0 +1,97 @@
+"""
+The --args knobs every workload class takes, parsed in one place:
+
+  txn_pooling   statements go through PgBouncer transaction pooling (prepare=False)
+  retry_mode    restart | savepoint, see txn_retry.py
+  max_retries   retries per transaction before the error is raised
+  backoff       full | decorrelated jitter between retries
+  retry_budget  retries allowed per committed txn
+  txn_style     explicit (BEGIN/COMMIT) | implicit (autocommit) single statements
+  hdr_log       HDR interval log path, "off" to disable, see latency_histograms.py
+  arrival_rate  loop() cycles per second per worker, 0 for the closed loop, see arrival.py
+  arrival       poisson | fixed intervals between arrivals
+
+common_args() returns the per-process latency recorder, the arrival scheduler
+and the retry engine built from them.  RetryMethods / AsyncRetryMethods give a
+workload class the _run_*_with_retries helpers over its `self.retry` engine.
+"""
+import psycopg
+from typing import Optional, Tuple
+
+from arrival import ArrivalScheduler, arrival_scheduler
+from latency_histograms import LatencyHistograms, latency_histograms
+from txn_retry import AsyncTxnRetryEngine, TxnRetryEngine
+
+
+def common_args(args: dict, name: str, engine: Optional[type] = TxnRetryEngine
+                ) -> Tuple[Optional[LatencyHistograms], Optional[ArrivalScheduler], Optional[TxnRetryEngine]]:
+    """
+    (latency, arrivals, retry) for the workload class `name`.  `engine` is
+    TxnRetryEngine, AsyncTxnRetryEngine for the async variants, which can't
+    pipeline, or None for workloads without retries (retry is None).
+    """
+    txn_pooling = bool(args.get("txn_pooling", False))
+    retry_mode = str(args.get("retry_mode", "restart"))
+    max_retries = int(args.get("max_retries", 5))
+    backoff = str(args.get("backoff", "full"))
+    budget_ratio = float(args.get("retry_budget", 0.2))
+    txn_style = str(args.get("txn_style", "explicit"))
+    hdr_log = str(args.get("hdr_log", ""))
+    arrival_rate = float(args.get("arrival_rate", 0))
+    arrival = str(args.get("arrival", "poisson"))
+    if engine is AsyncTxnRetryEngine and bool(args.get("pipeline", False)):
+        raise ValueError("pipeline isn't supported by the async workloads, run the threaded variant to pipeline per-row txns")
+
+    latency = latency_histograms(hdr_log, name)
+    arrivals = arrival_scheduler(arrival_rate, arrival, latency)
+    retry = None
+    if engine is not None:
+        retry = engine(retry_mode, max_retries, txn_pooling, backoff, budget_ratio, latency, txn_style)
+    return latency, arrivals, retry
+
+
+class RetryMethods:
+    """Transaction helpers for workload classes that keep a TxnRetryEngine in `self.retry`."""
+
+    def _run_txn_with_retries(self, conn: psycopg.Connection, fn, *args):
+        """
+        Run `fn(conn, *args)` as one transaction through the shared retry engine
+        (workloads/common/txn_retry.py). `fn` only issues statements, the engine
+        owns BEGIN / SAVEPOINT / COMMIT and retries CockroachDB 40001 errors.
+        """
+        return self.retry.run(conn, fn, *args)
+
+    def _run_stmt_with_retries(self, conn: psycopg.Connection, fn, *args):
+        """
+        Like _run_txn_with_retries for a single-statement `fn`: with txn_style
+        implicit it runs in autocommit as an implicit transaction, which skips the
+        BEGIN / COMMIT round trips and can take CockroachDB's 1PC fast path.
+        """
+        return self.retry.run_statement(conn, fn, *args)
+
+    def _run_txns_pipelined(self, conn: psycopg.Connection, queue_fn, arg_list, fn, fetch=None):
+        """
+        Pipeline-mode variant of a per-row loop: each entry of `arg_list` is still
+        its own BEGIN / COMMIT, but the round trips overlap.  `queue_fn(cur, *args)`
+        only executes statements, `fetch(cur)` reads each committed row's result,
+        and rows that didn't commit are re-run with `fn` through _run_txn_with_retries.
+        """
+        return self.retry.run_pipelined(conn, queue_fn, arg_list, fn, fetch)
+
+
+class AsyncRetryMethods:
+    """RetryMethods for the async workload classes, over an AsyncTxnRetryEngine."""
+
+    async def _run_txn_with_retries(self, conn: psycopg.AsyncConnection, fn, *args):
+        """
+        Run `await fn(conn, *args)` as one transaction through the shared retry
+        engine (workloads/common/txn_retry.py).
+        """
+        return await self.retry.run(conn, fn, *args)
+
+    async def _run_stmt_with_retries(self, conn: psycopg.AsyncConnection, fn, *args):
+        """
+        Like _run_txn_with_retries for a single-statement `fn`, which runs as an
+        implicit transaction with txn_style implicit.
+        """
+        return await self.retry.run_statement(conn, fn, *args)
@@ -0,0 +1,29 @@
+"""
+Loading workload classes from their files, shared by async_runner.py and the op
+mix wrappers (transactionsMix.py, transactionsMixAsync.py).
+
+Same convention as dbworkload: the class is named after the file stem with its
+first letter capitalized, transactionsHotspotAsync.py -> Transactionshotspotasync.
+Each file is executed once per process, however many threads or sessions ask
+for its class.
+"""
+import importlib.util
+import os
+import threading
+from typing import Dict
+
+_classes: Dict[str, type] = {}
+_classes_lock = threading.Lock()
+
+
+def load_workload_class(path: str) -> type:
+    """The class in a workload file, loaded on the first call for that path."""
+    path = os.path.abspath(path)
+    with _classes_lock:
+        if path not in _classes:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            spec = importlib.util.spec_from_file_location(stem, path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _classes[path] = getattr(module, stem.capitalize())
+        return _classes[path]
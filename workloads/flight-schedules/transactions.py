@@ -1,7 +1,18 @@
 import psycopg
+import os
 import random
+import sys
 import time
 
+# shared workload helpers live in workloads/common (mounted at /common in the worker containers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from key_distributions import UNIFORM, key_distribution
+from key_space import shared_key_space
+from latency_histograms import timed_op
+from workload_args import common_args
+
+SAMPLERS = ("keys", "offset")
+
 class Transactions:
 
     def __init__(self, args: dict):
@@ -14,6 +25,20 @@ class Transactions:
         self.batch_size: int = int(args.get("batch_size", 16))
         self.delay: int = int(args.get("delay", 100))
         self.txn_pooling: bool = bool(args.get("txn_pooling", False))
+        self.latency, self.arrivals, _ = common_args(args, type(self).__name__, None)  # hdr_log and arrival args, see workload_args.py
+        self.sampler: str = str(args.get("sampler", "keys"))  # keys (cached flight ids) | offset (random OFFSET scan)
+        self.key_stride: int = int(args.get("key_stride", 1))  # 1 caches every flight id, N every Nth as a range boundary
+        self.key_refresh: float = float(args.get("key_refresh", 300))  # seconds between flight id reloads
+        if self.sampler not in SAMPLERS:
+            raise ValueError(f"sampler must be one of {SAMPLERS}, got {self.sampler!r}")
+        self.flight_keys = shared_key_space("flights", "flight_id", self.key_stride, self.key_refresh)
+        self.key_dist: str = str(args.get("key_dist", UNIFORM))  # uniform | zipfian | hotset | latest flight selection
+        self.zipf_theta: float = float(args.get("zipf_theta", 0.99))  # zipfian/latest skew, 0 (flat) .. 1 (a few hot flights)
+        self.hot_fraction: float = float(args.get("hot_fraction", 0.2))  # share of flights in the hot set
+        self.hot_access: float = float(args.get("hot_access", 0.8))  # share of picks that go to the hot set
+        if self.sampler == "offset" and self.key_dist != UNIFORM:
+            raise ValueError(f"key_dist {self.key_dist!r} needs the keys sampler, the offset sampler is uniform only")
+        self.key_distribution = key_distribution(self.key_dist, self.zipf_theta, self.hot_fraction, self.hot_access)
 
         # you can arbitrarely add any variables you want
         self.counter: int = 0
@@ -44,6 +69,8 @@ class Transactions:
     # Also, the function is a vector to receive the excuting threads's unique id and the total thread count
     def setup(self, conn: psycopg.Connection, id: int, total_thread_count: int):
         self.id = id
+        if self.arrivals:
+            self.arrivals.join(total_thread_count)
 
         if self.txn_pooling:
             # 👇 Disable server-side prepared statements for PgBouncer transaction pooling
@@ -58,6 +85,10 @@ class Transactions:
             )
             print(self._exec(cur, f"select version()").fetchone()[0])
 
+        if self.sampler == "keys":
+            # the first thread in each process loads the flight ids, the rest wait for it
+            self.flight_keys.refresh(conn)
+
 
 
 
@@ -66,7 +97,10 @@ class Transactions:
     # Once every func has been executed, run() is re-evaluated.
     # This process continues until dbworkload exits.
     def loop(self):
-        time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
+        if self.arrivals:
+            self.arrivals.wait()
+        else:
+            time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
         return [self.schedule, self.status, self.inventory, self.price]
 
 
@@ -74,6 +108,29 @@ class Transactions:
     # conn is an instance of a psycopg connection object
     # conn is set by default with autocommit=True, so no need to send a commit message
     def flights(self, conn: psycopg.Connection):
+        if self.sampler == "offset":
+            return self._flights_by_offset(conn)
+
+        self.flight_keys.refresh(conn)
+        if self.key_stride == 1:
+            # every flight id is cached, no query needed
+            return self.flight_keys.sample(self.batch_size, self.key_distribution)
+
+        # read a page of flights by key from a random cached boundary
+        query = """
+SELECT flight_id
+FROM flights
+AS OF SYSTEM TIME follower_read_timestamp()
+WHERE flight_id >= %s
+ORDER BY flight_id
+LIMIT %s;
+"""
+        with conn.cursor() as cur:
+            self._exec(cur, query, (self.flight_keys.boundary(self.key_distribution), self.batch_size))
+            return [row[0] for row in cur]
+
+    # the original sampler, scans and discards up to a tenth of the table per call
+    def _flights_by_offset(self, conn: psycopg.Connection):
         query = f"""
 SELECT flight_id
 FROM flights
@@ -94,6 +151,7 @@ LIMIT {self.batch_size};
 
     # conn is an instance of a psycopg connection object
     # conn is set by default with autocommit=True, so no need to send a commit message
+    @timed_op
     def schedule(self, conn: psycopg.Connection):
         if (random.randint(1, 100) <= self.schedule_freq):
             flight_ids = self.flights(conn)
@@ -120,6 +178,7 @@ WHERE flight_id IN ({values});
 
     # conn is an instance of a psycopg connection object
     # conn is set by default with autocommit=True, so no need to send a commit message
+    @timed_op
     def status(self, conn: psycopg.Connection):
         if (random.randint(1, 100) <= self.status_freq):
             flight_ids = self.flights(conn)
@@ -139,6 +198,7 @@ WHERE flight_id IN ({values});
 
     # conn is an instance of a psycopg connection object
     # conn is set by default with autocommit=True, so no need to send a commit message
+    @timed_op
     def inventory(self, conn: psycopg.Connection):
         if (random.randint(1, 100) <= self.inventory_freq):
             flight_ids = self.flights(conn)
@@ -156,6 +216,7 @@ WHERE flight_id IN ({values});
 
     # conn is an instance of a psycopg connection object
     # conn is set by default with autocommit=True, so no need to send a commit message
+    @timed_op
     def price(self, conn: psycopg.Connection):
         if (random.randint(1, 100) <= self.price_freq):
             flight_ids = self.flights(conn)
@@ -235,7 +235,7 @@ def main() -> None:
     ap.add_argument("--url", default=os.environ.get("DB_URL", ""), help="CockroachDB connection URL (or env DB_URL)")
     ap.add_argument("--certs-dir", default=os.environ.get("DB_CERTS_DIR", ""), help="CockroachDB certificates directory (or env DB_CERTS_DIR)")
     ap.add_argument("--sql", default=DEFAULT_SQL_TEMPLATE, help="Path to comparative SQL template file")
-    ap.add_argument("--phase-order", default="hotspot,scan_shape,concurrency,storage,region",
+    ap.add_argument("--phase-order", default="hotspot,hotspot_batch,scan_shape,concurrency,hash_sharded,storage,region",
                     help="Comma-separated phase order for plots")
     ap.add_argument("--out-root", default=OUTPUT_ROOT, help="Output root directory")
 
@@ -382,10 +382,12 @@ CROSS JOIN baseline b
 ORDER BY
   CASE c.phase
     WHEN 'hotspot' THEN 0
-    WHEN 'scan_shape' THEN 1
-    WHEN 'concurrency' THEN 2
-    WHEN 'storage' THEN 3
-    WHEN 'region' THEN 4
+    WHEN 'hotspot_batch' THEN 1
+    WHEN 'scan_shape' THEN 2
+    WHEN 'concurrency' THEN 3
+    WHEN 'hash_sharded' THEN 4
+    WHEN 'storage' THEN 5
+    WHEN 'region' THEN 6
     ELSE 99
   END,
   CASE c.connection_type
@@ -0,0 +1,33 @@
+-- Opt-in for DISPATCHER=sharded (see ../common/dispatch_shards.py), applied by run_workloads.sh.
+-- Kept out of the phase schemas so the default shared dispatcher doesn't maintain a
+-- second partial index on every insert and publish.
+
+USE concurrency;
+
+-- dispatcher shard, filled in for existing rows by the backfill
+ALTER TABLE outbox ADD COLUMN IF NOT EXISTS bucket INT2 NOT NULL DEFAULT floor(random() * 64)::INT2;
+
+-- Per-bucket dispatcher index: each sharded dispatcher thread claims from its own bucket
+CREATE INDEX IF NOT EXISTS idx_outbox_unpublished_by_bucket_time
+ON outbox (bucket, "timestamp", id)
+STORING (publish_timestamp)
+WHERE is_published = false;
+
+USE storage;
+
+ALTER TABLE outbox ADD COLUMN IF NOT EXISTS bucket INT2 NOT NULL DEFAULT floor(random() * 64)::INT2;
+
+CREATE INDEX IF NOT EXISTS idx_outbox_unpublished_by_bucket_time
+ON outbox (bucket, "timestamp", id)
+STORING (publish_timestamp)
+WHERE is_published = false;
+
+USE region;
+
+ALTER TABLE outbox ADD COLUMN IF NOT EXISTS bucket INT2 NOT NULL DEFAULT floor(random() * 64)::INT2;
+
+-- implicitly prefixed by crdb_region like idx_outbox_unpublished_by_region_time
+CREATE INDEX IF NOT EXISTS idx_outbox_unpublished_by_region_bucket_time
+ON outbox (bucket, "timestamp", id)
+STORING (publish_timestamp)
+WHERE is_published = false;
@@ -1,10 +1,17 @@
 import psycopg
-from psycopg.errors import SerializationFailure
+import os
 import random
+import sys
 import time
 
+# shared workload helpers live in workloads/common (mounted at /common in the worker containers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from dispatch_shards import DISPATCHERS, SHARED, SHARDED, DispatchShards
+from latency_histograms import timed_op
+from workload_args import RetryMethods, common_args
 
-class Transactionsconcurrency:
+
+class Transactionsconcurrency(RetryMethods):
     """
     Phase 2: Dispatcher/batch publish using SKIP LOCKED.
 
@@ -22,10 +29,20 @@ class Transactionsconcurrency:
         self.max_batch_size: int = int(args.get("max_batch_size", 100))
         self.delay: int = int(args.get("delay", 100))
         self.txn_pooling: bool = bool(args.get("txn_pooling", False))
+        self.latency, self.arrivals, self.retry = common_args(args, type(self).__name__)  # retry, txn_style, hdr_log and arrival args, see workload_args.py
+        self.pipeline: bool = bool(args.get("pipeline", False))  # overlap per-row txns in a psycopg pipeline
         self.payload_size: int = int(args.get("payload_size", 50000))  # chars
 
         # Phase 2 knobs
         self.dispatch_batch_size: int = int(args.get("dispatch_batch_size", 100))
+        self.dispatcher: str = str(args.get("dispatcher", SHARED))  # shared (one index head) | sharded (per-thread buckets)
+        self.dispatch_buckets: int = int(args.get("dispatch_buckets", 64))  # must match the bucket DEFAULT in the schema
+        self.dispatch_steal: int = int(args.get("dispatch_steal", 2))  # other buckets to steal from when the own one runs short
+        self.worker: int = int(args.get("worker", 0))  # this worker's index, so threads on different workers own different buckets
+        self.workers: int = int(args.get("workers", 1))
+        if self.dispatcher not in DISPATCHERS:
+            raise ValueError(f"dispatcher must be one of {DISPATCHERS}, got {self.dispatcher!r}")
+        self.shards = DispatchShards(self.dispatch_buckets, self.dispatch_steal)
 
         # Optional
         self.counter: int = 0
@@ -55,37 +72,20 @@ class Transactionsconcurrency:
 
 
 
-    def _is_retryable_error(self, err: Exception) -> bool:
-        return isinstance(err, SerializationFailure)
-
-
-
-    def _run_txn_with_retries(self, conn: psycopg.Connection, fn, max_retries: int = 5):
-        attempt = 0
-        while True:
-            try:
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-                conn.autocommit = True
-                return fn(conn)
-            except Exception as e:
-                if not self._is_retryable_error(e) or attempt >= max_retries:
-                    raise
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-                sleep_s = (2 ** attempt) * 0.05
-                print(f"[retry] {fn.__name__} attempt {attempt+1} failed with {e}, retrying in {sleep_s:.3f}s")
-                time.sleep(sleep_s)
-                attempt += 1
+    def _fetch_id(self, cur):
+        row = cur.fetchone()
+        if not row:
+            raise Exception("Failed to insert payload")
+        return row[0]
 
 
 
     def setup(self, conn: psycopg.Connection, id: int, total_thread_count: int):
         self.id = id
+        if self.arrivals:
+            self.arrivals.join(total_thread_count)
+        if self.dispatcher == SHARDED:
+            self.shards.assign(id, total_thread_count, self.worker, self.workers)
 
         if self.txn_pooling:
             try:
@@ -100,20 +100,31 @@ class Transactionsconcurrency:
 
 
     def loop(self):
-        time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
+        if self.arrivals:
+            self.arrivals.wait()
+        else:
+            time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
         return [self.insert, self.dispatch_publish]
 
 
 
     # Keep inserts as one-row-per-txn to maintain churn pressure
+    @timed_op
     def insert(self, conn: psycopg.Connection):
         batch_size = self._random_batch_size()
+        if self.pipeline:
+            self._run_txns_pipelined(
+                conn, self._queue_insert, [()] * batch_size, self._insert_once, self._fetch_id)
+            return
         for _ in range(batch_size):
-            self._run_txn_with_retries(conn, self._insert_once)
+            self._run_stmt_with_retries(conn, self._insert_once)
 
     def _insert_once(self, conn: psycopg.Connection):
-        original_autocommit = conn.autocommit
+        with conn.cursor() as cur:
+            self._queue_insert(cur)
+            self._fetch_id(cur)
 
+    def _queue_insert(self, cur):
         insert_sql = """
             INSERT INTO outbox
               (aggregatetype, aggregateid, type, payload)
@@ -122,29 +133,25 @@ class Transactionsconcurrency:
             RETURNING id;
         """
 
-        try:
-            conn.autocommit = False
-            with conn.cursor() as cur:
-                self._exec(cur, insert_sql, (self.payload_size,))
-                _ = cur.fetchone()
-                if not _:
-                    raise Exception("Failed to insert payload")
-            conn.commit()
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.autocommit = original_autocommit
+        self._exec(cur, insert_sql, (self.payload_size,))
 
 
 
+    @timed_op
     def dispatch_publish(self, conn: psycopg.Connection):
         # One dispatcher txn per loop; retries handle 40001s cleanly.
-        self._run_txn_with_retries(conn, self._dispatch_publish_once)
+        dispatch = self._dispatch_publish_sharded if self.dispatcher == SHARDED else self._dispatch_publish_once
+        published = self._run_txn_with_retries(conn, dispatch)
 
-    def _dispatch_publish_once(self, conn: psycopg.Connection):
-        original_autocommit = conn.autocommit
+        # Optional: emit a lightweight progress line (useful in aggregated logs)
+        if published:
+            print(f"[dispatcher] published {len(published)} rows (example id={published[0][0]})")
+        else:
+            print("[dispatcher] published 0 rows (no work available)")
 
+        return published
+
+    def _dispatch_publish_once(self, conn: psycopg.Connection):
         # NOTE:
         # - Ordering by "timestamp" makes progress deterministic.
         # - SKIP LOCKED prevents blocking if another worker already claimed rows.
@@ -166,29 +173,46 @@ class Transactionsconcurrency:
             RETURNING o.id, o.publish_timestamp;
         """
 
-        try:
-            conn.autocommit = False
-            published = []
+        published = []
 
-            with conn.cursor() as cur:
-                self._exec(cur, dispatch_sql, (self.dispatch_batch_size,))
-                # fetchall is safe here; max rows == dispatch_batch_size
-                rows = cur.fetchall()
-                for r in rows:
-                    published.append((r[0], r[1]))
-
-            conn.commit()
+        with conn.cursor() as cur:
+            self._exec(cur, dispatch_sql, (self.dispatch_batch_size,))
+            # fetchall is safe here; max rows == dispatch_batch_size
+            rows = cur.fetchall()
+            for r in rows:
+                published.append((r[0], r[1]))
+
+        return published
+
+    def _dispatch_publish_sharded(self, conn: psycopg.Connection):
+        # Bucket-scoped dispatcher: claim from this thread's own bucket first and
+        # only steal from other buckets for whatever is left of the batch, so
+        # threads don't race each other for the same oldest rows.
+        dispatch_sql = """
+            WITH cte AS (
+              SELECT id
+              FROM outbox
+              WHERE bucket = %s
+                AND is_published = false
+              ORDER BY "timestamp"
+              LIMIT %s
+              FOR UPDATE SKIP LOCKED
+            )
+            UPDATE outbox o
+            SET is_published = true,
+                publish_timestamp = now()
+            FROM cte
+            WHERE o.id = cte.id
+            RETURNING o.id, o.publish_timestamp;
+        """
 
-            # Optional: emit a lightweight progress line (useful in aggregated logs)
-            if published:
-                print(f"[dispatcher] published {len(published)} rows (example id={published[0][0]})")
-            else:
-                print("[dispatcher] published 0 rows (no work available)")
+        published = []
 
-            return published
+        with conn.cursor() as cur:
+            for bucket in self.shards.plan():
+                self._exec(cur, dispatch_sql, (bucket, self.dispatch_batch_size - len(published)))
+                published.extend(cur.fetchall())
+                if len(published) >= self.dispatch_batch_size:
+                    break
 
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.autocommit = original_autocommit
+        return published
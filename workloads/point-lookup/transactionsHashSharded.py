@@ -0,0 +1,247 @@
+import psycopg
+import os
+import random
+import sys
+import time
+
+# shared workload helpers live in workloads/common (mounted at /common in the worker containers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from dispatch_shards import DISPATCHERS, SHARED, SHARDED, DispatchShards
+from latency_histograms import timed_op
+from workload_args import RetryMethods, common_args
+
+
+class Transactionshashsharded(RetryMethods):
+    """
+    Phase 2b: the concurrency phase's dispatcher on a hash-sharded dispatcher index.
+
+    idx_outbox_unpublished_by_time on ("timestamp", id) appends every insert to
+    the tail range of the index, so inserts are capped by one leaseholder.  The
+    hash_sharded schema builds it USING HASH instead, which prefixes a hidden
+    shard column and spreads the tail over bucket_count ranges.
+
+    Flow per cycle:
+      - Insert N messages (one txn each), same as the concurrency phase
+      - Dispatcher publishes up to dispatch_batch_size rows in one txn:
+          shared   ORDER BY "timestamp" LIMIT n FOR UPDATE SKIP LOCKED, which
+                   reads the head of every shard and merges them by timestamp
+          sharded  each thread claims from its own shards of the index and
+                   steals from the others (see common/dispatch_shards.py)
+    """
+
+    def __init__(self, args: dict):
+        self.min_batch_size: int = int(args.get("min_batch_size", 10))
+        self.max_batch_size: int = int(args.get("max_batch_size", 100))
+        self.delay: int = int(args.get("delay", 100))
+        self.txn_pooling: bool = bool(args.get("txn_pooling", False))
+        self.latency, self.arrivals, self.retry = common_args(args, type(self).__name__)  # retry, txn_style, hdr_log and arrival args, see workload_args.py
+        self.pipeline: bool = bool(args.get("pipeline", False))  # overlap per-row txns in a psycopg pipeline
+        self.payload_size: int = int(args.get("payload_size", 50000))  # chars
+
+        # Phase 2b knobs
+        self.dispatch_batch_size: int = int(args.get("dispatch_batch_size", 100))
+        self.dispatcher: str = str(args.get("dispatcher", SHARED))  # shared (merge every shard's head) | sharded (per-thread shards)
+        self.dispatch_steal: int = int(args.get("dispatch_steal", 2))  # other shards to steal from when the own one runs short
+        self.worker: int = int(args.get("worker", 0))  # this worker's index, so threads on different workers own different shards
+        self.workers: int = int(args.get("workers", 1))
+        if self.dispatcher not in DISPATCHERS:
+            raise ValueError(f"dispatcher must be one of {DISPATCHERS}, got {self.dispatcher!r}")
+        # the shard column and its bucket count are read from the schema in setup()
+        self.shard_column: str = ""
+        self.shards: DispatchShards = None
+
+        # Optional
+        self.counter: int = 0
+
+
+
+    def _random_batch_size(self) -> int:
+        if self.max_batch_size <= self.min_batch_size:
+            return self.min_batch_size
+        return random.randint(self.min_batch_size, self.max_batch_size)
+
+
+
+    def _exec(self, cur, sql, params=None):
+        """
+        Wrapper around cursor.execute() that always disables server-side
+        prepared statements (prepare=False), required for PgBouncer txn pooling.
+        """
+        if params is None:
+            if self.txn_pooling:
+                return cur.execute(sql, prepare=False)
+            return cur.execute(sql)
+        else:
+            if self.txn_pooling:
+                return cur.execute(sql, params, prepare=False)
+            return cur.execute(sql, params)
+
+
+
+    def _fetch_id(self, cur):
+        row = cur.fetchone()
+        if not row:
+            raise Exception("Failed to insert payload")
+        return row[0]
+
+
+
+    def setup(self, conn: psycopg.Connection, id: int, total_thread_count: int):
+        self.id = id
+        if self.arrivals:
+            self.arrivals.join(total_thread_count)
+
+        if self.txn_pooling:
+            try:
+                conn.prepare_threshold = 0
+            except Exception as e:
+                print(f"Could not disable prepared statements: {e}")
+
+        with conn.cursor() as cur:
+            print(f"My thread ID is {id}. The total count of threads is {total_thread_count}")
+            print(self._exec(cur, "select version()").fetchone()[0])
+
+        if self.dispatcher == SHARDED:
+            self.shard_column = self._find_shard_column(conn)
+            # hidden shard columns are named crdb_internal_<columns>_shard_<bucket_count>
+            self.shards = DispatchShards(int(self.shard_column.rsplit("_", 1)[1]), self.dispatch_steal)
+            self.shards.assign(id, total_thread_count, self.worker, self.workers)
+
+
+
+    def _find_shard_column(self, conn: psycopg.Connection) -> str:
+        shard_sql = """
+            SELECT column_name
+            FROM [SHOW COLUMNS FROM outbox]
+            WHERE column_name LIKE 'crdb\\_internal\\_%\\_shard\\_%'
+            ORDER BY column_name
+            LIMIT 1;
+        """
+
+        with conn.cursor() as cur:
+            row = self._exec(cur, shard_sql).fetchone()
+        if not row:
+            raise Exception("outbox has no hash-sharded index, run hash-sharded-schema.sql first")
+        return row[0]
+
+
+
+    def loop(self):
+        if self.arrivals:
+            self.arrivals.wait()
+        else:
+            time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
+        return [self.insert, self.dispatch_publish]
+
+
+
+    # Keep inserts as one-row-per-txn to maintain churn pressure
+    @timed_op
+    def insert(self, conn: psycopg.Connection):
+        batch_size = self._random_batch_size()
+        if self.pipeline:
+            self._run_txns_pipelined(
+                conn, self._queue_insert, [()] * batch_size, self._insert_once, self._fetch_id)
+            return
+        for _ in range(batch_size):
+            self._run_stmt_with_retries(conn, self._insert_once)
+
+    def _insert_once(self, conn: psycopg.Connection):
+        with conn.cursor() as cur:
+            self._queue_insert(cur)
+            self._fetch_id(cur)
+
+    def _queue_insert(self, cur):
+        insert_sql = """
+            INSERT INTO outbox
+              (aggregatetype, aggregateid, type, payload)
+            VALUES
+              ('svc', 'agg', 'event', repeat('x', %s))
+            RETURNING id;
+        """
+
+        self._exec(cur, insert_sql, (self.payload_size,))
+
+
+
+    @timed_op
+    def dispatch_publish(self, conn: psycopg.Connection):
+        # One dispatcher txn per loop; retries handle 40001s cleanly.
+        dispatch = self._dispatch_publish_sharded if self.dispatcher == SHARDED else self._dispatch_publish_once
+        published = self._run_txn_with_retries(conn, dispatch)
+
+        # Optional: emit a lightweight progress line (useful in aggregated logs)
+        if published:
+            print(f"[dispatcher] published {len(published)} rows (example id={published[0][0]})")
+        else:
+            print("[dispatcher] published 0 rows (no work available)")
+
+        return published
+
+    def _dispatch_publish_once(self, conn: psycopg.Connection):
+        # NOTE:
+        # - Same statement as the concurrency phase.  On the hash-sharded index the
+        #   optimizer scans the first n rows of each shard and merges them by
+        #   "timestamp", so this is still the oldest n rows overall.
+        # - SKIP LOCKED prevents blocking if another worker already claimed rows.
+        # - Returning (id, publish_timestamp) gives the app a definitive list of published messages.
+        dispatch_sql = """
+            WITH cte AS (
+              SELECT id
+              FROM outbox
+              WHERE is_published = false
+              ORDER BY "timestamp"
+              LIMIT %s
+              FOR UPDATE SKIP LOCKED
+            )
+            UPDATE outbox o
+            SET is_published = true,
+                publish_timestamp = now()
+            FROM cte
+            WHERE o.id = cte.id
+            RETURNING o.id, o.publish_timestamp;
+        """
+
+        published = []
+
+        with conn.cursor() as cur:
+            self._exec(cur, dispatch_sql, (self.dispatch_batch_size,))
+            # fetchall is safe here; max rows == dispatch_batch_size
+            rows = cur.fetchall()
+            for r in rows:
+                published.append((r[0], r[1]))
+
+        return published
+
+    def _dispatch_publish_sharded(self, conn: psycopg.Connection):
+        # Shard-scoped dispatcher: claim from this thread's own shard of the index
+        # first and only steal from other shards for whatever is left of the batch,
+        # so threads don't race each other for the same oldest rows.
+        dispatch_sql = f"""
+            WITH cte AS (
+              SELECT id
+              FROM outbox
+              WHERE {self.shard_column} = %s
+                AND is_published = false
+              ORDER BY "timestamp"
+              LIMIT %s
+              FOR UPDATE SKIP LOCKED
+            )
+            UPDATE outbox o
+            SET is_published = true,
+                publish_timestamp = now()
+            FROM cte
+            WHERE o.id = cte.id
+            RETURNING o.id, o.publish_timestamp;
+        """
+
+        published = []
+
+        with conn.cursor() as cur:
+            for shard in self.shards.plan():
+                self._exec(cur, dispatch_sql, (shard, self.dispatch_batch_size - len(published)))
+                published.extend(cur.fetchall())
+                if len(published) >= self.dispatch_batch_size:
+                    break
+
+        return published
@@ -1,9 +1,16 @@
 import psycopg
-from psycopg.errors import SerializationFailure, OperationalError
+import os
 import random
+import sys
 import time
 
-class Transactionshotspot:
+# shared workload helpers live in workloads/common (mounted at /common in the worker containers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from key_distributions import key_distribution, shared_recent_keys
+from latency_histograms import timed_op
+from workload_args import RetryMethods, common_args
+
+class Transactionshotspot(RetryMethods):
 
     def __init__(self, args: dict):
         # args is a dict of string passed with the --args flag
@@ -13,6 +20,15 @@ class Transactionshotspot:
         self.delay: int = int(args.get("delay", 100))
         self.txn_pooling: bool = bool(args.get("txn_pooling", False))
         self.payload_size: int = int(args.get("payload_size", 50000))  # chars
+        self.latency, self.arrivals, self.retry = common_args(args, type(self).__name__)  # retry, txn_style, hdr_log and arrival args, see workload_args.py
+        self.pipeline: bool = bool(args.get("pipeline", False))  # overlap per-row txns in a psycopg pipeline
+        self.key_dist: str = str(args.get("key_dist", "none"))  # none (this cycle's inserts) | uniform | zipfian | hotset | latest recent inserts
+        self.zipf_theta: float = float(args.get("zipf_theta", 0.99))  # zipfian/latest skew, 0 (flat) .. 1 (a few hot ids)
+        self.hot_fraction: float = float(args.get("hot_fraction", 0.2))  # share of recent ids in the hot set
+        self.hot_access: float = float(args.get("hot_access", 0.8))  # share of picks that go to the hot set
+        self.recent_keys: int = int(args.get("recent_keys", 100000))  # inserted ids per worker process to pick from
+        self.key_distribution = key_distribution(self.key_dist, self.zipf_theta, self.hot_fraction, self.hot_access)
+        self.recent = shared_recent_keys(type(self).__name__, self.recent_keys)
 
         # you can arbitrarily add any variables you want
         self.counter: int = 0
@@ -45,51 +61,11 @@ class Transactionshotspot:
       
 
 
-    def _is_retryable_error(self, err: Exception) -> bool:
-      # Cockroach retryable transaction errors are a subclass of SerializationFailure
-      if isinstance(err, SerializationFailure):
-          return True
-      else:
-          return False
-
-
-
-    def _run_txn_with_retries(self, conn: psycopg.Connection, fn, max_retries: int = 5):
-        """
-        Run a transactional function `fn(conn)` with Cockroach-style retries.
-        The function `fn` should:
-          - set conn.autocommit = False
-          - do its work
-          - COMMIT on success
-        Any retryable error will cause a retry of `fn` up to max_retries.
-        """
-        attempt = 0
-        while True:
-            try:
-                # Make sure we're not starting in an aborted txn
-                try:
-                    conn.rollback()
-                except Exception:
-                    # If there's nothing to roll back or it fails, ignore
-                    pass
-                conn.autocommit = True  # reset to default before retry
-
-                return fn(conn)
-            except Exception as e:
-                if not self._is_retryable_error(e) or attempt >= max_retries:
-                    # Non-retryable or max attempts exceeded – re-raise
-                    raise
-
-                # Best effort: ensure we clean up before retry
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-
-                sleep_ms = (2 ** attempt) * 0.05  # 50ms, 100ms, 200ms, ...
-                print(f"[retry] {fn.__name__} attempt {attempt+1} failed with {e}, retrying in {sleep_ms:.3f}s")
-                time.sleep(sleep_ms)
-                attempt += 1
+    def _fetch_id(self, cur):
+        row = cur.fetchone()
+        if not row:
+            raise Exception("Failed to insert payload")
+        return row[0]
 
 
 
@@ -98,6 +74,8 @@ class Transactionshotspot:
     # Also, the function is a vector to receive the executing thread's unique id and the total thread count
     def setup(self, conn: psycopg.Connection, id: int, total_thread_count: int):
         self.id = id
+        if self.arrivals:
+            self.arrivals.join(total_thread_count)
 
         if self.txn_pooling:
             # 👇 Disable server-side prepared statements for PgBouncer transaction pooling
@@ -119,22 +97,51 @@ class Transactionshotspot:
     # Once every func has been executed, loop() is re-evaluated.
     # This process continues until dbworkload exits.
     def loop(self):
-        time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
+        if self.arrivals:
+            self.arrivals.wait()
+        else:
+            time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
         self.msg_ids = []
+        self.targets = None
         return [self.insert, self.select, self.update]
 
 
 
+    def _targets(self):
+        """
+        The ids this cycle reads and updates: the ones it just inserted, or with a
+        key_dist as many ids drawn from the process's recent inserts, so that hot
+        ids are shared by every connection.
+        """
+        if self.targets is None:
+            if self.key_distribution is None:
+                self.targets = self.msg_ids
+            else:
+                self.recent.add(self.msg_ids)
+                self.targets = self.recent.sample(len(self.msg_ids), self.key_distribution)
+        return self.targets
+
+
+
     # conn is an instance of a psycopg connection object
-    # setting autocommit=False to simulate explicit commit
+    # each row runs in its own explicit transaction (see _run_txn_with_retries)
+    @timed_op
     def insert(self, conn: psycopg.Connection):
         batch_size = self._random_batch_size()
+        if self.pipeline:
+            self.msg_ids.extend(self._run_txns_pipelined(
+                conn, self._queue_insert, [()] * batch_size, self._insert_once, self._fetch_id))
+            return
         for _ in range(batch_size):
-            self._run_txn_with_retries(conn, self._insert_once)
+            self.msg_ids.append(self._run_stmt_with_retries(conn, self._insert_once))
 
     def _insert_once(self, conn: psycopg.Connection):
-        original_autocommit = conn.autocommit
+        with conn.cursor() as cur:
+            self._queue_insert(cur)
+            # only record the id once the engine has committed
+            return self._fetch_id(cur)
 
+    def _queue_insert(self, cur):
         # Parameterize payload size so you can keep Phase 1 comparable to baseline
         insert_sql = """
             INSERT INTO outbox
@@ -144,33 +151,29 @@ class Transactionshotspot:
             RETURNING id;
         """
 
-        try:
-            conn.autocommit = False
-            with conn.cursor() as cur:
-                self._exec(cur, insert_sql, (self.payload_size,))
-                row = cur.fetchone()
-                if not row:
-                    raise Exception("Failed to insert payload")
-                self.msg_ids.append(row[0])
-            conn.commit()
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.autocommit = original_autocommit
+        self._exec(cur, insert_sql, (self.payload_size,))
 
 
 
     # conn is an instance of a psycopg connection object
-    # setting autocommit=False to simulate explicit commit
+    # each row runs in its own explicit transaction (see _run_txn_with_retries)
+    @timed_op
     def select(self, conn: psycopg.Connection):
-        for msg_id in self.msg_ids:
-            self._run_txn_with_retries(conn, lambda c: self._select_once(c, msg_id))
+        if self.pipeline:
+            self._run_txns_pipelined(
+                conn, self._queue_select, [(msg_id,) for msg_id in self._targets()], self._select_once,
+                lambda cur: cur.fetchone())
+            return
+        for msg_id in self._targets():
+            self._run_stmt_with_retries(conn, self._select_once, msg_id)
 
 
     def _select_once(self, conn: psycopg.Connection, msg_id):
-        original_autocommit = conn.autocommit
+        with conn.cursor() as cur:
+            self._queue_select(cur, msg_id)
+            cur.fetchone()
 
+    def _queue_select(self, cur, msg_id):
         # select the timestamp of the unpublished message
         select_sql = """
             SELECT crdb_internal_mvcc_timestamp
@@ -178,34 +181,27 @@ class Transactionshotspot:
             WHERE id = %s AND is_published = false;
         """
 
-        try:
-            conn.autocommit = False
-
-            with conn.cursor() as cur:
-                self._exec(cur, select_sql, (msg_id,))
-                cur.fetchone()
-
-            conn.commit()
-
-        except Exception as e:
-            conn.rollback()
-            raise
-
-        finally:
-            conn.autocommit = original_autocommit
+        self._exec(cur, select_sql, (msg_id,))
 
 
 
     # conn is an instance of a psycopg connection object
-    # setting autocommit=False to simulate explicit commit
+    # each row runs in its own explicit transaction (see _run_txn_with_retries)
+    @timed_op
     def update(self, conn: psycopg.Connection):
-        for msg_id in self.msg_ids:
-            self._run_txn_with_retries(conn, lambda c: self._update_once(c, msg_id))
+        if self.pipeline:
+            self._run_txns_pipelined(
+                conn, self._queue_update, [(msg_id,) for msg_id in self._targets()], self._update_once)
+            return
+        for msg_id in self._targets():
+            self._run_stmt_with_retries(conn, self._update_once, msg_id)
 
 
     def _update_once(self, conn: psycopg.Connection, msg_id):
-        original_autocommit = conn.autocommit
+        with conn.cursor() as cur:
+            self._queue_update(cur, msg_id)
 
+    def _queue_update(self, cur, msg_id):
         # mark the message as published
         update_sql = """
             UPDATE outbox@{NO_FULL_SCAN}
@@ -214,17 +210,4 @@ class Transactionshotspot:
             WHERE id = %s;
         """
 
-        try:
-            conn.autocommit = False
-
-            with conn.cursor() as cur:
-                self._exec(cur, update_sql, (msg_id,))
-
-            conn.commit()
-
-        except Exception as e:
-            conn.rollback()
-            raise
-
-        finally:
-            conn.autocommit = original_autocommit
+        self._exec(cur, update_sql, (msg_id,))
@@ -0,0 +1,169 @@
+import psycopg
+import asyncio
+import os
+import random
+import sys
+
+# shared workload helpers live in workloads/common (mounted at /common in the worker containers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from key_distributions import key_distribution, shared_recent_keys
+from latency_histograms import timed_op
+from txn_retry import AsyncTxnRetryEngine
+from workload_args import AsyncRetryMethods, common_args
+
+# Async variant of transactionsHotspot.py for ../common/async_runner.py, which drives
+# thousands of sessions per process on one event loop instead of one thread per connection.
+class Transactionshotspotasync(AsyncRetryMethods):
+
+    def __init__(self, args: dict):
+        # args is a dict of string passed with the --args flag
+        # user passed a yaml/json, in python that's a dict object
+        self.min_batch_size: int = int(args.get("min_batch_size", 10))
+        self.max_batch_size: int = int(args.get("max_batch_size", 100))
+        self.delay: int = int(args.get("delay", 100))
+        self.txn_pooling: bool = bool(args.get("txn_pooling", False))
+        self.payload_size: int = int(args.get("payload_size", 50000))  # chars
+        self.latency, self.arrivals, self.retry = common_args(args, type(self).__name__, AsyncTxnRetryEngine)  # retry, txn_style, hdr_log and arrival args, see workload_args.py
+        self.key_dist: str = str(args.get("key_dist", "none"))  # none (this cycle's inserts) | uniform | zipfian | hotset | latest recent inserts
+        self.zipf_theta: float = float(args.get("zipf_theta", 0.99))  # zipfian/latest skew, 0 (flat) .. 1 (a few hot ids)
+        self.hot_fraction: float = float(args.get("hot_fraction", 0.2))  # share of recent ids in the hot set
+        self.hot_access: float = float(args.get("hot_access", 0.8))  # share of picks that go to the hot set
+        self.recent_keys: int = int(args.get("recent_keys", 100000))  # inserted ids per worker process to pick from
+        self.key_distribution = key_distribution(self.key_dist, self.zipf_theta, self.hot_fraction, self.hot_access)
+        self.recent = shared_recent_keys(type(self).__name__, self.recent_keys)
+
+        # you can arbitrarily add any variables you want
+        self.counter: int = 0
+
+
+
+    def _random_batch_size(self) -> int:
+        if self.max_batch_size <= self.min_batch_size:
+            return self.min_batch_size
+        return random.randint(self.min_batch_size, self.max_batch_size)
+
+
+
+    async def _exec(self, cur, sql, params=None):
+        """
+        Wrapper around cursor.execute() that always disables server-side
+        prepared statements (prepare=False), which is required when using
+        PgBouncer in transaction pooling mode.
+        """
+        if self.txn_pooling:
+            return await cur.execute(sql, params, prepare=False)
+        return await cur.execute(sql, params)
+
+
+
+    # the setup() function is executed only once per session,
+    # with the session's unique id and the total session count
+    async def setup(self, conn: psycopg.AsyncConnection, id: int, total_thread_count: int):
+        self.id = id
+        if self.arrivals:
+            self.arrivals.join(total_thread_count)
+
+        if self.txn_pooling:
+            # 👇 Disable server-side prepared statements for PgBouncer transaction pooling
+            conn.prepare_threshold = None
+
+        # only the first session logs, thousands of version() lines aren't useful
+        if id == 0:
+            async with conn.cursor() as cur:
+                print(f"My session ID is {id}. The total count of sessions is {total_thread_count}")
+                print((await (await self._exec(cur, "select version()")).fetchone())[0])
+
+
+
+    # the loop() function returns a list of async functions
+    # that the runner awaits, sequentially, for this session.
+    async def loop(self):
+        if self.arrivals:
+            await self.arrivals.wait_async()
+        else:
+            await asyncio.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
+        self.msg_ids = []
+        self.targets = None
+        return [self.insert, self.select, self.update]
+
+
+
+    def _targets(self):
+        """
+        The ids this cycle reads and updates: the ones it just inserted, or with a
+        key_dist as many ids drawn from the process's recent inserts, so that hot
+        ids are shared by every connection.
+        """
+        if self.targets is None:
+            if self.key_distribution is None:
+                self.targets = self.msg_ids
+            else:
+                self.recent.add(self.msg_ids)
+                self.targets = self.recent.sample(len(self.msg_ids), self.key_distribution)
+        return self.targets
+
+
+
+    # each row runs in its own explicit transaction (see _run_txn_with_retries)
+    @timed_op
+    async def insert(self, conn: psycopg.AsyncConnection):
+        batch_size = self._random_batch_size()
+        for _ in range(batch_size):
+            self.msg_ids.append(await self._run_stmt_with_retries(conn, self._insert_once))
+
+    async def _insert_once(self, conn: psycopg.AsyncConnection):
+        # Parameterize payload size so you can keep Phase 1 comparable to baseline
+        insert_sql = """
+            INSERT INTO outbox
+              (aggregatetype, aggregateid, type, payload)
+            VALUES
+              ('svc', 'agg', 'event', repeat('x', %s))
+            RETURNING id;
+        """
+
+        async with conn.cursor() as cur:
+            await self._exec(cur, insert_sql, (self.payload_size,))
+            row = await cur.fetchone()
+            if not row:
+                raise Exception("Failed to insert payload")
+            return row[0]
+
+
+
+    # each row runs in its own explicit transaction (see _run_txn_with_retries)
+    @timed_op
+    async def select(self, conn: psycopg.AsyncConnection):
+        for msg_id in self._targets():
+            await self._run_stmt_with_retries(conn, self._select_once, msg_id)
+
+    async def _select_once(self, conn: psycopg.AsyncConnection, msg_id):
+        # select the timestamp of the unpublished message
+        select_sql = """
+            SELECT crdb_internal_mvcc_timestamp
+            FROM outbox@{NO_FULL_SCAN}
+            WHERE id = %s AND is_published = false;
+        """
+
+        async with conn.cursor() as cur:
+            await self._exec(cur, select_sql, (msg_id,))
+            await cur.fetchone()
+
+
+
+    # each row runs in its own explicit transaction (see _run_txn_with_retries)
+    @timed_op
+    async def update(self, conn: psycopg.AsyncConnection):
+        for msg_id in self._targets():
+            await self._run_stmt_with_retries(conn, self._update_once, msg_id)
+
+    async def _update_once(self, conn: psycopg.AsyncConnection, msg_id):
+        # mark the message as published
+        update_sql = """
+            UPDATE outbox@{NO_FULL_SCAN}
+            SET is_published = true,
+                publish_timestamp = now()
+            WHERE id = %s;
+        """
+
+        async with conn.cursor() as cur:
+            await self._exec(cur, update_sql, (msg_id,))
@@ -0,0 +1,208 @@
+import psycopg
+import os
+import random
+import sys
+import time
+
+# shared workload helpers live in workloads/common (mounted at /common in the worker containers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from key_distributions import key_distribution, shared_recent_keys
+from latency_histograms import timed_op
+from workload_args import RetryMethods, common_args
+
+class Transactionshotspotbatch(RetryMethods):
+
+    def __init__(self, args: dict):
+        # args is a dict of string passed with the --args flag
+        # user passed a yaml/json, in python that's a dict object
+        self.min_batch_size: int = int(args.get("min_batch_size", 10))
+        self.max_batch_size: int = int(args.get("max_batch_size", 100))
+        self.delay: int = int(args.get("delay", 100))
+        self.txn_pooling: bool = bool(args.get("txn_pooling", False))
+        self.payload_size: int = int(args.get("payload_size", 50000))  # chars
+        self.latency, self.arrivals, self.retry = common_args(args, type(self).__name__)  # retry, txn_style, hdr_log and arrival args, see workload_args.py
+        self.pipeline: bool = bool(args.get("pipeline", False))  # overlap per-row txns in a psycopg pipeline
+        self.chunk_size: int = int(args.get("chunk_size", 100))  # ids per set-based select/update txn
+        self.key_dist: str = str(args.get("key_dist", "none"))  # none (this cycle's inserts) | uniform | zipfian | hotset | latest recent inserts
+        self.zipf_theta: float = float(args.get("zipf_theta", 0.99))  # zipfian/latest skew, 0 (flat) .. 1 (a few hot ids)
+        self.hot_fraction: float = float(args.get("hot_fraction", 0.2))  # share of recent ids in the hot set
+        self.hot_access: float = float(args.get("hot_access", 0.8))  # share of picks that go to the hot set
+        self.recent_keys: int = int(args.get("recent_keys", 100000))  # inserted ids per worker process to pick from
+        self.key_distribution = key_distribution(self.key_dist, self.zipf_theta, self.hot_fraction, self.hot_access)
+        self.recent = shared_recent_keys(type(self).__name__, self.recent_keys)
+
+        # you can arbitrarily add any variables you want
+        self.counter: int = 0
+
+
+
+    def _random_batch_size(self) -> int:
+        if self.max_batch_size <= self.min_batch_size:
+            return self.min_batch_size
+        return random.randint(self.min_batch_size, self.max_batch_size)
+    
+
+
+    def _exec(self, cur, sql, params=None):
+        """
+        Wrapper around cursor.execute() that always disables server-side
+        prepared statements (prepare=False), which is required when using
+        PgBouncer in transaction pooling mode.
+        """
+        if params is None:
+            if self.txn_pooling:
+                return cur.execute(sql, prepare=False)
+            else:
+                return cur.execute(sql)
+        else:
+            if self.txn_pooling:
+                return cur.execute(sql, params, prepare=False)
+            else:
+                return cur.execute(sql, params)
+      
+
+
+    def _fetch_id(self, cur):
+        row = cur.fetchone()
+        if not row:
+            raise Exception("Failed to insert payload")
+        return row[0]
+
+
+
+    # the setup() function is executed only once
+    # when a new executing thread is started.
+    # Also, the function is a vector to receive the executing thread's unique id and the total thread count
+    def setup(self, conn: psycopg.Connection, id: int, total_thread_count: int):
+        self.id = id
+        if self.arrivals:
+            self.arrivals.join(total_thread_count)
+
+        if self.txn_pooling:
+            # 👇 Disable server-side prepared statements for PgBouncer transaction pooling
+            try:
+                conn.prepare_threshold = 0
+            except Exception as e:
+                print(f"Could not disable prepared statements: {e}")
+
+        with conn.cursor() as cur:
+            print(
+                f"My thread ID is {id}. The total count of threads is {total_thread_count}"
+            )
+            print(self._exec(cur, "select version()").fetchone()[0])
+
+
+
+    # the loop() function returns a list of functions
+    # that dbworkload will execute, sequentially.
+    # Once every func has been executed, loop() is re-evaluated.
+    # This process continues until dbworkload exits.
+    def loop(self):
+        if self.arrivals:
+            self.arrivals.wait()
+        else:
+            time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
+        self.msg_ids = []
+        self.targets = None
+        return [self.insert, self.select, self.update]
+
+
+
+    def _targets(self):
+        """
+        The ids this cycle reads and updates: the ones it just inserted, or with a
+        key_dist as many ids drawn from the process's recent inserts, so that hot
+        ids are shared by every connection.
+        """
+        if self.targets is None:
+            if self.key_distribution is None:
+                self.targets = self.msg_ids
+            else:
+                self.recent.add(self.msg_ids)
+                self.targets = self.recent.sample(len(self.msg_ids), self.key_distribution)
+        return self.targets
+
+
+
+    def _chunks(self):
+        size = max(1, self.chunk_size)
+        targets = self._targets()
+        for i in range(0, len(targets), size):
+            yield targets[i:i + size]
+
+
+
+    # conn is an instance of a psycopg connection object
+    # each row runs in its own explicit transaction (see _run_txn_with_retries)
+    @timed_op
+    def insert(self, conn: psycopg.Connection):
+        batch_size = self._random_batch_size()
+        if self.pipeline:
+            self.msg_ids.extend(self._run_txns_pipelined(
+                conn, self._queue_insert, [()] * batch_size, self._insert_once, self._fetch_id))
+            return
+        for _ in range(batch_size):
+            self.msg_ids.append(self._run_stmt_with_retries(conn, self._insert_once))
+
+    def _insert_once(self, conn: psycopg.Connection):
+        with conn.cursor() as cur:
+            self._queue_insert(cur)
+            # only record the id once the engine has committed
+            return self._fetch_id(cur)
+
+    def _queue_insert(self, cur):
+        # Parameterize payload size so you can keep Phase 1 comparable to baseline
+        insert_sql = """
+            INSERT INTO outbox
+              (aggregatetype, aggregateid, type, payload)
+            VALUES
+              ('svc', 'agg', 'event', repeat('x', %s))
+            RETURNING id;
+        """
+
+        self._exec(cur, insert_sql, (self.payload_size,))
+
+
+
+    # conn is an instance of a psycopg connection object
+    # same ids as the hotspot phase, but each chunk of ids is one transaction
+    # with an array parameter instead of one transaction per id
+    @timed_op
+    def select(self, conn: psycopg.Connection):
+        for chunk in self._chunks():
+            self._run_stmt_with_retries(conn, self._select_chunk, chunk)
+
+
+    def _select_chunk(self, conn: psycopg.Connection, msg_ids):
+        # select the timestamps of the unpublished messages
+        select_sql = """
+            SELECT id, crdb_internal_mvcc_timestamp
+            FROM outbox@{NO_FULL_SCAN}
+            WHERE id = ANY(%s) AND is_published = false;
+        """
+
+        with conn.cursor() as cur:
+            self._exec(cur, select_sql, (msg_ids,))
+            cur.fetchall()
+
+
+
+    # conn is an instance of a psycopg connection object
+    # each chunk of ids is updated in one transaction (see _run_txn_with_retries)
+    @timed_op
+    def update(self, conn: psycopg.Connection):
+        for chunk in self._chunks():
+            self._run_stmt_with_retries(conn, self._update_chunk, chunk)
+
+
+    def _update_chunk(self, conn: psycopg.Connection, msg_ids):
+        # mark the messages as published
+        update_sql = """
+            UPDATE outbox@{NO_FULL_SCAN}
+            SET is_published = true,
+                publish_timestamp = now()
+            WHERE id = ANY(%s);
+        """
+
+        with conn.cursor() as cur:
+            self._exec(cur, update_sql, (msg_ids,))
@@ -1,11 +1,22 @@
 import psycopg
-from psycopg.errors import SerializationFailure
+import os
 import random
+import sys
 import time
-import gzip
 
+# shared workload helpers live in workloads/common (mounted at /common in the worker containers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from dispatch_shards import DISPATCHERS, SHARED, SHARDED, DispatchShards
+from key_distributions import UNIFORM, KeyDistribution, shared_recent_keys
+from latency_histograms import timed_op
+from payload_codecs import decode_payload, get_codec
+from payload_pool import shared_pool
+from workload_args import RetryMethods, common_args
 
-class Transactionsregion:
+READ_MODES = ("strong", "follower", "bounded")
+
+
+class Transactionsregion(RetryMethods):
     """
     Phase 4: Multi-region locality (REGIONAL BY ROW) + region-scoped dispatcher.
 
@@ -17,23 +28,55 @@ class Transactionsregion:
       - Insert (1 txn): insert outbox row -> insert compressed payload row
       - Dispatcher publish (1 txn): claim unpublished rows in *this gateway's region*
         using FOR UPDATE SKIP LOCKED, update publish_timestamp, return (id, publish_timestamp)
+      - Read (read_freq % of cycles): look up the status and payload of recently
+        published messages, strongly consistent or from the nearest replica with
+        follower_read_timestamp() / with_max_staleness()
 
     This keeps leaseholder operations local and reduces cross-region RPCs.
     """
 
-    GZIP_MAGIC = b"GZ1:"
-
     def __init__(self, args: dict):
         self.min_batch_size: int = int(args.get("min_batch_size", 10))
         self.max_batch_size: int = int(args.get("max_batch_size", 100))
         self.delay: int = int(args.get("delay", 100))
         self.txn_pooling: bool = bool(args.get("txn_pooling", False))
+        self.latency, self.arrivals, self.retry = common_args(args, type(self).__name__)  # retry, txn_style, hdr_log and arrival args, see workload_args.py
+        self.pipeline: bool = bool(args.get("pipeline", False))  # overlap per-row txns in a psycopg pipeline
 
         self.payload_size: int = int(args.get("payload_size", 50000))
         self.enable_compression: bool = bool(args.get("enable_compression", True))
+        # none | gzip | zstd-1 | zstd-3 | zstd-9 | zstd-19 | zstd-dict-3 | lz4 (see common/payload_codecs.py)
+        self.codec = get_codec(str(args.get("codec", "gzip" if self.enable_compression else "none")))
         self.dispatch_batch_size: int = int(args.get("dispatch_batch_size", 100))
+        self.dispatcher: str = str(args.get("dispatcher", SHARED))  # shared (one index head) | sharded (per-thread buckets)
+        self.dispatch_buckets: int = int(args.get("dispatch_buckets", 64))  # must match the bucket DEFAULT in the schema
+        self.dispatch_steal: int = int(args.get("dispatch_steal", 2))  # other buckets to steal from when the own one runs short
+        if self.dispatcher not in DISPATCHERS:
+            raise ValueError(f"dispatcher must be one of {DISPATCHERS}, got {self.dispatcher!r}")
+        self.shards = DispatchShards(self.dispatch_buckets, self.dispatch_steal)
+
+        # Read knobs
+        self.read_freq: int = int(args.get("read_freq", 0))  # % of cycles that read back published messages
+        self.read_batch_size: int = int(args.get("read_batch_size", 10))  # messages looked up per read cycle
+        self.read_mode: str = str(args.get("read_mode", "strong"))  # strong | follower | bounded staleness
+        self.read_staleness: float = float(args.get("read_staleness", 10))  # seconds, max staleness of bounded reads
+        if self.read_mode not in READ_MODES:
+            raise ValueError(f"read_mode must be one of {READ_MODES}, got {self.read_mode!r}")
+        # (id, crdb_region) of the rows the dispatchers of this process published, for the reads to pick from
+        self.published = shared_recent_keys(type(self).__name__, 10000)
+        self.read_distribution = KeyDistribution(UNIFORM)
 
         self.verify_decompression_rate: float = float(args.get("verify_decompression_rate", 0.0))
+        self.payload_dist: str = str(args.get("payload_dist", "fixed"))  # fixed | uniform | lognormal
+        self.payload_spread: float = float(args.get("payload_spread", 0.5))
+        self.payload_entropy: float = float(args.get("payload_entropy", 0.0))  # 0 compressible .. 1 random
+        self.payload_pool_size: int = int(args.get("payload_pool_size", 64))
+
+        # encoded once per process and shared read-only by every thread
+        self.payloads = shared_pool(
+            self.codec.name, self._encode_payload,
+            self.payload_size, self.payload_dist, self.payload_spread,
+            self.payload_entropy, self.payload_pool_size, train=self.codec.train)
 
 
 
@@ -56,49 +99,31 @@ class Transactionsregion:
 
 
 
-    def _is_retryable_error(self, err: Exception) -> bool:
-        return isinstance(err, SerializationFailure)
-
-
-
-    def _run_txn_with_retries(self, conn: psycopg.Connection, fn, max_retries: int = 5):
-        attempt = 0
-        while True:
-            try:
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-                conn.autocommit = True
-                return fn(conn)
-            except Exception as e:
-                if not self._is_retryable_error(e) or attempt >= max_retries:
-                    raise
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-                time.sleep((2 ** attempt) * 0.05)
-                attempt += 1
+    def _fetch_id(self, cur):
+        row = cur.fetchone()
+        if not row:
+            raise Exception("Failed to insert payload")
+        return row[0]
 
 
 
     def _encode_payload(self, raw: bytes) -> bytes:
-        if not self.enable_compression:
-            return raw
-        return self.GZIP_MAGIC + gzip.compress(raw)
+        return self.codec.encode(raw)
 
     def _decode_payload(self, stored: bytes) -> bytes:
-        if stored is None:
-            return b""
-        if stored.startswith(self.GZIP_MAGIC):
-            return gzip.decompress(stored[len(self.GZIP_MAGIC):])
-        return stored
+        # the header says which codec wrote it
+        return decode_payload(stored)
 
 
 
     def setup(self, conn: psycopg.Connection, id: int, total_thread_count: int):
         self.id = id
+        if self.arrivals:
+            self.arrivals.join(total_thread_count)
+        if self.dispatcher == SHARDED:
+            # workers in different regions never claim each other's rows, so
+            # buckets are only split between the threads of this worker
+            self.shards.assign(id, total_thread_count)
         if self.txn_pooling:
             try:
                 conn.prepare_threshold = 0
@@ -111,19 +136,27 @@ class Transactionsregion:
 
 
     def loop(self):
-        time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
+        if self.arrivals:
+            self.arrivals.wait()
+        else:
+            time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
+        if random.randint(1, 100) <= self.read_freq:
+            return [self.insert, self.dispatch_publish, self.read]
         return [self.insert, self.dispatch_publish]
 
 
 
+    @timed_op
     def insert(self, conn: psycopg.Connection):
         batch_size = self._random_batch_size()
+        if self.pipeline:
+            self._run_txns_pipelined(
+                conn, self._queue_insert, [()] * batch_size, self._insert_once, self._fetch_id)
+            return
         for _ in range(batch_size):
             self._run_txn_with_retries(conn, self._insert_once)
 
     def _insert_once(self, conn: psycopg.Connection):
-        original_autocommit = conn.autocommit
-
         insert_meta_sql = """
             INSERT INTO outbox
               (aggregatetype, aggregateid, type)
@@ -139,44 +172,68 @@ class Transactionsregion:
               (%s, %s);
         """
 
-        try:
-            conn.autocommit = False
-
-            raw = b"x" * self.payload_size
-            payload = self._encode_payload(raw)
-
-            with conn.cursor() as cur:
-                self._exec(cur, insert_meta_sql, ("svc", "agg", "event"))
-                row = cur.fetchone()
-                if not row:
-                    raise Exception("Failed to insert outbox meta row")
-                msg_id = row[0]
+        raw_len, payload = self.payloads.pick()
 
-                self._exec(cur, insert_payload_sql, (msg_id, payload))
+        with conn.cursor() as cur:
+            self._exec(cur, insert_meta_sql, ("svc", "agg", "event"))
+            row = cur.fetchone()
+            if not row:
+                raise Exception("Failed to insert outbox meta row")
+            msg_id = row[0]
+
+            start = time.perf_counter()
+            self._exec(cur, insert_payload_sql, (msg_id, payload))
+            self.codec.stats.record_write(len(payload), (time.perf_counter() - start) * 1000)
+
+            if self.verify_decompression_rate > 0 and random.random() < self.verify_decompression_rate:
+                self._exec(cur, "SELECT payload FROM outbox_payload WHERE id=%s;", (msg_id,))
+                stored = cur.fetchone()[0]
+                decoded = self._decode_payload(stored)
+                if len(decoded) != raw_len:
+                    raise Exception(f"Decompression validation failed: got {len(decoded)} expected {raw_len}")
+
+
+
+    def _queue_insert(self, cur):
+        # Pipeline mode can't read the new id between statements, so the meta and
+        # payload rows go in as one statement.  Decompression sampling only runs
+        # on rows that fall back to _insert_once.
+        insert_sql = """
+            WITH meta AS (
+              INSERT INTO outbox
+                (aggregatetype, aggregateid, type)
+              VALUES
+                (%s, %s, %s)
+              RETURNING id
+            )
+            INSERT INTO outbox_payload
+              (id, payload)
+            SELECT id, %s FROM meta
+            RETURNING id;
+        """
 
-                if self.verify_decompression_rate > 0 and random.random() < self.verify_decompression_rate:
-                    self._exec(cur, "SELECT payload FROM outbox_payload WHERE id=%s;", (msg_id,))
-                    stored = cur.fetchone()[0]
-                    decoded = self._decode_payload(stored)
-                    if len(decoded) != self.payload_size:
-                        raise Exception(f"Decompression validation failed: got {len(decoded)} expected {self.payload_size}")
+        _, payload = self.payloads.pick()
+        self._exec(cur, insert_sql, ("svc", "agg", "event", payload))
+        # statement latency isn't visible per row inside a pipeline
+        self.codec.stats.record_write(len(payload))
 
-            conn.commit()
 
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.autocommit = original_autocommit
 
+    @timed_op
+    def dispatch_publish(self, conn: psycopg.Connection):
+        dispatch = self._dispatch_publish_sharded if self.dispatcher == SHARDED else self._dispatch_publish_once
+        rows = self._run_txn_with_retries(conn, dispatch)
+        # the region is part of the primary key, the reads need it for a single-range lookup
+        self.published.add((row[0], row[2]) for row in rows)
 
+        if rows:
+            print(f"[dispatcher] published {len(rows)} rows (example id={rows[0][0]})")
+        else:
+            print("[dispatcher] published 0 rows")
 
-    def dispatch_publish(self, conn: psycopg.Connection):
-        self._run_txn_with_retries(conn, self._dispatch_publish_once)
+        return rows
 
     def _dispatch_publish_once(self, conn: psycopg.Connection):
-        original_autocommit = conn.autocommit
-
         # Region-scoped dispatcher:
         # Each worker only processes rows homed in its gateway region.
         dispatch_sql = """
@@ -194,25 +251,91 @@ class Transactionsregion:
                 publish_timestamp = now()
             FROM cte
             WHERE o.id = cte.id
-            RETURNING o.id, o.publish_timestamp;
+            RETURNING o.id, o.publish_timestamp, o.crdb_region;
+        """
+
+        with conn.cursor() as cur:
+            self._exec(cur, dispatch_sql, (self.dispatch_batch_size,))
+            return cur.fetchall()
+
+    def _dispatch_publish_sharded(self, conn: psycopg.Connection):
+        # Region and bucket scoped dispatcher: each worker only processes rows
+        # homed in its gateway region, and each thread claims from its own bucket
+        # first, stealing from other buckets for whatever is left of the batch.
+        dispatch_sql = """
+            WITH cte AS (
+              SELECT id
+              FROM outbox
+              WHERE crdb_region = gateway_region()::crdb_internal_region
+                AND bucket = %s
+                AND is_published = false
+              ORDER BY "timestamp"
+              LIMIT %s
+              FOR UPDATE SKIP LOCKED
+            )
+            UPDATE outbox o
+            SET is_published = true,
+                publish_timestamp = now()
+            FROM cte
+            WHERE o.id = cte.id
+            RETURNING o.id, o.publish_timestamp, o.crdb_region;
+        """
+
+        published = []
+
+        with conn.cursor() as cur:
+            for bucket in self.shards.plan():
+                self._exec(cur, dispatch_sql, (bucket, self.dispatch_batch_size - len(published)))
+                published.extend(cur.fetchall())
+                if len(published) >= self.dispatch_batch_size:
+                    break
+
+        return published
+
+
+
+    def _read_clause(self) -> str:
+        if self.read_mode == "follower":
+            # about 4.8s behind, served by the nearest replica in any region
+            return "AS OF SYSTEM TIME follower_read_timestamp()"
+        if self.read_mode == "bounded":
+            # the freshest timestamp the nearest replica can serve without a
+            # leaseholder round trip, as long as it's within read_staleness
+            return f"AS OF SYSTEM TIME with_max_staleness('{self.read_staleness:g}s')"
+        return ""
+
+    @timed_op
+    def read(self, conn: psycopg.Connection):
+        # Each lookup is a single-statement, read-only implicit txn (required for
+        # bounded staleness), so the reads run outside the retry engine.
+        for msg_id, region in self.published.sample(self.read_batch_size, self.read_distribution):
+            self._read_once(conn, msg_id, region)
+
+    def _read_once(self, conn: psycopg.Connection, msg_id, region: str):
+        # REGIONAL BY ROW indexes are implicitly partitioned by crdb_region, so a
+        # lookup by id alone fans out to every region's partition, which bounded
+        # staleness rejects ("may touch more than one range").  With the region
+        # it's a point lookup on the (crdb_region, id) primary key.
+        clause = self._read_clause()
+        status_sql = f"""
+            SELECT is_published, publish_timestamp
+            FROM outbox {clause}
+            WHERE crdb_region = %s::crdb_internal_region AND id = %s;
         """
 
-        try:
-            conn.autocommit = False
-            with conn.cursor() as cur:
-                self._exec(cur, dispatch_sql, (self.dispatch_batch_size,))
-                rows = cur.fetchall()
-            conn.commit()
-
-            if rows:
-                print(f"[dispatcher] published {len(rows)} rows (example id={rows[0][0]})")
-            else:
-                print("[dispatcher] published 0 rows")
-
-            return rows
-
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.autocommit = original_autocommit
+        # the payload row was inserted in the same txn, so it's homed in the same region
+        payload_sql = f"""
+            SELECT payload
+            FROM outbox_payload {clause}
+            WHERE crdb_region = %s::crdb_internal_region AND id = %s;
+        """
+
+        with conn.cursor() as cur:
+            self._exec(cur, status_sql, (region, msg_id))
+            cur.fetchone()
+            self._exec(cur, payload_sql, (region, msg_id))
+            row = cur.fetchone()
+
+        # a stale read can predate the row, otherwise decode it like a consumer would
+        if row and row[0] is not None:
+            self._decode_payload(row[0])
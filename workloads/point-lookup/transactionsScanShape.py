@@ -1,10 +1,17 @@
 import psycopg
-from psycopg.errors import SerializationFailure
+import os
 import random
+import sys
 import time
 
+# shared workload helpers live in workloads/common (mounted at /common in the worker containers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from key_distributions import key_distribution, shared_recent_keys
+from latency_histograms import timed_op
+from workload_args import RetryMethods, common_args
 
-class Transactionsscanshape:
+
+class Transactionsscanshape(RetryMethods):
     """
     Phase 1: Remove the scan-shaped read entirely by publishing with a guarded UPDATE...RETURNING.
     This eliminates the SELECT that (per statement bundle) was planned as:
@@ -21,7 +28,16 @@ class Transactionsscanshape:
         self.max_batch_size: int = int(args.get("max_batch_size", 100))
         self.delay: int = int(args.get("delay", 100))
         self.txn_pooling: bool = bool(args.get("txn_pooling", False))
+        self.latency, self.arrivals, self.retry = common_args(args, type(self).__name__)  # retry, txn_style, hdr_log and arrival args, see workload_args.py
+        self.pipeline: bool = bool(args.get("pipeline", False))  # overlap per-row txns in a psycopg pipeline
         self.payload_size: int = int(args.get("payload_size", 50000))  # chars
+        self.key_dist: str = str(args.get("key_dist", "none"))  # none (this cycle's inserts) | uniform | zipfian | hotset | latest recent inserts
+        self.zipf_theta: float = float(args.get("zipf_theta", 0.99))  # zipfian/latest skew, 0 (flat) .. 1 (a few hot ids)
+        self.hot_fraction: float = float(args.get("hot_fraction", 0.2))  # share of recent ids in the hot set
+        self.hot_access: float = float(args.get("hot_access", 0.8))  # share of picks that go to the hot set
+        self.recent_keys: int = int(args.get("recent_keys", 100000))  # inserted ids per worker process to pick from
+        self.key_distribution = key_distribution(self.key_dist, self.zipf_theta, self.hot_fraction, self.hot_access)
+        self.recent = shared_recent_keys(type(self).__name__, self.recent_keys)
 
         # Optional knobs
         self.counter: int = 0
@@ -51,37 +67,18 @@ class Transactionsscanshape:
 
 
 
-    def _is_retryable_error(self, err: Exception) -> bool:
-        return isinstance(err, SerializationFailure)
-
-
-
-    def _run_txn_with_retries(self, conn: psycopg.Connection, fn, max_retries: int = 5):
-        attempt = 0
-        while True:
-            try:
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-                conn.autocommit = True
-                return fn(conn)
-            except Exception as e:
-                if not self._is_retryable_error(e) or attempt >= max_retries:
-                    raise
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-                sleep_s = (2 ** attempt) * 0.05
-                print(f"[retry] {fn.__name__} attempt {attempt+1} failed with {e}, retrying in {sleep_s:.3f}s")
-                time.sleep(sleep_s)
-                attempt += 1
+    def _fetch_id(self, cur):
+        row = cur.fetchone()
+        if not row:
+            raise Exception("Failed to insert payload")
+        return row[0]
 
 
 
     def setup(self, conn: psycopg.Connection, id: int, total_thread_count: int):
         self.id = id
+        if self.arrivals:
+            self.arrivals.join(total_thread_count)
 
         if self.txn_pooling:
             try:
@@ -96,21 +93,50 @@ class Transactionsscanshape:
 
 
     def loop(self):
-        time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
+        if self.arrivals:
+            self.arrivals.wait()
+        else:
+            time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
         self.msg_ids = []
+        self.targets = None
         # Phase 1: no SELECT step
         return [self.insert, self.publish]
 
 
 
+    def _targets(self):
+        """
+        The ids this cycle reads and updates: the ones it just inserted, or with a
+        key_dist as many ids drawn from the process's recent inserts, so that hot
+        ids are shared by every connection.
+        """
+        if self.targets is None:
+            if self.key_distribution is None:
+                self.targets = self.msg_ids
+            else:
+                self.recent.add(self.msg_ids)
+                self.targets = self.recent.sample(len(self.msg_ids), self.key_distribution)
+        return self.targets
+
+
+
+    @timed_op
     def insert(self, conn: psycopg.Connection):
         batch_size = self._random_batch_size()
+        if self.pipeline:
+            self.msg_ids.extend(self._run_txns_pipelined(
+                conn, self._queue_insert, [()] * batch_size, self._insert_once, self._fetch_id))
+            return
         for _ in range(batch_size):
-            self._run_txn_with_retries(conn, self._insert_once)
+            self.msg_ids.append(self._run_stmt_with_retries(conn, self._insert_once))
 
     def _insert_once(self, conn: psycopg.Connection):
-        original_autocommit = conn.autocommit
+        with conn.cursor() as cur:
+            self._queue_insert(cur)
+            # only record the id once the engine has committed
+            return self._fetch_id(cur)
 
+    def _queue_insert(self, cur):
         # Parameterize payload size so you can keep Phase 1 comparable to baseline
         insert_sql = """
             INSERT INTO outbox
@@ -120,32 +146,28 @@ class Transactionsscanshape:
             RETURNING id;
         """
 
-        try:
-            conn.autocommit = False
-            with conn.cursor() as cur:
-                self._exec(cur, insert_sql, (self.payload_size,))
-                row = cur.fetchone()
-                if not row:
-                    raise Exception("Failed to insert payload")
-                self.msg_ids.append(row[0])
-            conn.commit()
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.autocommit = original_autocommit
+        self._exec(cur, insert_sql, (self.payload_size,))
 
 
 
+    @timed_op
     def publish(self, conn: psycopg.Connection):
         # Publish each message individually, like baseline (still high concurrency),
         # but without a preceding SELECT that can scan/block.
-        for msg_id in self.msg_ids:
-            self._run_txn_with_retries(conn, lambda c: self._publish_once(c, msg_id))
+        if self.pipeline:
+            self._run_txns_pipelined(
+                conn, self._queue_publish, [(msg_id,) for msg_id in self._targets()], self._publish_once,
+                self._fetch_publish_timestamp)
+            return
+        for msg_id in self._targets():
+            self._run_stmt_with_retries(conn, self._publish_once, msg_id)
 
     def _publish_once(self, conn: psycopg.Connection, msg_id):
-        original_autocommit = conn.autocommit
+        with conn.cursor() as cur:
+            self._queue_publish(cur, msg_id)
+            return self._fetch_publish_timestamp(cur)
 
+    def _queue_publish(self, cur, msg_id):
         publish_sql = """
             UPDATE outbox
             SET is_published = true,
@@ -155,18 +177,11 @@ class Transactionsscanshape:
             RETURNING publish_timestamp;
         """
 
-        try:
-            conn.autocommit = False
-            with conn.cursor() as cur:
-                self._exec(cur, publish_sql, (msg_id,))
-                row = cur.fetchone()
-                # If row is None, it means the row was already published (or missing).
-                # In Phase 1 repro we treat it as a "lost race", not an error.
-                # But you can optionally count it.
-                _ = row[0] if row else None
-            conn.commit()
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.autocommit = original_autocommit
+        self._exec(cur, publish_sql, (msg_id,))
+
+    def _fetch_publish_timestamp(self, cur):
+        row = cur.fetchone()
+        # If row is None, it means the row was already published (or missing).
+        # In Phase 1 repro we treat it as a "lost race", not an error.
+        # But you can optionally count it.
+        return row[0] if row else None
@@ -1,11 +1,19 @@
 import psycopg
-from psycopg.errors import SerializationFailure
+import os
 import random
+import sys
 import time
-import gzip
 
+# shared workload helpers live in workloads/common (mounted at /common in the worker containers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from dispatch_shards import DISPATCHERS, SHARED, SHARDED, DispatchShards
+from latency_histograms import timed_op
+from payload_codecs import decode_payload, get_codec
+from payload_pool import shared_pool
+from workload_args import RetryMethods, common_args
 
-class Transactionsstorage:
+
+class Transactionsstorage(RetryMethods):
     """
     Phase 3 (revised): Keep SKIP LOCKED by splitting payload into a separate table.
 
@@ -18,21 +26,41 @@ class Transactionsstorage:
       - Dispatcher publish: claim unpublished rows with SKIP LOCKED and update publish_timestamp
     """
 
-    GZIP_MAGIC = b"GZ1:"  # self-describing header
-
     def __init__(self, args: dict):
         self.min_batch_size: int = int(args.get("min_batch_size", 10))
         self.max_batch_size: int = int(args.get("max_batch_size", 100))
         self.delay: int = int(args.get("delay", 100))
         self.txn_pooling: bool = bool(args.get("txn_pooling", False))
+        self.latency, self.arrivals, self.retry = common_args(args, type(self).__name__)  # retry, txn_style, hdr_log and arrival args, see workload_args.py
+        self.pipeline: bool = bool(args.get("pipeline", False))  # overlap per-row txns in a psycopg pipeline
 
         # Payload knobs
         self.payload_size: int = int(args.get("payload_size", 50000))  # bytes pre-compress
         self.enable_compression: bool = bool(args.get("enable_compression", True))
+        # none | gzip | zstd-1 | zstd-3 | zstd-9 | zstd-19 | zstd-dict-3 | lz4 (see common/payload_codecs.py)
+        self.codec = get_codec(str(args.get("codec", "gzip" if self.enable_compression else "none")))
         self.verify_decompression_rate: float = float(args.get("verify_decompression_rate", 0.0))  # 0..1
+        self.payload_dist: str = str(args.get("payload_dist", "fixed"))  # fixed | uniform | lognormal
+        self.payload_spread: float = float(args.get("payload_spread", 0.5))
+        self.payload_entropy: float = float(args.get("payload_entropy", 0.0))  # 0 compressible .. 1 random
+        self.payload_pool_size: int = int(args.get("payload_pool_size", 64))
 
         # Dispatcher knobs
         self.dispatch_batch_size: int = int(args.get("dispatch_batch_size", 100))
+        self.dispatcher: str = str(args.get("dispatcher", SHARED))  # shared (one index head) | sharded (per-thread buckets)
+        self.dispatch_buckets: int = int(args.get("dispatch_buckets", 64))  # must match the bucket DEFAULT in the schema
+        self.dispatch_steal: int = int(args.get("dispatch_steal", 2))  # other buckets to steal from when the own one runs short
+        self.worker: int = int(args.get("worker", 0))  # this worker's index, so threads on different workers own different buckets
+        self.workers: int = int(args.get("workers", 1))
+        if self.dispatcher not in DISPATCHERS:
+            raise ValueError(f"dispatcher must be one of {DISPATCHERS}, got {self.dispatcher!r}")
+        self.shards = DispatchShards(self.dispatch_buckets, self.dispatch_steal)
+
+        # encoded once per process and shared read-only by every thread
+        self.payloads = shared_pool(
+            self.codec.name, self._encode_payload,
+            self.payload_size, self.payload_dist, self.payload_spread,
+            self.payload_entropy, self.payload_pool_size, train=self.codec.train)
 
 
 
@@ -55,50 +83,30 @@ class Transactionsstorage:
 
 
 
-    def _is_retryable_error(self, err: Exception) -> bool:
-        return isinstance(err, SerializationFailure)
-
-
-
-    def _run_txn_with_retries(self, conn: psycopg.Connection, fn, max_retries: int = 5):
-        attempt = 0
-        while True:
-            try:
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-                conn.autocommit = True
-                return fn(conn)
-            except Exception as e:
-                if not self._is_retryable_error(e) or attempt >= max_retries:
-                    raise
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-                time.sleep((2 ** attempt) * 0.05)
-                attempt += 1
+    def _fetch_id(self, cur):
+        row = cur.fetchone()
+        if not row:
+            raise Exception("Failed to insert payload")
+        return row[0]
 
 
 
     # Compression helpers
     def _encode_payload(self, raw: bytes) -> bytes:
-        if not self.enable_compression:
-            return raw
-        return self.GZIP_MAGIC + gzip.compress(raw)
+        return self.codec.encode(raw)
 
     def _decode_payload(self, stored: bytes) -> bytes:
-        if stored is None:
-            return b""
-        if stored.startswith(self.GZIP_MAGIC):
-            return gzip.decompress(stored[len(self.GZIP_MAGIC):])
-        return stored
+        # the header says which codec wrote it
+        return decode_payload(stored)
 
 
 
     def setup(self, conn: psycopg.Connection, id: int, total_thread_count: int):
         self.id = id
+        if self.arrivals:
+            self.arrivals.join(total_thread_count)
+        if self.dispatcher == SHARDED:
+            self.shards.assign(id, total_thread_count, self.worker, self.workers)
         if self.txn_pooling:
             try:
                 conn.prepare_threshold = 0
@@ -111,19 +119,25 @@ class Transactionsstorage:
 
 
     def loop(self):
-        time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
+        if self.arrivals:
+            self.arrivals.wait()
+        else:
+            time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
         return [self.insert, self.dispatch_publish]
 
 
 
+    @timed_op
     def insert(self, conn: psycopg.Connection):
         batch_size = self._random_batch_size()
+        if self.pipeline:
+            self._run_txns_pipelined(
+                conn, self._queue_insert, [()] * batch_size, self._insert_once, self._fetch_id)
+            return
         for _ in range(batch_size):
             self._run_txn_with_retries(conn, self._insert_once)
 
     def _insert_once(self, conn: psycopg.Connection):
-        original_autocommit = conn.autocommit
-
         insert_meta_sql = """
             INSERT INTO outbox
               (aggregatetype, aggregateid, type)
@@ -139,47 +153,69 @@ class Transactionsstorage:
               (%s, %s);
         """
 
-        try:
-            conn.autocommit = False
-
-            raw = b"x" * self.payload_size
-            payload = self._encode_payload(raw)
-
-            with conn.cursor() as cur:
-                # 1) insert hot metadata row
-                self._exec(cur, insert_meta_sql, ("svc", "agg", "event"))
-                row = cur.fetchone()
-                if not row:
-                    raise Exception("Failed to insert outbox meta row")
-                msg_id = row[0]
+        raw_len, payload = self.payloads.pick()
 
-                # 2) insert cold payload row
-                self._exec(cur, insert_payload_sql, (msg_id, payload))
+        with conn.cursor() as cur:
+            # 1) insert hot metadata row
+            self._exec(cur, insert_meta_sql, ("svc", "agg", "event"))
+            row = cur.fetchone()
+            if not row:
+                raise Exception("Failed to insert outbox meta row")
+            msg_id = row[0]
+
+            # 2) insert cold payload row
+            start = time.perf_counter()
+            self._exec(cur, insert_payload_sql, (msg_id, payload))
+            self.codec.stats.record_write(len(payload), (time.perf_counter() - start) * 1000)
+
+            # Optional sample verification
+            if self.verify_decompression_rate > 0 and random.random() < self.verify_decompression_rate:
+                self._exec(cur, "SELECT payload FROM outbox_payload WHERE id=%s;", (msg_id,))
+                stored = cur.fetchone()[0]
+                decoded = self._decode_payload(stored)
+                if len(decoded) != raw_len:
+                    raise Exception(f"Decompression validation failed: got {len(decoded)} expected {raw_len}")
+
+
+
+    def _queue_insert(self, cur):
+        # Pipeline mode can't read the new id between statements, so the meta and
+        # payload rows go in as one statement.  Decompression sampling only runs
+        # on rows that fall back to _insert_once.
+        insert_sql = """
+            WITH meta AS (
+              INSERT INTO outbox
+                (aggregatetype, aggregateid, type)
+              VALUES
+                (%s, %s, %s)
+              RETURNING id
+            )
+            INSERT INTO outbox_payload
+              (id, payload)
+            SELECT id, %s FROM meta
+            RETURNING id;
+        """
 
-                # Optional sample verification
-                if self.verify_decompression_rate > 0 and random.random() < self.verify_decompression_rate:
-                    self._exec(cur, "SELECT payload FROM outbox_payload WHERE id=%s;", (msg_id,))
-                    stored = cur.fetchone()[0]
-                    decoded = self._decode_payload(stored)
-                    if len(decoded) != self.payload_size:
-                        raise Exception(f"Decompression validation failed: got {len(decoded)} expected {self.payload_size}")
+        _, payload = self.payloads.pick()
+        self._exec(cur, insert_sql, ("svc", "agg", "event", payload))
+        # statement latency isn't visible per row inside a pipeline
+        self.codec.stats.record_write(len(payload))
 
-            conn.commit()
 
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.autocommit = original_autocommit
 
+    @timed_op
+    def dispatch_publish(self, conn: psycopg.Connection):
+        dispatch = self._dispatch_publish_sharded if self.dispatcher == SHARDED else self._dispatch_publish_once
+        rows = self._run_txn_with_retries(conn, dispatch)
 
+        if rows:
+            print(f"[dispatcher] published {len(rows)} rows (example id={rows[0][0]})")
+        else:
+            print("[dispatcher] published 0 rows")
 
-    def dispatch_publish(self, conn: psycopg.Connection):
-        self._run_txn_with_retries(conn, self._dispatch_publish_once)
+        return rows
 
     def _dispatch_publish_once(self, conn: psycopg.Connection):
-        original_autocommit = conn.autocommit
-
         dispatch_sql = """
             WITH cte AS (
               SELECT id
@@ -197,22 +233,39 @@ class Transactionsstorage:
             RETURNING o.id, o.publish_timestamp;
         """
 
-        try:
-            conn.autocommit = False
-            with conn.cursor() as cur:
-                self._exec(cur, dispatch_sql, (self.dispatch_batch_size,))
-                rows = cur.fetchall()
-            conn.commit()
-
-            if rows:
-                print(f"[dispatcher] published {len(rows)} rows (example id={rows[0][0]})")
-            else:
-                print("[dispatcher] published 0 rows")
-
-            return rows
-
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.autocommit = original_autocommit
+        with conn.cursor() as cur:
+            self._exec(cur, dispatch_sql, (self.dispatch_batch_size,))
+            return cur.fetchall()
+
+    def _dispatch_publish_sharded(self, conn: psycopg.Connection):
+        # Bucket-scoped dispatcher: claim from this thread's own bucket first and
+        # only steal from other buckets for whatever is left of the batch, so
+        # threads don't race each other for the same oldest rows.
+        dispatch_sql = """
+            WITH cte AS (
+              SELECT id
+              FROM outbox
+              WHERE bucket = %s
+                AND is_published = false
+              ORDER BY "timestamp"
+              LIMIT %s
+              FOR UPDATE SKIP LOCKED
+            )
+            UPDATE outbox o
+            SET is_published = true,
+                publish_timestamp = now()
+            FROM cte
+            WHERE o.id = cte.id
+            RETURNING o.id, o.publish_timestamp;
+        """
+
+        published = []
+
+        with conn.cursor() as cur:
+            for bucket in self.shards.plan():
+                self._exec(cur, dispatch_sql, (bucket, self.dispatch_batch_size - len(published)))
+                published.extend(cur.fetchall())
+                if len(published) >= self.dispatch_batch_size:
+                    break
+
+        return published
@@ -0,0 +1,18 @@
+-- Opt-in for CLAIMING=sharded (see ../common/dispatch_shards.py), applied by run_workloads.sh.
+-- Kept out of initial-schema.sql so the default shared claiming doesn't maintain an
+-- extra status index on every status UPDATE.
+
+-- ---------------------------------------------------------
+-- Claim partition per status table: crc32ieee(event_id) % 64
+-- ---------------------------------------------------------
+ALTER TABLE events_jsonb_status
+  ADD COLUMN IF NOT EXISTS bucket INT2 NOT NULL AS (mod(crc32ieee(event_id::STRING), 64)::INT2) STORED;
+CREATE INDEX IF NOT EXISTS idx_events_jsonb_status_bucket_updated ON events_jsonb_status (bucket, status, updated_at);
+
+ALTER TABLE events_jsonb_manual_status
+  ADD COLUMN IF NOT EXISTS bucket INT2 NOT NULL AS (mod(crc32ieee(event_id::STRING), 64)::INT2) STORED;
+CREATE INDEX IF NOT EXISTS idx_events_jsonb_manual_status_bucket_updated ON events_jsonb_manual_status (bucket, status, updated_at);
+
+ALTER TABLE events_text_status
+  ADD COLUMN IF NOT EXISTS bucket INT2 NOT NULL AS (mod(crc32ieee(event_id::STRING), 64)::INT2) STORED;
+CREATE INDEX IF NOT EXISTS idx_events_text_status_bucket_updated ON events_text_status (bucket, status, updated_at);
@@ -1,9 +1,19 @@
 import psycopg
-from psycopg.errors import SerializationFailure, OperationalError
+import os
 import random
+import sys
 import time
 
-class Transactionsjsonb:
+# shared workload helpers live in workloads/common (mounted at /common in the worker containers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from dispatch_shards import DISPATCHERS, SHARED, SHARDED, DispatchShards
+from event_corpus import copy_rows, jsonb_text, shared_corpus
+from latency_histograms import timed_op
+from workload_args import RetryMethods, common_args
+
+ARCHIVE_MODES = ("statements", "chained")
+
+class Transactionsjsonb(RetryMethods):
 
     def __init__(self, args: dict):
         # args is a dict of string passed with the --args flag
@@ -12,6 +22,23 @@ class Transactionsjsonb:
         self.max_batch_size: int = int(args.get("max_batch_size", 100))
         self.delay: int = int(args.get("delay", 100))
         self.txn_pooling: bool = bool(args.get("txn_pooling", False))
+        self.latency, self.arrivals, self.retry = common_args(args, type(self).__name__)  # retry, txn_style, hdr_log and arrival args, see workload_args.py
+        self.claiming: str = str(args.get("claiming", SHARED))  # shared (one status index head) | sharded (per-thread event_id buckets)
+        self.claim_buckets: int = int(args.get("claim_buckets", 64))  # must match the bucket expression in the schema
+        self.claim_steal: int = int(args.get("claim_steal", 2))  # other buckets to claim from when the own one runs short
+        self.worker: int = int(args.get("worker", 0))  # this worker's index, so threads on different workers own different buckets
+        self.workers: int = int(args.get("workers", 1))
+        if self.claiming not in DISPATCHERS:
+            raise ValueError(f"claiming must be one of {DISPATCHERS}, got {self.claiming!r}")
+        self.shards = DispatchShards(self.claim_buckets, self.claim_steal)
+        self.archive_mode: str = str(args.get("archive_mode", "statements"))  # statements (claim, copy, delete, delete) | chained (one DML CTE statement)
+        if self.archive_mode not in ARCHIVE_MODES:
+            raise ValueError(f"archive_mode must be one of {ARCHIVE_MODES}, got {self.archive_mode!r}")
+        self.ingest: str = str(args.get("ingest", "sql"))  # sql (server-generated) | copy (client corpus)
+        self.copy_format: str = str(args.get("copy_format", "binary"))  # binary | text
+        self.corpus_size: int = int(args.get("corpus_size", 10000))
+        if self.ingest == "copy":
+            self.corpus = shared_corpus(self.corpus_size)
 
         # you can arbitrarely add any variables you want
         self.counter: int = 0
@@ -23,6 +50,32 @@ class Transactionsjsonb:
         if self.max_batch_size <= self.min_batch_size:
             return self.min_batch_size
         return random.randint(self.min_batch_size, self.max_batch_size)
+
+
+
+    def _claim_sharded(self, cur, statuses: str, batch_size: int):
+        """
+        Bucket-scoped claim (see ../common/dispatch_shards.py): take rows from this
+        thread's own event_id bucket first and only steal from other buckets for
+        whatever is left of the batch, so threads don't all lock-skip over the
+        same oldest rows at the head of the status index.
+        """
+        claim_sql = f"""
+            SELECT event_id
+            FROM events_jsonb_status
+            WHERE bucket = %s
+              AND status IN {statuses}
+            ORDER BY updated_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """
+        candidate_ids = []
+        for bucket in self.shards.plan():
+            self._exec(cur, claim_sql, (bucket, batch_size - len(candidate_ids)))
+            candidate_ids.extend(r[0] for r in cur.fetchall())
+            if len(candidate_ids) >= batch_size:
+                break
+        return candidate_ids
     
 
 
@@ -45,59 +98,15 @@ class Transactionsjsonb:
       
 
 
-    def _is_retryable_error(self, err: Exception) -> bool:
-      # Cockroach retryable transaction errors are a subclass of SerializationFailure
-      if isinstance(err, SerializationFailure):
-          return True
-      else:
-          return False
-
-
-
-    def _run_txn_with_retries(self, conn: psycopg.Connection, fn, max_retries: int = 5):
-        """
-        Run a transactional function `fn(conn)` with Cockroach-style retries.
-        The function `fn` should:
-          - set conn.autocommit = False
-          - do its work
-          - COMMIT on success
-        Any retryable error will cause a retry of `fn` up to max_retries.
-        """
-        attempt = 0
-        while True:
-            try:
-                # Make sure we're not starting in an aborted txn
-                try:
-                    conn.rollback()
-                except Exception:
-                    # If there's nothing to roll back or it fails, ignore
-                    pass
-                conn.autocommit = True  # reset to default before retry
-
-                return fn(conn)
-            except Exception as e:
-                if not self._is_retryable_error(e) or attempt >= max_retries:
-                    # Non-retryable or max attempts exceeded – re-raise
-                    raise
-
-                # Best effort: ensure we clean up before retry
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-
-                sleep_ms = (2 ** attempt) * 0.05  # 50ms, 100ms, 200ms, ...
-                print(f"[retry] {fn.__name__} attempt {attempt+1} failed with {e}, retrying in {sleep_ms:.3f}s")
-                time.sleep(sleep_ms)
-                attempt += 1
-
-
-
     # the setup() function is executed only once
     # when a new executing thread is started.
     # Also, the function is a vector to receive the excuting threads's unique id and the total thread count
     def setup(self, conn: psycopg.Connection, id: int, total_thread_count: int):
         self.id = id
+        if self.arrivals:
+            self.arrivals.join(total_thread_count)
+        if self.claiming == SHARDED:
+            self.shards.assign(id, total_thread_count, self.worker, self.workers)
 
         if self.txn_pooling:
             # 👇 Disable server-side prepared statements for PgBouncer transaction pooling
@@ -119,20 +128,44 @@ class Transactionsjsonb:
     # Once every func has been executed, run() is re-evaluated.
     # This process continues until dbworkload exits.
     def loop(self):
-        # Stagger cycles slightly to avoid phase alignment
-        time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
+        if self.arrivals:
+            self.arrivals.wait()
+        else:
+            # Stagger cycles slightly to avoid phase alignment
+            time.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
         return [self.add, self.process, self.archive]
 
 
 
     # conn is an instance of a psycopg connection object
-    # setting autocommit=False to simulate explicit commit
+    # runs as one explicit transaction (see _run_txn_with_retries)
+    @timed_op
     def add(self, conn: psycopg.Connection):
-        self._run_txn_with_retries(conn, self._add_once)
+        if self.ingest == "copy":
+            self._run_txn_with_retries(conn, self._copy_once)
+        else:
+            self._run_txn_with_retries(conn, self._add_once)
 
-    def _add_once(self, conn: psycopg.Connection):
-        original_autocommit = conn.autocommit
+    def _copy_once(self, conn: psycopg.Connection):
+        # Same events as _add_once, but generated client-side and loaded with COPY
+        events = self.corpus.sample(self._random_batch_size())
+        binary = self.copy_format == "binary"
+
+        with conn.cursor() as cur:
+            # Statement 1: copy the events, ids are generated by the client
+            copy_rows(cur, "events_jsonb", ["id", "payload"],
+                      ((e.id, jsonb_text(e.payload)) for e in events),
+                      ["uuid", "jsonb"] if binary else None)
+
+            # simulate a tiny app think-time
+            time.sleep(random.uniform(0.01, 0.05))
 
+            # Statement 2: copy the corresponding status rows
+            copy_rows(cur, "events_jsonb_status", ["event_id", "status"],
+                      ((e.id, "PENDING") for e in events),
+                      ["uuid", "text"] if binary else None)
+
+    def _add_once(self, conn: psycopg.Connection):
         # Batched insert: create N events in one statement and return their ids
         insert_batch_sql = """
             WITH new_events AS (
@@ -242,48 +275,38 @@ class Transactionsjsonb:
             SELECT unnest(%s::uuid[]), 'PENDING';
         """
 
-        try:
-            conn.autocommit = False
-            batch_size = self._random_batch_size()
-
-            with conn.cursor() as cur:
-                # Statement 1: batch insert events, get ids
-                self._exec(cur, insert_batch_sql, (batch_size,))
-                rows = cur.fetchall()
-                event_ids = [r[0] for r in rows]
+        batch_size = self._random_batch_size()
 
-                if not event_ids:
-                    conn.commit()
-                    return
+        with conn.cursor() as cur:
+            # Statement 1: batch insert events, get ids
+            self._exec(cur, insert_batch_sql, (batch_size,))
+            rows = cur.fetchall()
+            event_ids = [r[0] for r in rows]
 
-                # simulate a tiny app think-time
-                time.sleep(random.uniform(0.01, 0.05))
+            if not event_ids:
+                return
 
-                # Statement 2: insert corresponding status rows in bulk
-                self._exec(cur, insert_status_sql, (event_ids,))
+            # simulate a tiny app think-time
+            time.sleep(random.uniform(0.01, 0.05))
 
-            conn.commit()
-        except Exception as e:
-            print(f"Error occurred in add: {e}")
-            conn.rollback()
-            raise
-        finally:
-            conn.autocommit = original_autocommit
+            # Statement 2: insert corresponding status rows in bulk
+            self._exec(cur, insert_status_sql, (event_ids,))
 
 
 
     # conn is an instance of a psycopg connection object
-    # setting autocommit=False to simulate explicit commit
+    # runs as one explicit transaction (see _run_txn_with_retries)
+    @timed_op
     def process(self, conn: psycopg.Connection):
         self._run_txn_with_retries(conn, self._process_once)
 
     def _process_once(self, conn: psycopg.Connection):
-        original_autocommit = conn.autocommit
-        try:
-            conn.autocommit = False
-            with conn.cursor() as cur:
-                # 1) Pick candidates (FOR UPDATE) – PENDING or PROCESSING
-                batch_size = self._random_batch_size()
+        with conn.cursor() as cur:
+            # 1) Pick candidates (FOR UPDATE) – PENDING or PROCESSING
+            batch_size = self._random_batch_size()
+            if self.claiming == SHARDED:
+                candidate_ids = self._claim_sharded(cur, "('PENDING','PROCESSING')", batch_size)
+            else:
                 select_sql = """
                     SELECT event_id
                     FROM events_jsonb_status
@@ -296,70 +319,63 @@ class Transactionsjsonb:
                 rows = cur.fetchall()
                 candidate_ids = [r[0] for r in rows]
 
-                if not candidate_ids:
-                    # Nothing to do for this txn
-                    conn.commit()
-                    return
-
-                # 2) Update statuses for those candidates
-                status_sql = """
-                    UPDATE events_jsonb_status AS s
-                    SET status = CASE
-                                   WHEN random() < 0.6 THEN 'PROCESSING'
-                                   WHEN random() < 0.9 THEN 'COMPLETE'
-                                   ELSE 'FAILED'
-                                 END,
-                        updated_at = now()
-                    WHERE s.event_id = ANY(%s)
-                """
-                self._exec(cur, status_sql, (candidate_ids,))
-
-                # Simulate some app logic delay
-                time.sleep(random.uniform(0.01, 0.05))
-
-                # 3) Update event payloads for those same candidates
-                events_sql = """
-                    UPDATE events_jsonb AS e
-                    SET payload = jsonb_set(
-                                    jsonb_set(
-                                      payload,
-                                      '{metrics,flags,fleeted}',
-                                      to_jsonb((random() < 0.5))
-                                    ),
-                                    '{state}',
-                                    to_jsonb(
-                                      (ARRAY['NEW','QUEUED','IN_PROGRESS','APPLIED','CANCELLED'])[
-                                        (1 + floor(random()*5))::INT
-                                      ]
-                                    )
-                                  )
-                    WHERE e.id = ANY(%s)
-                """
-                self._exec(cur, events_sql, (candidate_ids,))
-
-            conn.commit()
-        except Exception as e:
-            print(f"Error occurred in process: {e}")
-            conn.rollback()
-            raise
-        finally:
-            conn.autocommit = original_autocommit
+            if not candidate_ids:
+                # Nothing to do for this txn
+                return
+
+            # 2) Update statuses for those candidates
+            status_sql = """
+                UPDATE events_jsonb_status AS s
+                SET status = CASE
+                               WHEN random() < 0.6 THEN 'PROCESSING'
+                               WHEN random() < 0.9 THEN 'COMPLETE'
+                               ELSE 'FAILED'
+                             END,
+                    updated_at = now()
+                WHERE s.event_id = ANY(%s)
+            """
+            self._exec(cur, status_sql, (candidate_ids,))
+
+            # Simulate some app logic delay
+            time.sleep(random.uniform(0.01, 0.05))
+
+            # 3) Update event payloads for those same candidates
+            events_sql = """
+                UPDATE events_jsonb AS e
+                SET payload = jsonb_set(
+                                jsonb_set(
+                                  payload,
+                                  '{metrics,flags,fleeted}',
+                                  to_jsonb((random() < 0.5))
+                                ),
+                                '{state}',
+                                to_jsonb(
+                                  (ARRAY['NEW','QUEUED','IN_PROGRESS','APPLIED','CANCELLED'])[
+                                    (1 + floor(random()*5))::INT
+                                  ]
+                                )
+                              )
+                WHERE e.id = ANY(%s)
+            """
+            self._exec(cur, events_sql, (candidate_ids,))
 
 
 
     # conn is an instance of a psycopg connection object
-    # setting autocommit=False to simulate explicit commit
+    # runs as one explicit transaction (see _run_txn_with_retries)
+    @timed_op
     def archive(self, conn: psycopg.Connection):
-        self._run_txn_with_retries(conn, self._archive_once)
+        archive = self._archive_chained if self.archive_mode == "chained" else self._archive_once
+        self._run_txn_with_retries(conn, archive)
 
     def _archive_once(self, conn: psycopg.Connection):
-        original_autocommit = conn.autocommit
-        try:
-            conn.autocommit = False
-            with conn.cursor() as cur:
-                batch_size = self._random_batch_size()
+        with conn.cursor() as cur:
+            batch_size = self._random_batch_size()
 
-                # 1) Pick COMPLETE candidates
+            # 1) Pick COMPLETE candidates
+            if self.claiming == SHARDED:
+                candidate_ids = self._claim_sharded(cur, "('COMPLETE')", batch_size)
+            else:
                 select_sql = """
                     SELECT event_id
                     FROM events_jsonb_status
@@ -372,40 +388,77 @@ class Transactionsjsonb:
                 rows = cur.fetchall()
                 candidate_ids = [r[0] for r in rows]
 
+            if not candidate_ids:
+                return
+
+            # 2) Insert into archive
+            insert_archive_sql = """
+                INSERT INTO events_jsonb_archive (id, payload, event_type, authority_id, created_at, train_id)
+                SELECT id, payload, event_type, authority_id, created_at, train_id
+                FROM events_jsonb
+                WHERE id = ANY(%s)
+            """
+            self._exec(cur, insert_archive_sql, (candidate_ids,))
+
+            # Simulate some app logic delay
+            time.sleep(random.uniform(0.01, 0.05))
+
+            # 3) Delete from main table
+            delete_events_sql = """
+                DELETE FROM events_jsonb
+                WHERE id = ANY(%s)
+            """
+            self._exec(cur, delete_events_sql, (candidate_ids,))
+
+            # 4) Delete from status table
+            delete_status_sql = """
+                DELETE FROM events_jsonb_status
+                WHERE event_id = ANY(%s)
+            """
+            self._exec(cur, delete_status_sql, (candidate_ids,))
+
+    def _archive_chained(self, conn: psycopg.Connection):
+        # Claim, copy and delete in one statement with chained DML CTEs: one round
+        # trip instead of four and no app delay while the claimed rows are locked.
+        # Deleting the event would cascade to its status row anyway, the explicit
+        # status DELETE just lets the chain start from the claimed rows.
+        with conn.cursor() as cur:
+            batch_size = self._random_batch_size()
+
+            if self.claiming == SHARDED:
+                # bucket-scoped claims still take a SELECT per bucket, the move is one statement
+                candidate_ids = self._claim_sharded(cur, "('COMPLETE')", batch_size)
                 if not candidate_ids:
-                    conn.commit()
                     return
-
-                # 2) Insert into archive
-                insert_archive_sql = """
-                    INSERT INTO events_jsonb_archive (id, payload, event_type, authority_id, created_at, train_id)
-                    SELECT id, payload, event_type, authority_id, created_at, train_id
-                    FROM events_jsonb
-                    WHERE id = ANY(%s)
-                """
-                self._exec(cur, insert_archive_sql, (candidate_ids,))
-
-                # Simulate some app logic delay
-                time.sleep(random.uniform(0.01, 0.05))
-
-                # 3) Delete from main table
-                delete_events_sql = """
-                    DELETE FROM events_jsonb
-                    WHERE id = ANY(%s)
-                """
-                self._exec(cur, delete_events_sql, (candidate_ids,))
-
-                # 4) Delete from status table
-                delete_status_sql = """
-                    DELETE FROM events_jsonb_status
-                    WHERE event_id = ANY(%s)
+                claim_sql = "SELECT unnest(%s::UUID[]) AS event_id"
+                params = (candidate_ids,)
+            else:
+                claim_sql = """
+                    SELECT event_id
+                    FROM events_jsonb_status
+                    WHERE status = 'COMPLETE'
+                    ORDER BY updated_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
                 """
-                self._exec(cur, delete_status_sql, (candidate_ids,))
-
-            conn.commit()
-        except Exception as e:
-            print(f"Error occurred in archive: {e}")
-            conn.rollback()
-            raise
-        finally:
-            conn.autocommit = original_autocommit
+                params = (batch_size,)
+
+            archive_sql = f"""
+                WITH claimed AS (
+                  {claim_sql}
+                ),
+                done AS (
+                  DELETE FROM events_jsonb_status AS s
+                  WHERE s.event_id IN (SELECT event_id FROM claimed)
+                  RETURNING s.event_id
+                ),
+                moved AS (
+                  DELETE FROM events_jsonb AS e
+                  WHERE e.id IN (SELECT event_id FROM done)
+                  RETURNING e.id, e.payload, e.event_type, e.authority_id, e.created_at, e.train_id
+                )
+                INSERT INTO events_jsonb_archive (id, payload, event_type, authority_id, created_at, train_id)
+                SELECT id, payload, event_type, authority_id, created_at, train_id
+                FROM moved
+            """
+            self._exec(cur, archive_sql, params)
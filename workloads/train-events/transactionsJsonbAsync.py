@@ -0,0 +1,422 @@
+import psycopg
+import asyncio
+import os
+import random
+import sys
+
+# shared workload helpers live in workloads/common (mounted at /common in the worker containers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from dispatch_shards import DISPATCHERS, SHARED, SHARDED, DispatchShards
+from latency_histograms import timed_op
+from txn_retry import AsyncTxnRetryEngine
+from workload_args import AsyncRetryMethods, common_args
+
+ARCHIVE_MODES = ("statements", "chained")
+
+# Async variant of transactionsJsonb.py for ../common/async_runner.py, which drives
+# thousands of sessions per process on one event loop instead of one thread per connection.
+class Transactionsjsonbasync(AsyncRetryMethods):
+
+    def __init__(self, args: dict):
+        # args is a dict of string passed with the --args flag
+        # user passed a yaml/json, in python that's a dict object
+        self.min_batch_size: int = int(args.get("min_batch_size", 10))
+        self.max_batch_size: int = int(args.get("max_batch_size", 100))
+        self.delay: int = int(args.get("delay", 100))
+        self.txn_pooling: bool = bool(args.get("txn_pooling", False))
+        self.latency, self.arrivals, self.retry = common_args(args, type(self).__name__, AsyncTxnRetryEngine)  # retry, txn_style, hdr_log and arrival args, see workload_args.py
+        self.claiming: str = str(args.get("claiming", SHARED))  # shared (one status index head) | sharded (per-thread event_id buckets)
+        self.claim_buckets: int = int(args.get("claim_buckets", 64))  # must match the bucket expression in the schema
+        self.claim_steal: int = int(args.get("claim_steal", 2))  # other buckets to claim from when the own one runs short
+        self.worker: int = int(args.get("worker", 0))  # this worker's index, so threads on different workers own different buckets
+        self.workers: int = int(args.get("workers", 1))
+        if self.claiming not in DISPATCHERS:
+            raise ValueError(f"claiming must be one of {DISPATCHERS}, got {self.claiming!r}")
+        self.shards = DispatchShards(self.claim_buckets, self.claim_steal)
+        self.archive_mode: str = str(args.get("archive_mode", "statements"))  # statements (claim, copy, delete, delete) | chained (one DML CTE statement)
+        if self.archive_mode not in ARCHIVE_MODES:
+            raise ValueError(f"archive_mode must be one of {ARCHIVE_MODES}, got {self.archive_mode!r}")
+
+        # you can arbitrarily add any variables you want
+        self.counter: int = 0
+
+
+
+    def _random_batch_size(self) -> int:
+        if self.max_batch_size <= self.min_batch_size:
+            return self.min_batch_size
+        return random.randint(self.min_batch_size, self.max_batch_size)
+
+
+
+    async def _claim_sharded(self, cur, statuses: str, batch_size: int):
+        """
+        Bucket-scoped claim (see ../common/dispatch_shards.py): take rows from this
+        thread's own event_id bucket first and only steal from other buckets for
+        whatever is left of the batch, so threads don't all lock-skip over the
+        same oldest rows at the head of the status index.
+        """
+        claim_sql = f"""
+            SELECT event_id
+            FROM events_jsonb_status
+            WHERE bucket = %s
+              AND status IN {statuses}
+            ORDER BY updated_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """
+        candidate_ids = []
+        for bucket in self.shards.plan():
+            await self._exec(cur, claim_sql, (bucket, batch_size - len(candidate_ids)))
+            candidate_ids.extend(r[0] for r in await cur.fetchall())
+            if len(candidate_ids) >= batch_size:
+                break
+        return candidate_ids
+
+
+
+    async def _exec(self, cur, sql, params=None):
+        """
+        Wrapper around cursor.execute() that always disables server-side
+        prepared statements (prepare=False), which is required when using
+        PgBouncer in transaction pooling mode.
+        """
+        if self.txn_pooling:
+            return await cur.execute(sql, params, prepare=False)
+        return await cur.execute(sql, params)
+
+
+
+    # the setup() function is executed only once per session,
+    # with the session's unique id and the total session count
+    async def setup(self, conn: psycopg.AsyncConnection, id: int, total_thread_count: int):
+        self.id = id
+        if self.arrivals:
+            self.arrivals.join(total_thread_count)
+        if self.claiming == SHARDED:
+            self.shards.assign(id, total_thread_count, self.worker, self.workers)
+
+        if self.txn_pooling:
+            # 👇 Disable server-side prepared statements for PgBouncer transaction pooling
+            conn.prepare_threshold = None
+
+        # only the first session logs, thousands of version() lines aren't useful
+        if id == 0:
+            async with conn.cursor() as cur:
+                print(f"My session ID is {id}. The total count of sessions is {total_thread_count}")
+                print((await (await self._exec(cur, "select version()")).fetchone())[0])
+
+
+
+    # the loop() function returns a list of async functions
+    # that the runner awaits, sequentially, for this session.
+    async def loop(self):
+        if self.arrivals:
+            await self.arrivals.wait_async()
+        else:
+            # Stagger cycles slightly to avoid phase alignment
+            await asyncio.sleep(random.uniform(0.75, 1.25) * self.delay / 1000)
+        return [self.add, self.process, self.archive]
+
+
+
+    # runs as one explicit transaction (see _run_txn_with_retries)
+    @timed_op
+    async def add(self, conn: psycopg.AsyncConnection):
+        await self._run_txn_with_retries(conn, self._add_once)
+
+    async def _add_once(self, conn: psycopg.AsyncConnection):
+        # Batched insert: create N events in one statement and return their ids
+        insert_batch_sql = """
+            WITH new_events AS (
+              INSERT INTO events_jsonb (payload)
+              SELECT jsonb_build_object(
+                  'eventType',
+                    (
+                      ARRAY[
+                        'ROUTE_AUTHORIZATION',
+                        'SIGNAL_CLEAR',
+                        'SPEED_RESTRICTION',
+                        'TRACK_OUT_OF_SERVICE',
+                        'TRAIN_POSITION_UPDATE',
+                        'SWITCH_POSITION_CHANGE',
+                        'WORK_ZONE_PROTECTION',
+                        'CROSSING_FAILURE',
+                        'POWER_OUTAGE',
+                        'DISPATCH_NOTE'
+                      ]
+                    )[(1 + floor(random()*10))::INT],
+
+                  'authorityId', gen_random_uuid()::STRING,
+                  'deviceKey',   gen_random_uuid()::STRING,
+                  'state',       'NEW',
+                  'createdAt',   (clock_timestamp() - (random()*interval '21 days'))::STRING,
+
+                  'route', jsonb_build_object(
+                    'segments',
+                      (
+                        SELECT jsonb_agg(
+                                jsonb_build_object(
+                                  'id', 1000 + (floor(random()*500))::INT,
+                                  'direction',
+                                    (
+                                      ARRAY['NORTHBOUND','SOUTHBOUND','EASTBOUND','WESTBOUND']
+                                    )[(1 + floor(random()*4))::INT],
+                                  'trackSections',
+                                    (
+                                      SELECT jsonb_agg(2000 + (floor(random()*200))::INT)
+                                      FROM generate_series(1, 3)
+                                    )
+                                )
+                              )
+                        FROM generate_series(1, 3)
+                      ),
+                    'switches',
+                      (
+                        SELECT jsonb_agg(
+                                jsonb_build_object(
+                                  'id', 3000 + (floor(random()*500))::INT,
+                                  'position',
+                                    (
+                                      ARRAY['NORMAL','REVERSE']
+                                    )[(1 + floor(random()*2))::INT]
+                                )
+                              )
+                        FROM generate_series(1, 2)
+                      ),
+                    'attributes', jsonb_build_object(
+                      'ALLOW_PASS',   true,
+                      'REQUIRES_ACK', false,
+                      'SLOW_ORDER',   false
+                    ),
+                    'signalId', 9001
+                  ),
+
+                  'metrics', jsonb_build_object(
+                    'flags', jsonb_build_object(
+                      'onTrack', (random() < 0.8),
+                      'fleeted', (random() < 0.2)
+                    ),
+                    'circuitIds',
+                      (
+                        SELECT jsonb_agg(7000 + (floor(random()*1000))::INT)
+                        FROM generate_series(1, 4)
+                      ),
+                    'confidence', 0.5 + random()/2.0   -- 0.5–1.0
+                  ),
+
+                  'train', jsonb_build_object(
+                    'trainId',
+                      'RR-' || (1 + floor(random()*99))::INT || '-' ||
+                      (10000 + floor(random()*90000))::INT || '-' ||
+                      to_char(current_date - (floor(random()*30))::INT, 'YYYYMMDD'),
+                    'withinLimits', (random() < 0.5),
+                    'direction',
+                      (
+                        ARRAY['NORTHBOUND','SOUTHBOUND','EASTBOUND','WESTBOUND']
+                      )[(1 + floor(random()*4))::INT]
+                  ),
+
+                  'meta', jsonb_build_object(
+                    'userId',       'operator01',
+                    'logicalPos',   'SYS01',
+                    'sourceSystem', 'SIMULATOR'
+                  )
+              )
+              FROM generate_series(1, %s)
+              RETURNING id
+            )
+            SELECT id FROM new_events;
+        """
+
+        # Second statement: insert one status row per new id
+        insert_status_sql = """
+            INSERT INTO events_jsonb_status (event_id, status)
+            SELECT unnest(%s::uuid[]), 'PENDING';
+        """
+
+        batch_size = self._random_batch_size()
+
+        async with conn.cursor() as cur:
+            # Statement 1: batch insert events, get ids
+            await self._exec(cur, insert_batch_sql, (batch_size,))
+            rows = await cur.fetchall()
+            event_ids = [r[0] for r in rows]
+
+            if not event_ids:
+                return
+
+            # simulate a tiny app think-time
+            await asyncio.sleep(random.uniform(0.01, 0.05))
+
+            # Statement 2: insert corresponding status rows in bulk
+            await self._exec(cur, insert_status_sql, (event_ids,))
+
+
+
+    # runs as one explicit transaction (see _run_txn_with_retries)
+    @timed_op
+    async def process(self, conn: psycopg.AsyncConnection):
+        await self._run_txn_with_retries(conn, self._process_once)
+
+    async def _process_once(self, conn: psycopg.AsyncConnection):
+        async with conn.cursor() as cur:
+            # 1) Pick candidates (FOR UPDATE) – PENDING or PROCESSING
+            batch_size = self._random_batch_size()
+            if self.claiming == SHARDED:
+                candidate_ids = await self._claim_sharded(cur, "('PENDING','PROCESSING')", batch_size)
+            else:
+                select_sql = """
+                    SELECT event_id
+                    FROM events_jsonb_status
+                    WHERE status IN ('PENDING','PROCESSING')
+                    ORDER BY updated_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                """
+                await self._exec(cur, select_sql, (batch_size,))
+                rows = await cur.fetchall()
+                candidate_ids = [r[0] for r in rows]
+
+            if not candidate_ids:
+                # Nothing to do for this txn
+                return
+
+            # 2) Update statuses for those candidates
+            status_sql = """
+                UPDATE events_jsonb_status AS s
+                SET status = CASE
+                               WHEN random() < 0.6 THEN 'PROCESSING'
+                               WHEN random() < 0.9 THEN 'COMPLETE'
+                               ELSE 'FAILED'
+                             END,
+                    updated_at = now()
+                WHERE s.event_id = ANY(%s)
+            """
+            await self._exec(cur, status_sql, (candidate_ids,))
+
+            # Simulate some app logic delay
+            await asyncio.sleep(random.uniform(0.01, 0.05))
+
+            # 3) Update event payloads for those same candidates
+            events_sql = """
+                UPDATE events_jsonb AS e
+                SET payload = jsonb_set(
+                                jsonb_set(
+                                  payload,
+                                  '{metrics,flags,fleeted}',
+                                  to_jsonb((random() < 0.5))
+                                ),
+                                '{state}',
+                                to_jsonb(
+                                  (ARRAY['NEW','QUEUED','IN_PROGRESS','APPLIED','CANCELLED'])[
+                                    (1 + floor(random()*5))::INT
+                                  ]
+                                )
+                              )
+                WHERE e.id = ANY(%s)
+            """
+            await self._exec(cur, events_sql, (candidate_ids,))
+
+
+
+    # runs as one explicit transaction (see _run_txn_with_retries)
+    @timed_op
+    async def archive(self, conn: psycopg.AsyncConnection):
+        archive = self._archive_chained if self.archive_mode == "chained" else self._archive_once
+        await self._run_txn_with_retries(conn, archive)
+
+    async def _archive_once(self, conn: psycopg.AsyncConnection):
+        async with conn.cursor() as cur:
+            batch_size = self._random_batch_size()
+
+            # 1) Pick COMPLETE candidates
+            if self.claiming == SHARDED:
+                candidate_ids = await self._claim_sharded(cur, "('COMPLETE')", batch_size)
+            else:
+                select_sql = """
+                    SELECT event_id
+                    FROM events_jsonb_status
+                    WHERE status = 'COMPLETE'
+                    ORDER BY updated_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                """
+                await self._exec(cur, select_sql, (batch_size,))
+                rows = await cur.fetchall()
+                candidate_ids = [r[0] for r in rows]
+
+            if not candidate_ids:
+                return
+
+            # 2) Insert into archive
+            insert_archive_sql = """
+                INSERT INTO events_jsonb_archive (id, payload, event_type, authority_id, created_at, train_id)
+                SELECT id, payload, event_type, authority_id, created_at, train_id
+                FROM events_jsonb
+                WHERE id = ANY(%s)
+            """
+            await self._exec(cur, insert_archive_sql, (candidate_ids,))
+
+            # Simulate some app logic delay
+            await asyncio.sleep(random.uniform(0.01, 0.05))
+
+            # 3) Delete from main table
+            delete_events_sql = """
+                DELETE FROM events_jsonb
+                WHERE id = ANY(%s)
+            """
+            await self._exec(cur, delete_events_sql, (candidate_ids,))
+
+            # 4) Delete from status table
+            delete_status_sql = """
+                DELETE FROM events_jsonb_status
+                WHERE event_id = ANY(%s)
+            """
+            await self._exec(cur, delete_status_sql, (candidate_ids,))
+
+    async def _archive_chained(self, conn: psycopg.AsyncConnection):
+        # Claim, copy and delete in one statement with chained DML CTEs: one round
+        # trip instead of four and no app delay while the claimed rows are locked.
+        # Deleting the event would cascade to its status row anyway, the explicit
+        # status DELETE just lets the chain start from the claimed rows.
+        async with conn.cursor() as cur:
+            batch_size = self._random_batch_size()
+
+            if self.claiming == SHARDED:
+                # bucket-scoped claims still take a SELECT per bucket, the move is one statement
+                candidate_ids = await self._claim_sharded(cur, "('COMPLETE')", batch_size)
+                if not candidate_ids:
+                    return
+                claim_sql = "SELECT unnest(%s::UUID[]) AS event_id"
+                params = (candidate_ids,)
+            else:
+                claim_sql = """
+                    SELECT event_id
+                    FROM events_jsonb_status
+                    WHERE status = 'COMPLETE'
+                    ORDER BY updated_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                """
+                params = (batch_size,)
+
+            archive_sql = f"""
+                WITH claimed AS (
+                  {claim_sql}
+                ),
+                done AS (
+                  DELETE FROM events_jsonb_status AS s
+                  WHERE s.event_id IN (SELECT event_id FROM claimed)
+                  RETURNING s.event_id
+                ),
+                moved AS (
+                  DELETE FROM events_jsonb AS e
+                  WHERE e.id IN (SELECT event_id FROM done)
+                  RETURNING e.id, e.payload, e.event_type, e.authority_id, e.created_at, e.train_id
+                )
+                INSERT INTO events_jsonb_archive (id, payload, event_type, authority_id, created_at, train_id)
+                SELECT id, payload, event_type, authority_id, created_at, train_id
+                FROM moved
+            """
+            await self._exec(cur, archive_sql, params)